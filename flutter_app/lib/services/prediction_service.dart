@@ -1,3 +1,4 @@
+import 'dart:convert';
 import 'dart:math';
 import 'dart:typed_data';
 import 'package:onnxruntime/onnxruntime.dart';
@@ -20,6 +21,10 @@ class PredictionService {
   OrtSession? _redSessionLgbm;
   OrtSession? _blueSessionXgb;
   OrtSession? _blueSessionLgbm;
+  // Both colors' boosters in one graph (averaging and top-k in-graph); preferred when shipped
+  OrtSession? _fusedSession;
+  // The fused ensemble behind an in-graph feature pass: raw draws in, no Dart feature code needed
+  OrtSession? _drawsSession;
   bool _isLoaded = false;
   final _lock = Lock();
 
@@ -45,12 +50,31 @@ class PredictionService {
           }
         }
 
+        // Release models are saved pre-optimized by ml_training/optimize_onnx.py (incremental_update
+        // --optimize), so session creation skips ONNX Runtime's graph passes. Files exported without it
+        // give the same outputs unoptimized; tree ensembles run at essentially the same speed either way.
+        final sessionOptions = OrtSessionOptions()
+          ..setSessionGraphOptimizationLevel(GraphOptimizationLevel.ortDisableAll);
+        // The draw-input model needs _drawsHistory draws; the Dart feature path below serves
+        // shorter local histories, so a fused or member session is loaded alongside it
+        try {
+          _drawsSession = OrtSession.fromBuffer(await loadModel(_drawsFile), sessionOptions);
+        } catch (e) {
+          print("PredictionService: No draw-input model, computing features in Dart: $e");
+        }
+        try {
+          _fusedSession = OrtSession.fromBuffer(await loadModel(_fusedFile), sessionOptions);
+          _isLoaded = true;
+          return;
+        } catch (e) {
+          print("PredictionService: No fused ensemble, using separate sessions: $e");
+        }
+
         final redXgbData = await loadModel('red_ball_xgb.onnx');
         final redLgbmData = await loadModel('red_ball_lgbm.onnx');
         final blueXgbData = await loadModel('blue_ball_xgb.onnx');
         final blueLgbmData = await loadModel('blue_ball_lgbm.onnx');
 
-        final sessionOptions = OrtSessionOptions();
         _redSessionXgb = OrtSession.fromBuffer(redXgbData, sessionOptions);
         _redSessionLgbm = OrtSession.fromBuffer(redLgbmData, sessionOptions);
         _blueSessionXgb = OrtSession.fromBuffer(blueXgbData, sessionOptions);
@@ -58,6 +82,8 @@ class PredictionService {
         
         _isLoaded = true;
       } catch (e) {
+        // The draw-input model alone still answers once enough history is available
+        _isLoaded = _drawsSession != null;
         print("PredictionService: Load Error: $e");
       }
     });
@@ -78,6 +104,20 @@ class PredictionService {
       for (var model in models) {
         await _dio.download("$baseUrl/$model", '${docDir.path}/$model');
       }
+
+      // The precomputed next-draw answer is optional; live inference still works without it
+      try {
+        await _dio.download("$baseUrl/$_materializedFile", '${docDir.path}/$_materializedFile');
+      } catch (e) {
+        print("PredictionService: No materialized prediction available: $e");
+      }
+      for (var optional in [_fusedFile, _drawsFile]) {
+        try {
+          await _dio.download("$baseUrl/$optional", '${docDir.path}/$optional');
+        } catch (e) {
+          print("PredictionService: $optional not available: $e");
+        }
+      }
       
       // Reload sessions
       _isLoaded = false;
@@ -85,6 +125,9 @@ class PredictionService {
       _redSessionLgbm?.release();
       _blueSessionXgb?.release();
       _blueSessionLgbm?.release();
+      _fusedSession?.release();
+      _drawsSession?.release();
+      _redSessionXgb = _redSessionLgbm = _blueSessionXgb = _blueSessionLgbm = _fusedSession = _drawsSession = null;
       await init();
       return true;
     } catch (e) {
@@ -93,6 +136,32 @@ class PredictionService {
     }
   }
 
+  static const String _materializedFile = 'next_prediction.json';
+  static const String _fusedFile = 'ssq_ensemble.onnx';
+  static const String _drawsFile = 'ssq_from_draws.onnx';
+  // Window the draw-input model was validated on (ml_training/onnx_features.py, HISTORY)
+  static const int _drawsHistory = 45;
+
+  /// Probabilities published by the retrain job for the draw after [latestIssue], or null
+  /// when the file is missing or history has already moved past it.
+  Future<Map<String, List<double>>?> _loadMaterialized(String latestIssue) async {
+    try {
+      final docDir = await getApplicationDocumentsDirectory();
+      final file = File('${docDir.path}/$_materializedFile');
+      final raw = await file.exists()
+          ? await file.readAsString()
+          : await rootBundle.loadString('assets/models/$_materializedFile');
+      final record = jsonDecode(raw) as Map<String, dynamic>;
+      if (record['based_on_issue'] != int.tryParse(latestIssue)) return null;
+      return {
+        'red': List<double>.from((record['red_probs'] as List).map((v) => (v as num).toDouble())),
+        'blue': List<double>.from((record['blue_probs'] as List).map((v) => (v as num).toDouble())),
+      };
+    } catch (e) {
+      return null;
+    }
+  }
+
   int _calculateAC(List<int> reds) {
     Set<int> diffs = {};
     for (int i = 0; i < reds.length; i++) {
@@ -119,8 +188,38 @@ class PredictionService {
         print("PredictionService: Warning: Limited history (${history.length})");
       }
 
+      if (history.isNotEmpty) {
+        final materialized = await _loadMaterialized(history.first.issue);
+        if (materialized != null) return materialized;
+      }
+
       const int seqLen = 15;
       final recent = history.reversed.toList();
+
+      if (_drawsSession != null && recent.length >= _drawsHistory) {
+        // [H, 7] int64, oldest first: red1..red6, blue
+        final window = recent.sublist(recent.length - _drawsHistory);
+        final draws = Int64List(_drawsHistory * 7);
+        for (int k = 0; k < window.length; k++) {
+          final reds = List<int>.from(window[k].redBalls)..sort();
+          for (int j = 0; j < 6; j++) draws[k * 7 + j] = reds[j];
+          draws[k * 7 + 6] = window[k].blueBall;
+        }
+        final drawsOrt = OrtValueTensor.createTensorWithDataList(draws, [_drawsHistory, 7]);
+        final outputs = _drawsSession!.run(OrtRunOptions(), {'draws': drawsOrt});
+        final red = List<double>.from((outputs[1]?.value as List<List<double>>)[0]);
+        final blue = List<double>.from((outputs[5]?.value as List<List<double>>)[0]);
+        drawsOrt.release();
+        for (var e in outputs) e?.release();
+        return {
+          'red': red,
+          'blue': blue,
+        };
+      }
+      if (_fusedSession == null && _blueSessionLgbm == null) {
+        // Only the draw-input model loaded (members are created in order, blue LightGBM last)
+        throw Exception("需要至少$_drawsHistory期历史数据 (当前${recent.length}期)");
+      }
       final primes = {2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31};
 
       Map<int, Map<int, int>> coMatrix = {};
@@ -187,7 +286,23 @@ class PredictionService {
 
       try {
         final runOptions = OrtRunOptions();
-        
+
+        if (_fusedSession != null) {
+          // One run for both colors; outputs are red_(label, probabilities, top_values, top_indices), then blue_*
+          final redInputOrt = OrtValueTensor.createTensorWithDataList(redFeatures, [1, 1785]);
+          final blueInputOrt = OrtValueTensor.createTensorWithDataList(blueFeatures, [1, 480]);
+          final outputs = _fusedSession!.run(runOptions, {'red_input': redInputOrt, 'blue_input': blueInputOrt});
+          final red = List<double>.from((outputs[1]?.value as List<List<double>>)[0]);
+          final blue = List<double>.from((outputs[5]?.value as List<List<double>>)[0]);
+          redInputOrt.release();
+          blueInputOrt.release();
+          for (var e in outputs) e?.release();
+          return {
+            'red': red,
+            'blue': blue,
+          };
+        }
+
         // --- Red Inference ---
         final redInputOrt = OrtValueTensor.createTensorWithDataList(redFeatures, [1, 1785]);
         final redInputs = {'input': redInputOrt};
@@ -238,6 +353,8 @@ class PredictionService {
     _redSessionLgbm?.release();
     _blueSessionXgb?.release();
     _blueSessionLgbm?.release();
+    _fusedSession?.release();
+    _drawsSession?.release();
     OrtEnv.instance.release();
     _isLoaded = false;
   }
@@ -0,0 +1,60 @@
+import argparse
+import time
+import numpy as np
+from ensemble_predictor import EnsemblePredictor, top_k
+from train_xgboost import build_red_windows, build_blue_windows
+from draw_history import load_frame
+
+# How often does an anytime (early-stopped) ensemble answer match the full 100-round answer?
+# Every historical window is predicted one row at a time, the way the app and predict_next call
+# the models, under each chunk / stability / budget setting.
+
+def _full_predictions(predict, X, k):
+    top, ms = [], []
+    for row in X:
+        start = time.perf_counter()
+        probs = predict(row[None, :])
+        ms.append((time.perf_counter() - start) * 1000)
+        top.append(set(top_k(probs, k)[0]))
+    return top, np.median(ms)
+
+def run_report(color='red', rows=200, chunks=(5, 10, 20), stable=(1, 2, 3), budgets=(0.5, 1.0, 2.0)):
+    df = load_frame()
+    predictor = EnsemblePredictor.load('.')
+    if color == 'red':
+        X, k = build_red_windows(df)[-rows:], 12
+        full, anytime = predictor.predict_red, predictor.predict_red_anytime
+    else:
+        X, k = build_blue_windows(df)[-rows:], 1
+        full, anytime = predictor.predict_blue, predictor.predict_blue_anytime
+
+    reference, full_ms = _full_predictions(full, X, k)
+    settings = [(c, s, None) for c in chunks for s in stable] + [(min(chunks), max(stable), b) for b in budgets]
+
+    print(f"{color.capitalize()} anytime prediction on the last {len(X)} windows (top-{k}); full ensemble p50 {full_ms:.2f} ms")
+    print("-" * 86)
+    print(f"{'Chunk':>5} | {'Stable':>6} | {'Budget':>7} | {'Exact match':>11} | {'Mean overlap':>12} | {'Rounds':>7} | {'p50 (ms)':>8}")
+    print("-" * 86)
+    for chunk, stable_chunks, budget in settings:
+        matches, overlaps, rounds, ms = [], [], [], []
+        for row, ref in zip(X, reference):
+            probs, info = anytime(row[None, :], k=k, chunk=chunk, stable_chunks=stable_chunks, budget_ms=budget)
+            early = set(top_k(probs, k)[0])
+            matches.append(early == ref)
+            overlaps.append(len(early & ref))
+            rounds.append(info['rounds'] / info['total_rounds'])
+            ms.append(info['ms'])
+        budget_text = f"{budget:.1f}ms" if budget is not None else '-'
+        print(f"{chunk:>5} | {stable_chunks:>6} | {budget_text:>7} | {np.mean(matches) * 100:>10.1f}% | "
+              f"{np.mean(overlaps):>9.2f}/{k:<2} | {np.mean(rounds) * 100:>6.0f}% | {np.median(ms):>8.2f}")
+    print("-" * 86)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--color', choices=['red', 'blue'], default='red')
+    parser.add_argument('--rows', type=int, default=200, help='most recent historical windows evaluated')
+    parser.add_argument('--chunks', type=int, nargs='+', default=[5, 10, 20], help='boosting rounds added per step')
+    parser.add_argument('--stable', type=int, nargs='+', default=[1, 2, 3], help='unchanged chunks required to stop')
+    parser.add_argument('--budgets', type=float, nargs='+', default=[0.5, 1.0, 2.0], help='latency budgets in ms')
+    args = parser.parse_args()
+    run_report(args.color, args.rows, args.chunks, args.stable, args.budgets)
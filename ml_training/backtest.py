@@ -2,9 +2,9 @@ import os
 os.environ["KERAS_BACKEND"] = "tensorflow"
 import random
 import numpy as np
-import pandas as pd
 import tensorflow as tf
 from tensorflow import keras
+from draw_history import load_frame
 
 SEED = 42
 random.seed(SEED)
@@ -72,7 +72,7 @@ def calculate_features(df):
 
 def run_backtest():
     print("Executing Reverted App-Native Backtest...")
-    df = pd.read_csv('ssq_data.csv').sort_values('issue').reset_index(drop=True)
+    df = load_frame()
     rg, rf, m, rs, ra = calculate_features(df)
     
     red_model = keras.models.load_model('red_ball_model.keras', safe_mode=False)
@@ -1,9 +1,9 @@
 import pandas as pd
 import numpy as np
-import joblib
 import os
 import xgboost as xgb
 import train_xgboost
+from ensemble_predictor import EnsemblePredictor
 
 def run_backtest():
     """
@@ -64,6 +64,7 @@ def run_backtest():
         red_model.fit(np.array(X_red), np.array(y_red))
         blue_model = xgb.XGBClassifier(n_estimators=100, max_depth=6, learning_rate=0.1, objective='multi:softprob', num_class=16, tree_method='hist', random_state=42)
         blue_model.fit(np.array(X_blue), np.array(y_blue))
+        predictor = EnsemblePredictor([red_model], [blue_model])
         
         # 3. Predict for index i
         df_test_context = df.iloc[i-45:i+1].copy().reset_index(drop=True)
@@ -75,16 +76,15 @@ def run_backtest():
         for step in range(last_idx - seq_len, last_idx):
             feat_red.extend(rg_t[step]); feat_red.extend(rf_t[step]); feat_red.extend(m_t[step]); feat_red.extend(rs_t[step]); feat_red.extend(ra_t[step])
         
-        probs_red = red_model.predict_proba(np.array([feat_red]))[0]
-        top12 = np.argsort(probs_red)[-12:] + 1
-        actual_reds = set(df.iloc[i][['red1','red2','red3','red4','red5','red6']].values)
-        hits = len(actual_reds & set(top12))
-        
         feat_blue = []
         for step in range(last_idx - seq_len, last_idx):
             feat_blue.extend(bg_t[step]); feat_blue.extend(bf_t[step])
-        probs_blue = blue_model.predict_proba(np.array([feat_blue]))[0]
-        pred_blue = np.argmax(probs_blue) + 1
+        prediction = predictor.predict(np.array([feat_red]), np.array([feat_blue]))
+        top12 = prediction['red_top'][0]
+        actual_reds = set(df.iloc[i][['red1','red2','red3','red4','red5','red6']].values)
+        hits = len(actual_reds & set(top12))
+        
+        pred_blue = prediction['blue_top'][0][0]
         actual_blue = int(df.iloc[i]['blue'])
         blue_hit = (pred_blue == actual_blue)
         
@@ -0,0 +1,99 @@
+import argparse
+import numpy as np
+from train_xgboost import build_red_dataset, build_blue_dataset, load_red_mask
+from boosters import chronological_split, fit_bag
+from draw_history import load_frame
+from draw_bits import red_masks, top_k_masks, popcount
+
+# How many seed/subsample variants does a booster need before its predictions stop depending
+# on the seed? Train the largest bag once on a chronological split, then score many random
+# sub-bags of each size on the held-out (most recent) draws.
+
+COLORS = {
+    # color: (num_class, rows_per_draw, top-k scored, training window in draws or None for all)
+    'red': (33, 6, 12, None),
+    'blue': (16, 1, 3, 1000),
+}
+
+def top_k_hits(probs, actual, k):
+    """Hits of the top-k classes against the actual labels of each held-out draw"""
+    return popcount(top_k_masks(probs, k) & red_masks(actual + 1)).astype(np.int64)
+
+def sub_bag_stats(members, X_val, actual, k, bag_size, repeats, rng):
+    member_probs = np.array([m.predict_proba(X_val) for m in members])
+    rates, bag_probs = [], []
+    for _ in range(repeats):
+        chosen = rng.choice(len(members), bag_size, replace=False)
+        probs = member_probs[chosen].mean(axis=0)
+        bag_probs.append(probs)
+        hits = top_k_hits(probs, actual, k)
+        # Red counts a draw as a success at 3+ of 6; blue at any hit
+        rates.append(np.mean(hits >= (3 if k == 12 else 1)) * 100)
+    bag_probs = np.array(bag_probs)
+    tops = np.array([top_k_masks(p, k) for p in bag_probs])
+    # Per-window top-k agreement between two independent bags of this size
+    pairs = [(a, b) for a in range(repeats) for b in range(a + 1, repeats)]
+    overlap = np.mean([popcount(tops[a] & tops[b]) for a, b in pairs]) if pairs else float(k)
+    return {
+        'rate_mean': float(np.mean(rates)),
+        'rate_std': float(np.std(rates)),
+        'prob_std': float(bag_probs.std(axis=0).mean()),
+        'overlap': float(overlap),
+    }
+
+def run_report(color='red', kind='xgb', max_bags=8, holdout=100, repeats=10, n_estimators=100, tolerance=1.0):
+    num_class, rows_per_draw, k, window = COLORS[color]
+    df = load_frame()
+    if window is not None:
+        df = df.tail(window + 15).reset_index(drop=True)
+    if color == 'red':
+        X, y = build_red_dataset(df)
+        mask = load_red_mask()
+        if mask is not None:
+            X = X[:, mask]
+    else:
+        X, y = build_blue_dataset(df)
+    n_draws = len(df) - 15
+    X_train, y_train, X_val, y_val = chronological_split(X, y, n_draws, rows_per_draw, holdout)
+    actual = y_val.reshape(-1, rows_per_draw)
+    X_val = X_val[::rows_per_draw]
+
+    print(f"Training {max_bags} {color} {kind} variants in parallel on {n_draws - holdout} draws...")
+    bag, info = fit_bag(kind, num_class, X_train, y_train, max_bags, n_estimators)
+    print(f"  {info['train_seconds']}s wall, {info['member_seconds']}s per member")
+
+    rng = np.random.default_rng(42)
+    sizes = [b for b in (1, 2, 4, 8, 16, 32) if b <= max_bags]
+    label = 'Hit 3+' if k == 12 else f'Top-{k} Hit'
+    print("-" * 84)
+    print(f"{'Bag':>4} | {label + ' mean':>13} | {'std':>6} | {'Prob std':>9} | {'Top-' + str(k) + ' overlap':>15} | {'CPU (s)':>8}")
+    print("-" * 84)
+    results = []
+    for size in sizes:
+        # A full bag has only one subset; repeating it would fake zero variance
+        r = repeats if size < max_bags else 1
+        stats = sub_bag_stats(bag.members, X_val, actual, k, size, r, rng)
+        stats.update(bags=size, cpu_seconds=size * info['member_seconds'])
+        results.append(stats)
+        overlap = f"{stats['overlap']:.2f}/{k}" if r > 1 else '-'
+        print(f"{size:>4} | {stats['rate_mean']:>12.1f}% | {stats['rate_std']:>6.2f} | {stats['prob_std']:>9.5f} | {overlap:>15} | {stats['cpu_seconds']:>8.1f}")
+    print("-" * 84)
+
+    stable = [r for r in results if r['bags'] < max_bags and r['rate_std'] <= tolerance]
+    if stable:
+        print(f"Smallest stable bag: {stable[0]['bags']} (hit-rate std <= {tolerance} points across sub-bags)")
+    else:
+        print(f"No bag size below {max_bags} keeps the hit-rate std within {tolerance} points; try a larger --max-bags.")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--color', choices=sorted(COLORS), default='red')
+    parser.add_argument('--kind', choices=['xgb', 'lgbm'], default='xgb')
+    parser.add_argument('--max-bags', type=int, default=8)
+    parser.add_argument('--holdout', type=int, default=100, help='most recent draws scored')
+    parser.add_argument('--repeats', type=int, default=10, help='random sub-bags drawn per size')
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--tolerance', type=float, default=1.0, help='allowed hit-rate std in percentage points')
+    args = parser.parse_args()
+    run_report(args.color, args.kind, args.max_bags, args.holdout, args.repeats, args.n_estimators, args.tolerance)
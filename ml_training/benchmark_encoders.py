@@ -0,0 +1,87 @@
+import os
+os.environ["KERAS_BACKEND"] = "tensorflow"
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from train_model import build_ensemble_red_model, build_red_sequences, RED_ENCODERS
+from draw_history import load_frame
+
+def walk_forward_hit_rate(encoder, X_e, X_b, X_r, y_r, folds=3, fold_size=100, epochs=50):
+    """
+    Expanding-window walk-forward: each fold is trained only on the windows before it,
+    then scored on the next `fold_size` draws (top-12 vs actual reds).
+    Returns (3+ rate, 4+ rate, total training seconds, last trained model).
+    """
+    hit_3_plus, hit_4_plus, tested = 0, 0, 0
+    train_seconds = 0.0
+    model = None
+    for k in range(folds, 0, -1):
+        split = len(y_r) - k * fold_size
+        end = split + fold_size
+        keras.utils.set_random_seed(42)
+        model = build_ensemble_red_model(X_e.shape[1], X_e.shape[2], X_b.shape[2], X_r.shape[2], encoder)
+        start = time.perf_counter()
+        model.fit([X_e[:split], X_b[:split], X_r[:split]],
+                  {'out_heatmap': y_r[:split], 'out_zones': np.zeros((split, 3))},
+                  epochs=epochs, batch_size=32, verbose=0)
+        train_seconds += time.perf_counter() - start
+
+        outputs = model.predict([X_e[split:end], X_b[split:end], X_r[split:end]], verbose=0)
+        for heatmap, target in zip(outputs[0], y_r[split:end]):
+            hits = int(target[np.argsort(heatmap)[-12:]].sum())
+            if hits >= 3: hit_3_plus += 1
+            if hits >= 4: hit_4_plus += 1
+            tested += 1
+    return hit_3_plus / tested * 100, hit_4_plus / tested * 100, train_seconds, model
+
+def cpu_latency_ms(model, X_e, X_b, X_r, runs=200):
+    # Single-window calls, the way the app and predict scripts use the model
+    sample = [tf.constant(X_e[-1:], tf.float32), tf.constant(X_b[-1:], tf.float32), tf.constant(X_r[-1:], tf.float32)]
+    infer = tf.function(lambda inputs: model(inputs, training=False))
+    for _ in range(10):
+        infer(sample)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        infer(sample)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+def run_benchmark(encoders=None, folds=3, fold_size=100, epochs=50):
+    print("Benchmarking red sequence encoders...")
+    df = load_frame()
+    X_e, X_b, X_r, y_r = build_red_sequences(df)
+    encoders = encoders or list(RED_ENCODERS)
+
+    results = []
+    for encoder in encoders:
+        print(f"  {encoder}: {folds} walk-forward folds x {fold_size} draws, {epochs} epochs each...")
+        rate_3, rate_4, train_seconds, model = walk_forward_hit_rate(encoder, X_e, X_b, X_r, y_r, folds, fold_size, epochs)
+        results.append({
+            'encoder': encoder,
+            'params': model.count_params(),
+            'train_s': train_seconds,
+            'latency_ms': cpu_latency_ms(model, X_e, X_b, X_r),
+            'hit_3_plus': rate_3,
+            'hit_4_plus': rate_4,
+        })
+
+    print("-" * 80)
+    print(f"{'Encoder':<12} | {'Params':>10} | {'Train (s)':>9} | {'CPU p50 (ms)':>12} | {'3+ Rate':>8} | {'4+ Rate':>8}")
+    print("-" * 80)
+    for r in results:
+        print(f"{r['encoder']:<12} | {r['params']:>10,} | {r['train_s']:>9.1f} | {r['latency_ms']:>12.2f} | {r['hit_3_plus']:>7.1f}% | {r['hit_4_plus']:>7.1f}%")
+    print("-" * 80)
+    print(f"Expected Random 3+ Hit Rate (12 picks): ~37.4%")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--encoders', nargs='+', choices=sorted(RED_ENCODERS), default=None)
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--fold-size', type=int, default=100)
+    parser.add_argument('--epochs', type=int, default=50)
+    args = parser.parse_args()
+    run_benchmark(args.encoders, args.folds, args.fold_size, args.epochs)
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import xgboost as xgb
+import lightgbm as lgb
+import onnx
+import onnxmltools
+from onnx import helper, numpy_helper
+from onnxmltools.convert.common.data_types import FloatTensorType
+from joblib import Parallel, delayed
+
+META_FILE = 'model_meta.json'
+
+# Row/column subsampling that makes seed variants of the same booster actually differ
+BAG_PARAMS = {
+    'xgb': {'subsample': 0.8, 'colsample_bytree': 0.8},
+    'lgbm': {'subsample': 0.8, 'subsample_freq': 1, 'colsample_bytree': 0.8},
+}
+
+def make_booster(kind, num_class, n_estimators=100, random_state=42, **params):
+    """The repo's standard 33/16-class XGBoost or LightGBM classifier"""
+    if kind == 'xgb':
+        return xgb.XGBClassifier(
+            n_estimators=n_estimators, max_depth=6, learning_rate=0.1,
+            objective='multi:softprob', num_class=num_class, tree_method='hist',
+            random_state=random_state, **params
+        )
+    if kind == 'lgbm':
+        return lgb.LGBMClassifier(
+            n_estimators=n_estimators, max_depth=6, learning_rate=0.1,
+            objective='multiclass', num_class=num_class, random_state=random_state,
+            verbose=-1, **params
+        )
+    raise ValueError(f"Unknown booster kind: {kind}")
+
+def chronological_split(X, y, n_draws, rows_per_draw, holdout_draws):
+    """
+    Rows from build_red_dataset/build_blue_dataset are in draw order, followed by any
+    class-fill rows. Hold out the most recent draws; fill rows always stay in training.
+    """
+    n_real = n_draws * rows_per_draw
+    cut = n_real - holdout_draws * rows_per_draw
+    train_idx = np.r_[0:cut, n_real:len(X)]
+    X_train, y_train = X[train_idx], y[train_idx]
+    # A class seen only in the holdout would break XGBoost's label check
+    missing = np.setdiff1d(np.unique(y), y_train)
+    if len(missing):
+        X_train = np.vstack([X_train, np.zeros((len(missing), X.shape[1]))])
+        y_train = np.concatenate([y_train, missing])
+    return X_train, y_train, X[cut:n_real], y[cut:n_real]
+
+class _XGBTimeBudget(xgb.callback.TrainingCallback):
+    def __init__(self, seconds):
+        super().__init__()
+        self.seconds = seconds
+        self.start = None
+
+    def before_training(self, model):
+        self.start = time.time()
+        return model
+
+    def after_iteration(self, model, epoch, evals_log):
+        return time.time() - self.start > self.seconds
+
+def _lgbm_time_budget(seconds):
+    start = time.time()
+    best = {'iteration': 0, 'score': None, 'results': None}
+
+    def callback(env):
+        # Track the best validation loss ourselves so a budget stop still keeps the best round
+        score = env.evaluation_result_list[0][2]
+        if best['score'] is None or score < best['score']:
+            best.update(iteration=env.iteration, score=score, results=env.evaluation_result_list)
+        if time.time() - start > seconds:
+            raise lgb.callback.EarlyStopException(best['iteration'], best['results'])
+    callback.order = 40
+    return callback
+
+def fit_early_stopped(kind, num_class, X, y, n_draws, rows_per_draw=1, holdout_draws=30,
+                      max_estimators=500, patience=20, time_budget=None, refit=True):
+    """
+    Pick the number of boosting rounds on a chronological validation block (the most recent
+    `holdout_draws` draws), optionally capped by a wall-clock budget in seconds, then refit on
+    all rows with exactly that many rounds so the shipped model has no redundant trees and
+    still learns from the latest draws.
+    Returns (model, info) where info is ready for the artifact metadata.
+    """
+    X_train, y_train, X_val, y_val = chronological_split(X, y, n_draws, rows_per_draw, holdout_draws)
+    start = time.time()
+    if kind == 'xgb':
+        callbacks = [_XGBTimeBudget(time_budget)] if time_budget else []
+        search = make_booster(kind, num_class, max_estimators, eval_metric='mlogloss',
+                              early_stopping_rounds=patience, callbacks=callbacks)
+        search.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+        best_rounds = search.best_iteration + 1
+        best_score = search.best_score
+    else:
+        callbacks = [lgb.early_stopping(patience, verbose=False)]
+        if time_budget:
+            callbacks.append(_lgbm_time_budget(time_budget))
+        search = make_booster(kind, num_class, max_estimators)
+        search.fit(X_train, y_train, eval_set=[(X_val, y_val)], eval_metric='multi_logloss', callbacks=callbacks)
+        best_rounds = max(search.best_iteration_, 1)
+        best_score = search.best_score_['valid_0']['multi_logloss']
+    search_seconds = time.time() - start
+
+    if refit:
+        model = make_booster(kind, num_class, best_rounds)
+        model.fit(X, y)
+    else:
+        model = search
+    info = {
+        'early_stopping': True,
+        'holdout_draws': holdout_draws,
+        'rounds': int(best_rounds),
+        'trees': int(best_rounds * num_class),
+        'val_logloss': round(float(best_score), 5),
+        'search_seconds': round(search_seconds, 2),
+        'train_seconds': round(time.time() - start, 2),
+    }
+    return model, info
+
+def fit_fixed(kind, num_class, X, y, n_estimators=100):
+    start = time.time()
+    model = make_booster(kind, num_class, n_estimators)
+    model.fit(X, y)
+    info = {
+        'early_stopping': False,
+        'rounds': n_estimators,
+        'trees': n_estimators * num_class,
+        'train_seconds': round(time.time() - start, 2),
+    }
+    return model, info
+
+class BaggedBooster:
+    """N seed/subsample variants of one booster; behaves like a single sklearn classifier"""
+    def __init__(self, members):
+        self.members = members
+        self.n_features_in_ = members[0].n_features_in_
+        self.classes_ = members[0].classes_
+        self.n_classes_ = len(self.classes_)
+
+    def predict_proba(self, X):
+        return np.mean([member.predict_proba(X) for member in self.members], axis=0)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def _fit_bag_member(kind, num_class, X, y, n_estimators, seed):
+    # One thread per member; the bag itself is spread across cores
+    start = time.time()
+    model = make_booster(kind, num_class, n_estimators, random_state=seed, n_jobs=1, **BAG_PARAMS[kind])
+    model.fit(X, y)
+    return model, time.time() - start
+
+def fit_bag(kind, num_class, X, y, n_bags, n_estimators=100, n_jobs=-1, base_seed=42):
+    start = time.time()
+    fitted = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_bag_member)(kind, num_class, X, y, n_estimators, base_seed + k) for k in range(n_bags)
+    )
+    info = {
+        'early_stopping': False,
+        'bags': n_bags,
+        'rounds': n_estimators,
+        'trees': n_estimators * num_class * n_bags,
+        'member_seconds': round(float(np.mean([seconds for _, seconds in fitted])), 2),
+        'train_seconds': round(time.time() - start, 2),
+    }
+    return BaggedBooster([model for model, _ in fitted]), info
+
+def booster_to_onnx(model, input_dim):
+    """
+    ONNX graph with input 'input' and outputs (label, probabilities), the layout the app reads.
+    A BaggedBooster becomes one graph: every member subgraph reads the shared input and a Mean
+    node averages their probabilities, so the app still opens a single session per model.
+    """
+    initial_type = [('input', FloatTensorType([None, input_dim]))]
+    if isinstance(model, xgb.XGBClassifier):
+        return onnxmltools.convert_xgboost(model, initial_types=initial_type, target_opset=12)
+    if isinstance(model, lgb.LGBMClassifier):
+        return onnxmltools.convert_lightgbm(model, initial_types=initial_type, target_opset=12, zipmap=False)
+    if not isinstance(model, BaggedBooster):
+        raise ValueError(f"Cannot export {type(model).__name__} to ONNX")
+    members = [booster_to_onnx(member, input_dim) for member in model.members]
+    return average_onnx(members, input_dim, model.n_classes_, prefix='bag', graph_name='bagged_booster')
+
+def average_onnx(protos, input_dim, n_classes, weights=None, top_k=None, prefix='member', graph_name='averaged_ensemble'):
+    """
+    Fuse single-input (label, probabilities) graphs into one graph that feeds them the same
+    'input' tensor and averages their probabilities in-graph (weighted Sum, or Mean when
+    unweighted). Outputs stay (label, probabilities); with top_k, TopK adds 'top_values' and
+    'top_indices' (0-based class indices, most probable first).
+    """
+    nodes, initializers, member_probs, opsets = [], [], [], {}
+    for k, member in enumerate(protos):
+        proto = onnx.compose.add_prefix(member, f'{prefix}{k}_')
+        inner_input = proto.graph.input[0].name
+        for node in proto.graph.node:
+            node.input[:] = ['input' if name == inner_input else name for name in node.input]
+        nodes.extend(proto.graph.node)
+        initializers.extend(proto.graph.initializer)
+        member_probs.append(proto.graph.output[1].name)
+        for op in proto.opset_import:
+            opsets[op.domain] = max(opsets.get(op.domain, 0), op.version)
+
+    if weights is None:
+        nodes.append(helper.make_node('Mean', member_probs, ['probabilities'], name='EnsembleMean'))
+    else:
+        weights = np.asarray(weights, dtype=np.float32) / np.sum(weights)
+        scaled = []
+        for k, (probs, weight) in enumerate(zip(member_probs, weights)):
+            initializers.append(numpy_helper.from_array(np.array(weight, dtype=np.float32), name=f'{prefix}{k}_weight'))
+            nodes.append(helper.make_node('Mul', [probs, f'{prefix}{k}_weight'], [f'{prefix}{k}_weighted']))
+            scaled.append(f'{prefix}{k}_weighted')
+        nodes.append(helper.make_node('Sum', scaled, ['probabilities'], name='EnsembleWeightedSum'))
+    nodes.append(helper.make_node('ArgMax', ['probabilities'], ['label'], axis=1, keepdims=0, name='EnsembleLabel'))
+    outputs = [helper.make_tensor_value_info('label', onnx.TensorProto.INT64, [None]),
+               helper.make_tensor_value_info('probabilities', onnx.TensorProto.FLOAT, [None, n_classes])]
+    if top_k:
+        initializers.append(numpy_helper.from_array(np.array([top_k], dtype=np.int64), name='top_k'))
+        nodes.append(helper.make_node('TopK', ['probabilities', 'top_k'], ['top_values', 'top_indices'],
+                                      axis=1, largest=1, sorted=1, name='EnsembleTopK'))
+        outputs += [helper.make_tensor_value_info('top_values', onnx.TensorProto.FLOAT, [None, top_k]),
+                    helper.make_tensor_value_info('top_indices', onnx.TensorProto.INT64, [None, top_k])]
+    opsets[''] = max(opsets.get('', 0), 12)
+
+    graph = helper.make_graph(
+        nodes, graph_name,
+        [helper.make_tensor_value_info('input', onnx.TensorProto.FLOAT, [None, input_dim])],
+        outputs, initializers,
+    )
+    merged = helper.make_model(graph, opset_imports=[helper.make_opsetid(d, v) for d, v in opsets.items()])
+    merged.ir_version = max(p.ir_version for p in protos)
+    onnx.checker.check_model(merged)
+    return merged
+
+def merge_onnx(protos):
+    """
+    Put independent graphs side by side in one model (one session, several inputs/outputs).
+    Names must already be distinct, e.g. via onnx.compose.add_prefix.
+    """
+    opsets = {}
+    for proto in protos:
+        for op in proto.opset_import:
+            opsets[op.domain] = max(opsets.get(op.domain, 0), op.version)
+    ir_version = max(proto.ir_version for proto in protos)
+    for proto in protos:
+        del proto.opset_import[:]
+        proto.opset_import.extend(helper.make_opsetid(d, v) for d, v in opsets.items())
+        proto.ir_version = ir_version
+    merged = protos[0]
+    for proto in protos[1:]:
+        merged = onnx.compose.merge_models(merged, proto, io_map=[])
+    onnx.checker.check_model(merged)
+    return merged
+
+def save_meta(entries, base_path='.'):
+    """Merge per-artifact metadata (tree counts, timings, ...) into model_meta.json"""
+    path = os.path.join(base_path, META_FILE)
+    meta = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            meta = json.load(f)
+    meta.update(entries)
+    with open(path, 'w') as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+
+def _file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def record_release(path, tolerance):
+    """
+    Note in model_meta.json the max |dP| an exported ONNX file was released under (verified lossy
+    steps: leaf compaction, float16 thresholds), keyed to the file's sha256 so a re-export
+    without this record does not inherit it
+    """
+    base_path, name = os.path.split(path)
+    save_meta({name: {'release_tol': tolerance, 'sha256': _file_sha256(path)}}, base_path or '.')
+
+def release_tolerance(path):
+    """The |dP| budget recorded for the file as it is on disk, 0.0 when none is"""
+    base_path, name = os.path.split(path)
+    meta_path = os.path.join(base_path, META_FILE)
+    if not os.path.exists(meta_path) or not os.path.exists(path):
+        return 0.0
+    with open(meta_path) as f:
+        entry = json.load(f).get(name) or {}
+    if entry.get('sha256') != _file_sha256(path):
+        return 0.0
+    return float(entry.get('release_tol', 0.0))
+
+def train_member(kind, num_class, X, y, n_draws, rows_per_draw=1, early_stopping=False,
+                 n_estimators=100, holdout_draws=30, time_budget=None, bags=1):
+    if bags > 1:
+        info = {}
+        if early_stopping:
+            # Pick the round count once, then bag variants of that size
+            _, info = fit_early_stopped(kind, num_class, X, y, n_draws, rows_per_draw, holdout_draws=holdout_draws,
+                                        time_budget=time_budget, refit=False)
+            n_estimators = info['rounds']
+        model, bag_info = fit_bag(kind, num_class, X, y, bags, n_estimators)
+        info.update(bag_info, early_stopping=early_stopping)
+        return model, info
+    if early_stopping:
+        return fit_early_stopped(kind, num_class, X, y, n_draws, rows_per_draw,
+                                 holdout_draws=holdout_draws, time_budget=time_budget)
+    return fit_fixed(kind, num_class, X, y, n_estimators)
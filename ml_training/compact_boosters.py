@@ -0,0 +1,222 @@
+import argparse
+import os
+import shutil
+import time
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnx import helper
+from train_xgboost import build_red_windows, build_blue_windows
+from draw_history import load_frame
+from boosters import record_release, release_tolerance
+
+# Post-training compaction of the exported tree ensembles (no retraining).
+# Works directly on the ONNX TreeEnsembleClassifier nodes, so XGBoost, LightGBM, bagged and
+# feature-masked exports are handled the same way:
+#   - sibling leaves whose weights lie within `leaf_tol` of each other are merged into their
+#     parent (bottom-up, so a merged subtree never moves any original leaf by more than leaf_tol / 2)
+#   - a tree that collapses to a single leaf is a constant: it is dropped and its weight is
+#     folded into base_values, which keeps the softmax input unchanged up to the same bound
+# The result is verified against the original on historical feature windows before it is kept.
+
+TARGETS = {
+    # file: (color, top-k compared)
+    'red_ball_xgb.onnx': ('red', 12),
+    'red_ball_lgbm.onnx': ('red', 12),
+    'blue_ball_xgb.onnx': ('blue', 3),
+    'blue_ball_lgbm.onnx': ('blue', 3),
+}
+# Max |dP| a compacted model may move from the original on any verification window
+PROB_TOL = 1e-3
+TOLERANCES = (0.02, 0.01, 0.005, 0.002, 0.001, 0.0005, 0.0002, 0.0001)
+
+_NODE_ATTRS = ['nodes_treeids', 'nodes_nodeids', 'nodes_featureids', 'nodes_modes', 'nodes_values',
+               'nodes_truenodeids', 'nodes_falsenodeids', 'nodes_missing_value_tracks_true', 'nodes_hitrates']
+
+def _attributes(node):
+    return {a.name: helper.get_attribute_value(a) for a in node.attribute}
+
+def _read_trees(attrs):
+    """{tree_id: {node_id: node dict}} with leaf weights as {class_id: weight}"""
+    trees = {}
+    n = len(attrs['nodes_nodeids'])
+    for i in range(n):
+        node = {name: attrs[name][i] for name in _NODE_ATTRS if name in attrs}
+        node['weights'] = {}
+        trees.setdefault(attrs['nodes_treeids'][i], {})[attrs['nodes_nodeids'][i]] = node
+    for t, nid, c, w in zip(attrs['class_treeids'], attrs['class_nodeids'], attrs['class_ids'], attrs['class_weights']):
+        weights = trees[t][nid]['weights']
+        weights[c] = weights.get(c, 0.0) + w
+    return trees
+
+def _collapse(tree, nid, leaf_tol):
+    """
+    Post-order merge. Returns (lo, hi) per class of the ORIGINAL leaves under nid when the
+    subtree has become a single leaf, else None.
+    """
+    node = tree[nid]
+    if node['nodes_modes'] == b'LEAF':
+        return {c: (w, w) for c, w in node['weights'].items()}
+    left = _collapse(tree, node['nodes_truenodeids'], leaf_tol)
+    right = _collapse(tree, node['nodes_falsenodeids'], leaf_tol)
+    if left is None or right is None:
+        return None
+    classes = set(left) | set(right)
+    bounds = {}
+    for c in classes:
+        lo_l, hi_l = left.get(c, (0.0, 0.0))
+        lo_r, hi_r = right.get(c, (0.0, 0.0))
+        bounds[c] = (min(lo_l, lo_r), max(hi_l, hi_r))
+    if any(hi - lo > leaf_tol for lo, hi in bounds.values()):
+        return None
+    node['nodes_modes'] = b'LEAF'
+    node['nodes_featureids'], node['nodes_values'] = 0, 0.0
+    node['nodes_truenodeids'], node['nodes_falsenodeids'] = 0, 0
+    node['weights'] = {c: (lo + hi) / 2.0 for c, (lo, hi) in bounds.items()}
+    return bounds
+
+def compact_tree_node(node, leaf_tol):
+    """Rewrite one TreeEnsembleClassifier node in place; returns (trees, nodes) before and after"""
+    attrs = _attributes(node)
+    trees = _read_trees(attrs)
+    n_classes = len(attrs.get('classlabels_int64s') or attrs.get('classlabels_strings'))
+    base_values = list(attrs.get('base_values', [0.0] * n_classes))
+    before = (len(trees), len(attrs['nodes_nodeids']))
+
+    kept = []
+    for tree_id in sorted(trees):
+        tree = trees[tree_id]
+        # Roots are the nodes no other node points to
+        children = {n[k] for n in tree.values() if n['nodes_modes'] != b'LEAF' for k in ('nodes_truenodeids', 'nodes_falsenodeids')}
+        root = min(set(tree) - children)
+        if _collapse(tree, root, leaf_tol) is not None:
+            for c, w in tree[root]['weights'].items():
+                base_values[c] += w
+        else:
+            kept.append((tree, root))
+
+    out = {name: [] for name in _NODE_ATTRS if name in attrs}
+    class_out = {'class_treeids': [], 'class_nodeids': [], 'class_ids': [], 'class_weights': []}
+    for new_tree, (tree, root) in enumerate(kept):
+        # Renumber reachable nodes in pre-order so dropped subtrees leave no gaps
+        order, stack = [], [root]
+        while stack:
+            nid = stack.pop()
+            order.append(nid)
+            if tree[nid]['nodes_modes'] != b'LEAF':
+                stack.extend([tree[nid]['nodes_falsenodeids'], tree[nid]['nodes_truenodeids']])
+        new_id = {nid: k for k, nid in enumerate(order)}
+        for nid in order:
+            src = tree[nid]
+            is_leaf = src['nodes_modes'] == b'LEAF'
+            for name in out:
+                value = src[name]
+                if name == 'nodes_treeids':
+                    value = new_tree
+                elif name == 'nodes_nodeids':
+                    value = new_id[nid]
+                elif name in ('nodes_truenodeids', 'nodes_falsenodeids'):
+                    value = 0 if is_leaf else new_id[value]
+                out[name].append(value)
+            if is_leaf:
+                for c, w in sorted(src['weights'].items()):
+                    class_out['class_treeids'].append(new_tree)
+                    class_out['class_nodeids'].append(new_id[nid])
+                    class_out['class_ids'].append(c)
+                    class_out['class_weights'].append(w)
+
+    replaced = set(out) | set(class_out) | {'base_values'}
+    keep = [a for a in node.attribute if a.name not in replaced]
+    del node.attribute[:]
+    node.attribute.extend(keep)
+    for name, values in {**out, **class_out, 'base_values': base_values}.items():
+        node.attribute.append(helper.make_attribute(name, values))
+    return before, (len(kept), len(out['nodes_nodeids']))
+
+def compact_onnx(proto, leaf_tol):
+    """Compacted copy of `proto`; every TreeEnsembleClassifier in the graph (bag members included) is rewritten"""
+    compacted = onnx.ModelProto()
+    compacted.CopyFrom(proto)
+    stats = [compact_tree_node(node, leaf_tol) for node in compacted.graph.node if node.op_type == 'TreeEnsembleClassifier']
+    onnx.checker.check_model(compacted)
+    trees = (sum(b[0] for b, _ in stats), sum(a[0] for _, a in stats))
+    nodes = (sum(b[1] for b, _ in stats), sum(a[1] for _, a in stats))
+    return compacted, trees, nodes
+
+def _probabilities(session, X):
+    return session.run(None, {session.get_inputs()[0].name: X})[1]
+
+def _latency_ms(session, X, runs=100):
+    feed = {session.get_inputs()[0].name: X[-1:]}
+    session.run(None, feed)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        session.run(None, feed)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+def compact_verified(proto, X, k, tolerances=TOLERANCES, prob_tol=PROB_TOL, min_agreement=0.99):
+    """
+    Try leaf tolerances from the most aggressive down and keep the first compacted model whose
+    probabilities on X stay within prob_tol and whose top-k sets match on at least
+    min_agreement of the rows. Returns (proto, report); proto is the original if none passes.
+    """
+    X = X.astype(np.float32)
+    reference = _probabilities(ort.InferenceSession(proto.SerializeToString()), X)
+    ref_top = np.sort(np.argsort(reference, axis=1)[:, -k:], axis=1)
+    for leaf_tol in sorted(tolerances, reverse=True):
+        compacted, trees, nodes = compact_onnx(proto, leaf_tol)
+        probs = _probabilities(ort.InferenceSession(compacted.SerializeToString()), X)
+        max_dp = float(np.max(np.abs(probs - reference)))
+        agreement = float(np.mean(np.all(np.sort(np.argsort(probs, axis=1)[:, -k:], axis=1) == ref_top, axis=1)))
+        if max_dp <= prob_tol and agreement >= min_agreement:
+            return compacted, {'leaf_tol': leaf_tol, 'trees': trees, 'nodes': nodes, 'max_dp': max_dp, 'agreement': agreement}
+    return proto, None
+
+def run(files=None, prob_tol=PROB_TOL, min_agreement=0.99):
+    print("Loading historical windows for verification...")
+    df = load_frame()
+    windows = {'red': build_red_windows(df).astype(np.float32), 'blue': build_blue_windows(df).astype(np.float32)}
+
+    rows = []
+    for name in files or list(TARGETS):
+        if not os.path.exists(name):
+            print(f"Skipping {name} (not exported)")
+            continue
+        color, k = TARGETS[name]
+        print(f"Compacting {name}...")
+        original = onnx.load(name)
+        size_before = os.path.getsize(name) / 1024.0
+        ms_before = _latency_ms(ort.InferenceSession(name), windows[color])
+        compacted, report = compact_verified(original, windows[color], k, prob_tol=prob_tol, min_agreement=min_agreement)
+        if report is None:
+            print(f"  no tolerance keeps {name} within |dP| <= {prob_tol} and top-{k} agreement >= {min_agreement:.0%}; left as is")
+            continue
+        drift = release_tolerance(name) + prob_tol
+        onnx.save(compacted, name)
+        record_release(name, drift)
+        session = ort.InferenceSession(name)
+        rows.append((name, k, report, size_before, os.path.getsize(name) / 1024.0, ms_before, _latency_ms(session, windows[color])))
+
+    print("-" * 112)
+    print(f"{'Model':<20} | {'Leaf tol':>8} | {'Trees':>13} | {'Nodes':>17} | {'Size (KB)':>15} | {'p50 (ms)':>13} | {'max|dP|':>8} | {'Top-k':>6}")
+    print("-" * 112)
+    for name, k, r, kb0, kb1, ms0, ms1 in rows:
+        print(f"{name:<20} | {r['leaf_tol']:>8g} | {r['trees'][0]:>6}->{r['trees'][1]:<6} | {r['nodes'][0]:>8}->{r['nodes'][1]:<7} | "
+              f"{kb0:>7.0f}->{kb1:<6.0f} | {ms0:>6.3f}->{ms1:<5.3f} | {r['max_dp']:>8.1e} | {r['agreement']:>5.1%}")
+    print("-" * 112)
+
+    assets_dir = "../flutter_app/assets/models/"
+    if rows and os.path.exists(assets_dir):
+        print(f"Copying compacted models to {assets_dir}...")
+        for name, *_ in rows:
+            shutil.copy(name, os.path.join(assets_dir, name))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', nargs='+', choices=sorted(TARGETS), default=None)
+    parser.add_argument('--prob-tol', type=float, default=PROB_TOL, help='max allowed |dP| on any historical window')
+    parser.add_argument('--min-agreement', type=float, default=0.99, help='fraction of windows whose top-k set must be unchanged')
+    args = parser.parse_args()
+    run(args.files, args.prob_tol, args.min_agreement)
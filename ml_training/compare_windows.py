@@ -1,8 +1,8 @@
-import pandas as pd
 import numpy as np
 import xgboost as xgb
 import joblib
 import os
+from draw_history import load_frame
 
 def calculate_ac_value(reds):
     diffs = set()
@@ -89,7 +89,7 @@ def prepare_blue_features(df):
 
 def evaluate_window(window_size, test_count=100):
     seq_len = 15
-    df = pd.read_csv('ml_training/ssq_data.csv').sort_values('issue').reset_index(drop=True)
+    df = load_frame()
     
     # We want the latest test_count for testing.
     # The training window size is window_size.
@@ -1,8 +1,9 @@
 import joblib
 import numpy as np
-import onnxmltools
-from onnxmltools.convert.common.data_types import FloatTensorType
 import onnxruntime as ort
+from train_xgboost import load_red_mask, red_columns_for
+from feature_selection import prepend_column_gather
+from boosters import booster_to_onnx
 
 def convert():
     print("Loading models...")
@@ -14,16 +15,17 @@ def convert():
     
     print("Converting Red Model to ONNX...")
     # input: 1785 features
-    initial_type_red = [('input', FloatTensorType([None, 1785]))]
-    onx_red = onnxmltools.convert_xgboost(red_model, initial_types=initial_type_red, target_opset=12)
+    red_columns = red_columns_for(red_model, load_red_mask())
+    onx_red = booster_to_onnx(red_model, 1785 if red_columns is None else len(red_columns))
+    if red_columns is not None:
+        onx_red = prepend_column_gather(onx_red, red_columns)
     with open("red_ball_xgb.onnx", "wb") as f:
         f.write(onx_red.SerializeToString())
     print("Red ONNX saved.")
 
     print("Converting Blue Model to ONNX...")
     # input: 480 features
-    initial_type_blue = [('input', FloatTensorType([None, 480]))]
-    onx_blue = onnxmltools.convert_xgboost(blue_model, initial_types=initial_type_blue, target_opset=12)
+    onx_blue = booster_to_onnx(blue_model, 480)
     with open("blue_ball_xgb.onnx", "wb") as f:
         f.write(onx_blue.SerializeToString())
     print("Blue ONNX saved.")
@@ -0,0 +1,145 @@
+import argparse
+import os
+import time
+import numpy as np
+import joblib
+import lightgbm as lgb
+import onnx
+import onnxmltools
+import onnxruntime as ort
+from onnx import helper, compose, numpy_helper
+from onnxmltools.convert.common.data_types import FloatTensorType
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType as SklFloatTensorType
+from sklearn.neural_network import MLPRegressor
+from boosters import merge_onnx
+from train_xgboost import build_red_windows, build_blue_windows, load_red_mask, red_columns_for, RED_DIM, BLUE_DIM
+from draw_history import load_frame
+from draw_bits import top_k_masks, popcount
+
+# Distil the 4-model production ensemble (red/blue x XGBoost/LightGBM) into one small student per
+# color, trained on the teacher's soft probabilities over every historical window, and shipped
+# as a single ONNX file with two inputs (red_input, blue_input) and two outputs (red_probs, blue_probs).
+
+STUDENT_FILE = 'student_ensemble.onnx'
+
+def teacher_probs(models, X, columns=None):
+    X_in = X if columns is None else X[:, columns]
+    return np.mean([model.predict_proba(X_in) for model in models], axis=0)
+
+def fit_mlp_student(X, soft, hidden=(64,), seed=42):
+    """Regress centred log-probabilities; softmax of the output reproduces the teacher distribution"""
+    logits = np.log(soft + 1e-9)
+    logits -= logits.mean(axis=1, keepdims=True)
+    student = MLPRegressor(hidden_layer_sizes=hidden, activation='relu', max_iter=300,
+                           early_stopping=True, random_state=seed)
+    student.fit(X, logits)
+    return student
+
+def fit_booster_student(X, soft, rounds=20, seed=42):
+    """Few-tree multiclass booster on soft labels: each window is repeated once per class, weighted by the teacher probability"""
+    num_class = soft.shape[1]
+    X_rep = np.repeat(X, num_class, axis=0)
+    y_rep = np.tile(np.arange(num_class), len(X))
+    student = lgb.LGBMClassifier(n_estimators=rounds, max_depth=3, num_leaves=8, learning_rate=0.2,
+                                 objective='multiclass', num_class=num_class, random_state=seed, verbose=-1)
+    student.fit(X_rep, y_rep, sample_weight=soft.reshape(-1))
+    return student
+
+def student_probs(student, X):
+    if isinstance(student, MLPRegressor):
+        logits = student.predict(X)
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+    return student.predict_proba(X)
+
+def student_to_onnx(student, input_dim, prefix):
+    """ONNX graph with input '{prefix}_input' and a single probability output '{prefix}_probs'"""
+    if isinstance(student, MLPRegressor):
+        initial_type = [('input', SklFloatTensorType([None, input_dim]))]
+        proto = convert_sklearn(student, initial_types=initial_type, target_opset=12)
+        # skl2onnx flattens multi-output regressors to (N*num_class, 1); restore the rows before the softmax
+        proto.graph.initializer.append(numpy_helper.from_array(np.array([-1, student.n_outputs_], dtype=np.int64), name='logits_shape'))
+        proto.graph.node.append(helper.make_node('Reshape', [proto.graph.output[0].name, 'logits_shape'], ['logits']))
+        proto.graph.node.append(helper.make_node('Softmax', ['logits'], ['probs'], axis=1))
+    else:
+        initial_type = [('input', FloatTensorType([None, input_dim]))]
+        proto = onnxmltools.convert_lightgbm(student, initial_types=initial_type, target_opset=12, zipmap=False)
+        # LightGBM graphs emit (label, probabilities); only the probabilities are kept
+        proto.graph.node.append(helper.make_node('Identity', [proto.graph.output[1].name], ['probs']))
+    num_class = student.n_outputs_ if isinstance(student, MLPRegressor) else student.n_classes_
+    del proto.graph.output[:]
+    proto.graph.output.append(helper.make_tensor_value_info('probs', onnx.TensorProto.FLOAT, [None, num_class]))
+    return compose.add_prefix(proto, prefix + '_')
+
+def onnx_latency_ms(sessions_and_feeds, runs=200):
+    for sess, feed in sessions_and_feeds:
+        sess.run(None, feed)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for sess, feed in sessions_and_feeds:
+            sess.run(None, feed)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+def distill(kind='mlp', holdout=200):
+    print("Loading data and teacher ensemble...")
+    df = load_frame()
+    red_teacher = [joblib.load('red_ball_xgb.joblib'), joblib.load('red_ball_lgbm.joblib')]
+    blue_teacher = [joblib.load('blue_ball_xgb.joblib'), joblib.load('blue_ball_lgbm.joblib')]
+    red_columns = red_columns_for(red_teacher[0], load_red_mask())
+
+    X_red = build_red_windows(df)
+    X_blue = build_blue_windows(df)
+    print("Collecting teacher soft probabilities...")
+    soft_red = teacher_probs(red_teacher, X_red, red_columns)
+    soft_blue = teacher_probs(blue_teacher, X_blue)
+
+    print(f"Training {kind} students on {len(X_red) - holdout} windows (holding out the last {holdout})...")
+    fit = fit_mlp_student if kind == 'mlp' else fit_booster_student
+    red_student = fit(X_red[:-holdout], soft_red[:-holdout])
+    blue_student = fit(X_blue[:-holdout], soft_blue[:-holdout])
+
+    # Fidelity on windows the student never saw
+    s_red = student_probs(red_student, X_red[-holdout:])
+    s_blue = student_probs(blue_student, X_blue[-holdout:])
+    overlap = np.mean(popcount(top_k_masks(soft_red[-holdout:], 12) & top_k_masks(s_red, 12)))
+    blue_agree = np.mean(np.argmax(soft_blue[-holdout:], axis=1) == np.argmax(s_blue, axis=1)) * 100
+    red_dev = np.max(np.abs(soft_red[-holdout:] - s_red))
+
+    merged = merge_onnx([student_to_onnx(red_student, RED_DIM, 'red'), student_to_onnx(blue_student, BLUE_DIM, 'blue')])
+    onnx.save(merged, STUDENT_FILE)
+
+    student_sess = ort.InferenceSession(STUDENT_FILE)
+    onnx_red, onnx_blue = student_sess.run(None, {'red_input': X_red[-holdout:].astype(np.float32),
+                                                  'blue_input': X_blue[-holdout:].astype(np.float32)})
+    onnx_dev = max(np.max(np.abs(onnx_red - s_red)), np.max(np.abs(onnx_blue - s_blue)))
+    red_in, blue_in = X_red[-1:].astype(np.float32), X_blue[-1:].astype(np.float32)
+    student_ms = onnx_latency_ms([(student_sess, {'red_input': red_in, 'blue_input': blue_in})])
+    student_kb = os.path.getsize(STUDENT_FILE) / 1024.0
+
+    teacher_files = ['red_ball_xgb.onnx', 'red_ball_lgbm.onnx', 'blue_ball_xgb.onnx', 'blue_ball_lgbm.onnx']
+    teacher_kb, teacher_ms = None, None
+    if all(os.path.exists(f) for f in teacher_files):
+        teacher_kb = sum(os.path.getsize(f) for f in teacher_files) / 1024.0
+        feeds = [red_in, red_in, blue_in, blue_in]
+        teacher_ms = onnx_latency_ms([(ort.InferenceSession(f), {'input': x}) for f, x in zip(teacher_files, feeds)])
+
+    print("-" * 60)
+    print(f"Red top-12 overlap with teacher: {overlap:.2f}/12 (max |dP| {red_dev:.4f})")
+    print(f"Blue top-1 agreement with teacher: {blue_agree:.1f}%")
+    print(f"ONNX vs Python student max |dP|: {onnx_dev:.2e}")
+    print(f"{'':<10} | {'Files':>5} | {'Size (KB)':>10} | {'p50 (ms)':>9}")
+    if teacher_kb is not None:
+        print(f"{'Teacher':<10} | {4:>5} | {teacher_kb:>10.1f} | {teacher_ms:>9.3f}")
+    print(f"{'Student':<10} | {1:>5} | {student_kb:>10.1f} | {student_ms:>9.3f}")
+    print("-" * 60)
+    print(f"Saved {STUDENT_FILE} (inputs: red_input[{RED_DIM}], blue_input[{BLUE_DIM}]; outputs: red_probs, blue_probs)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--student', choices=['mlp', 'booster'], default='mlp')
+    parser.add_argument('--holdout', type=int, default=200, help='most recent windows kept out of student training for the fidelity check')
+    args = parser.parse_args()
+    distill(args.student, args.holdout)
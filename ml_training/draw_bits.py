@@ -0,0 +1,98 @@
+import numpy as np
+
+# Draws and candidate pools as bitsets: bit n-1 set when number n is in the set. A red draw or
+# pool is a 33-bit mask in a uint64, a blue ball a 16-bit mask in a uint16. Hits between draws
+# and pools are popcount(draw & pool), so whole arrays of draws are compared with a handful of
+# vectorized integer operations instead of Python set intersections.
+
+RED_NUMBERS, BLUE_NUMBERS = 33, 16
+RED_ALL = np.uint64((1 << RED_NUMBERS) - 1)
+BLUE_ALL = np.uint16((1 << BLUE_NUMBERS) - 1)
+
+def _mask_of(numbers):
+    return sum(1 << (n - 1) for n in numbers)
+
+# Number classes used by the draw statistics
+ODD = np.uint64(_mask_of(range(1, 34, 2)))
+HIGH = np.uint64(_mask_of(range(17, 34)))
+PRIMES = np.uint64(_mask_of([2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31]))
+ZONES = [np.uint64(_mask_of(range(1, 12))), np.uint64(_mask_of(range(12, 23))), np.uint64(_mask_of(range(23, 34)))]
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(masks):
+        """Set bits per element, as uint8"""
+        return np.bitwise_count(np.asarray(masks))
+else:
+    def popcount(masks):
+        """Set bits per element, as uint8 (SWAR fallback for NumPy < 2.0)"""
+        x = np.asarray(masks).astype(np.uint64)
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.uint8)
+
+def red_masks(numbers):
+    """uint64 masks from 1-based red numbers; the last axis holds one set (a draw or a pool)"""
+    numbers = np.asarray(numbers, dtype=np.int64)
+    return np.bitwise_or.reduce(np.left_shift(np.uint64(1), (numbers - 1).astype(np.uint64)), axis=-1)
+
+def blue_masks(blue):
+    """uint16 masks from 1-based blue numbers (one ball per element)"""
+    blue = np.asarray(blue, dtype=np.int64)
+    return np.left_shift(np.uint16(1), (blue - 1).astype(np.uint16)).astype(np.uint16)
+
+def top_k_masks(probs, k):
+    """Mask of the k most probable classes per row of an N x C probability matrix (class c -> bit c)"""
+    top = np.argsort(probs, axis=1)[:, -k:]
+    return red_masks(top + 1)
+
+def unpack(masks, width=RED_NUMBERS):
+    """Boolean membership matrix [..., width] (column n-1 for number n)"""
+    masks = np.asarray(masks).astype(np.uint64)
+    return ((masks[..., None] >> np.arange(width, dtype=np.uint64)) & np.uint64(1)).astype(bool)
+
+def pack(membership):
+    """Inverse of unpack: boolean [..., width] -> uint64 masks"""
+    membership = np.asarray(membership, dtype=bool)
+    weights = np.left_shift(np.uint64(1), np.arange(membership.shape[-1], dtype=np.uint64))
+    return np.bitwise_or.reduce(np.where(membership, weights, np.uint64(0)), axis=-1)
+
+def numbers(mask):
+    """Sorted 1-based numbers of one mask"""
+    mask = int(mask)
+    return [n + 1 for n in range(mask.bit_length()) if mask >> n & 1]
+
+def hits(draws, pools):
+    """popcount(draw & pool), broadcast: one pool against many draws, pairwise, or draws x pools with [:, None]"""
+    return popcount(np.bitwise_and(draws, pools))
+
+def union(masks, axis=None):
+    return np.bitwise_or.reduce(np.asarray(masks), axis=axis)
+
+def intersection(masks, axis=None):
+    return np.bitwise_and.reduce(np.asarray(masks), axis=axis)
+
+def counts(masks, width=RED_NUMBERS):
+    """How many masks contain each number (int64 [width])"""
+    return unpack(masks, width).sum(axis=0)
+
+def contains(masks, number):
+    return ((np.asarray(masks) >> np.uint64(number - 1)) & np.uint64(1)) == 1
+
+def distinct_differences(masks):
+    """Number of distinct pairwise differences per red mask (d is present when mask & mask >> d)"""
+    masks = np.asarray(masks, dtype=np.uint64)
+    return sum(((masks & (masks >> np.uint64(d))) != 0).astype(np.int64) for d in range(1, RED_NUMBERS))
+
+def longest_run(masks):
+    """Longest run of consecutive numbers per mask (each shift-and removes one from every run)"""
+    masks = np.asarray(masks, dtype=np.uint64).copy()
+    run = np.zeros(masks.shape, dtype=np.int64)
+    while np.any(masks):
+        run += masks != 0
+        masks &= masks >> np.uint64(1)
+    return run
+
+def from_store(store):
+    """(red masks uint64 [H], blue masks uint16 [H]) for a draw_history.DrawStore"""
+    return red_masks(store.reds), blue_masks(store.blue)
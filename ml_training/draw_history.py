@@ -0,0 +1,291 @@
+import argparse
+import csv
+import mmap
+import os
+import struct
+import zlib
+import numpy as np
+
+# The draw history as one binary store (ssq_draws.bin) next to ssq_data.csv.
+#
+#   header  magic 'SSQDRAW1' | uint32 record size | uint32 record count | uint32 crc32 of records | 12 reserved
+#   record  uint16 issue | uint8 x6 reds | uint8 blue | uint8 second | uint16 minute of day | uint32 date ordinal
+#
+# Records are fixed-width (16 bytes), sorted by issue and append-only: new draws are written after
+# the last record and only then counted in the header, so an interrupted append leaves the old
+# store intact. Readers mmap the file and get zero-copy NumPy views; nothing here imports pandas.
+# ssq_data.csv stays the crawler's format: sync() folds CSV changes into the store, and export()
+# writes the store back out to the CSV copies (repo root, the app's bundled history).
+
+DATA_FILE = 'ssq_data.csv'
+STORE_FILE = 'ssq_draws.bin'
+DRAWS_FILE = 'ssq_from_draws.onnx'   # the shipped ensemble behind the in-graph feature pass (onnx_features)
+HISTORY = 45   # draws the next-draw feature row is computed from (predict_next and the feature graph)
+NUMBER_COLUMNS = ['red1', 'red2', 'red3', 'red4', 'red5', 'red6', 'blue']
+
+MAGIC = b'SSQDRAW1'
+HEADER = struct.Struct('<8sIII12x')
+RECORD = np.dtype([('issue', '<u2'), ('reds', 'u1', (6,)), ('blue', 'u1'), ('second', 'u1'),
+                   ('minute', '<u2'), ('date', '<u4')])
+EPOCH_ORDINAL = 719163   # datetime.date(1970, 1, 1).toordinal()
+
+# CSV copies kept in sync with the store, relative to ml_training: path -> export options
+COPIES = {
+    '../ssq_data.csv': {},
+    # The app bundles the most recent 499 draws, newest first, with a UTF-8 BOM
+    '../flutter_app/assets/data/history.csv': {'newest_first': True, 'limit': 499, 'bom': True},
+}
+
+def _default_base():
+    return os.path.dirname(os.path.abspath(__file__))
+
+def records_from_columns(issues, dates, numbers):
+    """RECORD array from issue numbers, 'YYYY-MM-DD HH:MM:SS' strings and an N x 7 number table"""
+    issues = np.asarray(issues, dtype=np.int64)
+    numbers = np.asarray(numbers, dtype=np.int64).reshape(-1, 7)
+    if len(issues) and (issues.min() < 0 or issues.max() > np.iinfo(np.uint16).max):
+        raise ValueError("Issue numbers must fit in uint16")
+    if len(numbers) and (numbers.min() < 0 or numbers.max() > 255):
+        raise ValueError("Draw numbers must fit in uint8")
+    stamps = np.array([d.strip().replace(' ', 'T') for d in dates], dtype='datetime64[s]')
+    days = stamps.astype('datetime64[D]')
+    seconds = (stamps - days).astype(np.int64)
+    records = np.zeros(len(issues), dtype=RECORD)
+    records['issue'] = issues
+    records['reds'] = numbers[:, :6]
+    records['blue'] = numbers[:, 6]
+    records['minute'] = seconds // 60
+    records['second'] = seconds % 60
+    records['date'] = days.astype(np.int64) + EPOCH_ORDINAL
+    return records
+
+def read_csv(path):
+    """RECORD array from a history CSV (any column order, optional BOM), sorted by issue"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader)]
+        columns = [header.index(name) for name in NUMBER_COLUMNS]
+        issue_col, date_col = header.index('issue'), header.index('date')
+        rows = [row for row in reader if row]
+    records = records_from_columns([int(row[issue_col]) for row in rows], [row[date_col] for row in rows],
+                                   [[int(row[c]) for c in columns] for row in rows])
+    return records[np.argsort(records['issue'], kind='stable')]
+
+def date_strings(records):
+    """'YYYY-MM-DD HH:MM:SS' per record, as in ssq_data.csv"""
+    seconds = ((records['date'].astype(np.int64) - EPOCH_ORDINAL) * 86400
+               + records['minute'].astype(np.int64) * 60 + records['second'])
+    return np.char.replace(np.datetime_as_string(seconds.astype('datetime64[s]')), 'T', ' ')
+
+def problems(records):
+    """Human-readable integrity violations in a RECORD array (empty when valid)"""
+    found = []
+    reds = records['reds'].astype(np.int64)
+    if np.any(np.diff(records['issue'].astype(np.int64)) <= 0):
+        found.append("issues are not strictly increasing")
+    if np.any((reds < 1) | (reds > 33)):
+        found.append("red numbers outside 1-33")
+    if np.any(np.diff(reds, axis=1) <= 0):
+        found.append("red numbers not strictly increasing within a draw")
+    if np.any((records['blue'] < 1) | (records['blue'] > 16)):
+        found.append("blue numbers outside 1-16")
+    if np.any((records['minute'] >= 24 * 60) | (records['second'] >= 60)):
+        found.append("times of day out of range")
+    return found
+
+def _check(records):
+    found = problems(records)
+    if found:
+        raise ValueError("Invalid draw records: " + "; ".join(found))
+
+def write_store(path, records):
+    """Write a complete store atomically"""
+    _check(records)
+    data = np.ascontiguousarray(records, dtype=RECORD).tobytes()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, RECORD.itemsize, len(records), zlib.crc32(data)))
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def append(path, records):
+    """Append draws newer than the last stored issue; records first, then the header that counts them"""
+    records = np.ascontiguousarray(records, dtype=RECORD)
+    if len(records) == 0:
+        return
+    _check(records)
+    with open(path, 'r+b') as f:
+        magic, record_size, count, crc = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or record_size != RECORD.itemsize:
+            raise ValueError(f"{path} is not a draw store")
+        if count:
+            f.seek(HEADER.size + (count - 1) * RECORD.itemsize)
+            last = np.frombuffer(f.read(RECORD.itemsize), dtype=RECORD)[0]
+            if records['issue'][0] <= last['issue']:
+                raise ValueError(f"Append must start after issue {last['issue']}, got {records['issue'][0]}")
+        data = records.tobytes()
+        f.seek(HEADER.size + count * RECORD.itemsize)
+        f.write(data)
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, RECORD.itemsize, count + len(records), zlib.crc32(data, crc)))
+        f.flush()
+        os.fsync(f.fileno())
+
+class DrawStore:
+    """Read side: the records as a zero-copy view over a read-only mmap"""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        magic, record_size, count, self.crc = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC or record_size != RECORD.itemsize:
+            self._file.close()
+            raise ValueError(f"{path} is not a draw store")
+        if os.fstat(self._file.fileno()).st_size < HEADER.size + count * RECORD.itemsize:
+            self._file.close()
+            raise ValueError(f"{path} is truncated: header counts {count} records")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.records = np.frombuffer(self._map, dtype=RECORD, count=count, offset=HEADER.size)
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        """Views handed out by this store must be released first"""
+        self.records = None
+        self._map.close()
+        self._file.close()
+
+    @property
+    def issues(self):
+        return self.records['issue']
+
+    @property
+    def reds(self):
+        return self.records['reds']
+
+    @property
+    def blue(self):
+        return self.records['blue']
+
+    def draws(self):
+        """H x 7 int64 copy (red1..red6, blue), the layout of the feature graph's input"""
+        table = np.empty((len(self.records), 7), dtype=np.int64)
+        table[:, :6] = self.records['reds']
+        table[:, 6] = self.records['blue']
+        return table
+
+    def verify(self):
+        """Integrity violations: checksum mismatch or invalid records (empty when the store is sound)"""
+        found = problems(self.records)
+        if zlib.crc32(self.records.tobytes()) != self.crc:
+            found.insert(0, "crc32 mismatch")
+        return found
+
+def sync(base_path=None):
+    """
+    Open the store under base_path after folding in ssq_data.csv: new issues are appended, any
+    other difference (a corrected or removed draw) rebuilds it. Skipped when the CSV is older.
+    """
+    base_path = base_path or _default_base()
+    csv_path, store_path = os.path.join(base_path, DATA_FILE), os.path.join(base_path, STORE_FILE)
+    if os.path.exists(store_path) and os.path.getmtime(store_path) >= os.path.getmtime(csv_path):
+        return DrawStore(store_path)
+    records = read_csv(csv_path)
+    if os.path.exists(store_path):
+        store = DrawStore(store_path)
+        stored = len(store)
+        prefix = stored <= len(records) and np.array_equal(store.records, records[:stored]) and not store.verify()
+        store.close()
+        if prefix:
+            append(store_path, records[stored:])
+            os.utime(store_path)
+            return DrawStore(store_path)
+    write_store(store_path, records)
+    return DrawStore(store_path)
+
+def export(records, path, newest_first=False, limit=None, bom=False):
+    """Write records as a history CSV (atomically), in the format of ssq_data.csv"""
+    if limit is not None:
+        records = records[-limit:]
+    dates = date_strings(records)
+    order = range(len(records) - 1, -1, -1) if newest_first else range(len(records))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8-sig' if bom else 'utf-8', newline='') as f:
+        f.write('issue,date,' + ','.join(NUMBER_COLUMNS) + '\n')
+        for i in order:
+            r = records[i]
+            f.write(f"{r['issue']},{dates[i]}," + ','.join(f'{n:02d}' for n in r['reds']) + f",{r['blue']:02d}\n")
+    os.replace(tmp_path, path)
+
+def sync_copies(base_path=None):
+    """Sync the store from ssq_data.csv and rewrite the CSV copies that exist; returns the paths written"""
+    base_path = base_path or _default_base()
+    store = sync(base_path)
+    written = []
+    for relative, options in COPIES.items():
+        path = os.path.normpath(os.path.join(base_path, relative))
+        if os.path.exists(path):
+            export(store.records, path, **options)
+            written.append(path)
+    store.close()
+    return written
+
+def load(base_path=None):
+    """(issues int64 [H], draws int64 [H, 7] as red1..red6, blue), sorted by issue"""
+    store = sync(base_path)
+    issues, draws = store.issues.astype(np.int64), store.draws()
+    store.close()
+    return issues, draws
+
+def load_frame(base_path=None):
+    """The history as the DataFrame scripts used to get from read_csv(...).sort_values('issue')"""
+    import pandas as pd
+    store = sync(base_path)
+    records = store.records
+    frame = pd.DataFrame({'issue': records['issue'].astype(np.int64), 'date': date_strings(records).astype(object)})
+    for k, name in enumerate(NUMBER_COLUMNS[:6]):
+        frame[name] = records['reds'][:, k].astype(np.int64)
+    frame['blue'] = records['blue'].astype(np.int64)
+    del records
+    store.close()
+    return frame
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['sync', 'verify', 'info', 'export'])
+    parser.add_argument('--base-path', default=_default_base(), help='directory with ssq_data.csv')
+    parser.add_argument('--output', default=None, help='export: CSV path to write')
+    parser.add_argument('--newest-first', action='store_true')
+    parser.add_argument('--limit', type=int, default=None, help='export: most recent N draws only')
+    parser.add_argument('--bom', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'sync':
+        for path in sync_copies(args.base_path):
+            print(f"Wrote {path}")
+    store = sync(args.base_path)
+    if args.command in ('sync', 'info', 'verify'):
+        dates = date_strings(store.records[[0, -1]]) if len(store) else ['-', '-']
+        print(f"{store.path}: {len(store)} draws, issues {store.issues[0] if len(store) else '-'}-"
+              f"{store.issues[-1] if len(store) else '-'} ({dates[0]} .. {dates[-1]}), "
+              f"{os.path.getsize(store.path) / 1024:.1f} KB")
+    if args.command == 'verify':
+        found = store.verify()
+        csv_records = read_csv(os.path.join(args.base_path, DATA_FILE))
+        if not np.array_equal(store.records, csv_records):
+            found.append(f"differs from {DATA_FILE}")
+        store.close()
+        if found:
+            raise ValueError("Draw store failed verification: " + "; ".join(found))
+        print("crc32, record checks and CSV round trip OK")
+    elif args.command == 'export':
+        if not args.output:
+            parser.error('export needs --output')
+        export(store.records, args.output, args.newest_first, args.limit, args.bom)
+        store.close()
+        print(f"Wrote {args.output}")
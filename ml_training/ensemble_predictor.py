@@ -0,0 +1,177 @@
+import json
+import os
+import time
+import joblib
+import numpy as np
+import xgboost as xgb
+import lightgbm as lgb
+from boosters import BaggedBooster
+from train_xgboost import load_red_mask, red_columns_for
+
+RED_MEMBERS = ['red_ball_xgb.joblib', 'red_ball_lgbm.joblib']
+BLUE_MEMBERS = ['blue_ball_xgb.joblib', 'blue_ball_lgbm.joblib']
+
+def _native_predictor(model):
+    """Fastest probability path for one fitted member, skipping the sklearn wrapper's checks and copies"""
+    if isinstance(model, xgb.XGBClassifier):
+        booster = model.get_booster()
+        return lambda X: booster.inplace_predict(X)
+    if isinstance(model, lgb.LGBMClassifier):
+        booster = model.booster_
+        return lambda X: booster.predict(X)
+    return model.predict_proba
+
+def _expand(models, weights):
+    """Flatten bags into their members; a bag's weight is shared equally by its members"""
+    weights = np.ones(len(models)) if weights is None else np.asarray(weights, dtype=float)
+    if len(weights) != len(models):
+        raise ValueError(f"Got {len(weights)} weights for {len(models)} models")
+    members, member_weights = [], []
+    for model, weight in zip(models, weights):
+        parts = model.members if isinstance(model, BaggedBooster) else [model]
+        members.extend(parts)
+        member_weights.extend([weight / len(parts)] * len(parts))
+    member_weights = np.array(member_weights)
+    return members, [_native_predictor(m) for m in members], member_weights / member_weights.sum()
+
+class _ChunkedMember:
+    """Raw margins of one booster, a range of boosting rounds at a time"""
+    def __init__(self, model):
+        self.n_classes = model.n_classes_
+        if isinstance(model, xgb.XGBClassifier):
+            self.booster = model.get_booster()
+            self.kind = 'xgb'
+            self.rounds = self.booster.num_boosted_rounds()
+            # Every XGBoost margin call adds base_score; it is subtracted per chunk and added back once
+            params = json.loads(self.booster.save_config())['learner']['learner_model_param']
+            self.base = np.array([float(v) for v in params['base_score'].strip('[]').split(',')])
+        elif isinstance(model, lgb.LGBMClassifier):
+            self.booster = model.booster_
+            self.kind = 'lgbm'
+            self.rounds = self.booster.current_iteration()
+            self.base = 0.0
+        else:
+            raise ValueError(f"Anytime prediction needs XGBoost or LightGBM members, got {type(model).__name__}")
+
+    def margin(self, X, start, stop):
+        if self.kind == 'xgb':
+            return self.booster.inplace_predict(X, iteration_range=(start, stop), predict_type='margin') - self.base
+        return self.booster.predict(X, start_iteration=start, num_iteration=stop - start, raw_score=True)
+
+def _softmax(margin):
+    e = np.exp(margin - margin.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+def top_k(probs, k):
+    """1-based numbers of the k most probable classes per row, most probable first"""
+    return np.argsort(-probs, axis=1, kind='stable')[:, :k] + 1
+
+class EnsemblePredictor:
+    """
+    Weighted average of the red/blue booster members over a batch of feature rows.
+    Red rows are always the full 1785 columns; a persisted feature mask is applied here.
+    Either color may be omitted (e.g. the walk-forward backtests train red and blue separately).
+    """
+    def __init__(self, red_models=None, blue_models=None, red_weights=None, blue_weights=None, red_columns=None):
+        self.red_columns = red_columns
+        self._red = _expand(red_models, red_weights) if red_models else None
+        self._blue = _expand(blue_models, blue_weights) if blue_models else None
+        self._chunked = {}
+
+    @classmethod
+    def load(cls, base_path=None, red_weights=None, blue_weights=None):
+        base_path = base_path or os.path.dirname(os.path.abspath(__file__))
+        red_models = [joblib.load(os.path.join(base_path, name)) for name in RED_MEMBERS]
+        blue_models = [joblib.load(os.path.join(base_path, name)) for name in BLUE_MEMBERS]
+        red_columns = red_columns_for(red_models[0], load_red_mask(base_path))
+        return cls(red_models, blue_models, red_weights, blue_weights, red_columns)
+
+    @classmethod
+    def from_bundle(cls, path, red_weights=None, blue_weights=None):
+        """Members from a model_bundle.py file instead of the joblib artifacts"""
+        from model_bundle import ModelBundle
+        bundle = ModelBundle(path)
+        red_models = [bundle.load(name) for name in RED_MEMBERS]
+        blue_models = [bundle.load(name) for name in BLUE_MEMBERS]
+        mask = bundle.metadata['red_columns']
+        red_columns = red_columns_for(red_models[0], None if mask is None else np.array(mask, dtype=np.int64))
+        return cls(red_models, blue_models, red_weights, blue_weights, red_columns)
+
+    @staticmethod
+    def _average(members, X):
+        _, predictors, weights = members
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        probs = sum(w * predict(X) for predict, w in zip(predictors, weights))
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict_red(self, X):
+        if self._red is None:
+            raise ValueError("No red models loaded")
+        X = np.atleast_2d(X)
+        if self.red_columns is not None:
+            X = X[:, self.red_columns]
+        return self._average(self._red, X)
+
+    def predict_blue(self, X):
+        if self._blue is None:
+            raise ValueError("No blue models loaded")
+        return self._average(self._blue, np.atleast_2d(X))
+
+    def _anytime(self, color, X, k, chunk, stable_chunks, budget_ms):
+        """
+        Evaluate all members `chunk` boosting rounds at a time (round-robin) and stop as soon as
+        the top-k set of every row has been unchanged for `stable_chunks` consecutive chunks,
+        or when budget_ms has elapsed. Running to the end reproduces the full prediction.
+        """
+        start_time = time.perf_counter()
+        models, _, weights = self._red if color == 'red' else self._blue
+        if color not in self._chunked:
+            self._chunked[color] = [_ChunkedMember(m) for m in models]
+        members = self._chunked[color]
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        margins = [np.zeros((len(X), m.n_classes)) + m.base for m in members]
+        total = max(m.rounds for m in members)
+        done, stable, previous, reason = 0, 0, None, 'complete'
+        while done < total:
+            stop = min(done + chunk, total)
+            for member, margin in zip(members, margins):
+                if done < member.rounds:
+                    margin += member.margin(X, done, min(stop, member.rounds))
+            done = stop
+            probs = sum(w * _softmax(m) for m, w in zip(margins, weights))
+            top = np.sort(top_k(probs, k), axis=1)
+            stable = stable + 1 if previous is not None and np.array_equal(top, previous) else 0
+            previous = top
+            if done < total and stable >= stable_chunks:
+                reason = 'stable'
+                break
+            if done < total and budget_ms is not None and (time.perf_counter() - start_time) * 1000 >= budget_ms:
+                reason = 'budget'
+                break
+        info = {'rounds': done, 'total_rounds': total, 'stopped': reason,
+                'ms': (time.perf_counter() - start_time) * 1000}
+        return probs / probs.sum(axis=1, keepdims=True), info
+
+    def predict_red_anytime(self, X, k=12, chunk=10, stable_chunks=2, budget_ms=None):
+        """(probs, info) for red rows using as few boosting rounds as the top-k stability allows"""
+        if self._red is None:
+            raise ValueError("No red models loaded")
+        X = np.atleast_2d(X)
+        if self.red_columns is not None:
+            X = X[:, self.red_columns]
+        return self._anytime('red', X, k, chunk, stable_chunks, budget_ms)
+
+    def predict_blue_anytime(self, X, k=1, chunk=10, stable_chunks=2, budget_ms=None):
+        if self._blue is None:
+            raise ValueError("No blue models loaded")
+        return self._anytime('blue', np.atleast_2d(X), k, chunk, stable_chunks, budget_ms)
+
+    def predict(self, X_red, X_blue, red_k=12, blue_k=1):
+        red_probs = self.predict_red(X_red)
+        blue_probs = self.predict_blue(X_blue)
+        return {
+            'red_probs': red_probs,
+            'blue_probs': blue_probs,
+            'red_top': top_k(red_probs, red_k),
+            'blue_top': top_k(blue_probs, blue_k),
+        }
@@ -3,8 +3,6 @@ os.environ["KERAS_BACKEND"] = "tensorflow"
 import sys
 sys.path.append('..')
 import numpy as np
-import pandas as pd
-from tensorflow import keras
 from sklearn.linear_model import LogisticRegression
 from sklearn.neural_network import MLPClassifier
 from sklearn.ensemble import RandomForestClassifier
@@ -13,10 +11,11 @@ warnings.filterwarnings('ignore')
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from train_model import calculate_features
+from draw_history import load_frame
 
 def prepare_data():
     """Prepare data for experiments"""
-    df = pd.read_csv('../ssq_data.csv').sort_values('issue').reset_index(drop=True)
+    df = load_frame()
     rg, rf, m, rs, ra = calculate_features(df)
 
     seq_len = 15
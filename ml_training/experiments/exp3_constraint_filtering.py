@@ -3,18 +3,18 @@ os.environ["KERAS_BACKEND"] = "tensorflow"
 import sys
 sys.path.append('..')
 import numpy as np
-import pandas as pd
 from tensorflow import keras
-from itertools import combinations
 import warnings
 warnings.filterwarnings('ignore')
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from train_model import calculate_features
+from draw_history import load_frame
+from ticket_search import best_tickets, PRESETS
 
 def prepare_data():
     """Prepare data for experiments"""
-    df = pd.read_csv('../ssq_data.csv').sort_values('issue').reset_index(drop=True)
+    df = load_frame()
     rg, rf, m, rs, ra = calculate_features(df)
     seq_len = 15
     split_idx = int(len(df) * 0.9)
@@ -55,68 +55,30 @@ def select_top_12(probs):
     """Strategy 1: Simple top-12"""
     return np.argsort(probs)[-12:] + 1
 
-def select_with_sum_constraint(probs):
-    """Strategy 2: Top-15, filter by sum constraint (80-120)"""
-    top_15 = np.argsort(probs)[-15:] + 1
-
-    # Try all combinations of 6 from top-15
-    best_combo = None
-    best_score = -1
-
-    for combo in combinations(top_15, 6):
-        combo_sum = sum(combo)
-        if 80 <= combo_sum <= 120:
-            # Score by average probability
-            score = sum([probs[num-1] for num in combo])
-            if score > best_score:
-                best_score = score
-                best_combo = combo
+def select_constrained(probs, constraints, pool=15):
+    """Best constrained ticket from the top-`pool`, then the next best of the pool up to 12"""
+    found = best_tickets(probs, 1, constraints, pool)
 
     # If no valid combo found, fall back to top-12
-    if best_combo is None:
+    if not found:
         return select_top_12(probs)
 
-    # Return the 12 numbers: best_combo + next best from top-15
-    result = list(best_combo)
-    for num in top_15:
+    # Return the 12 numbers: best combo + next best from the pool
+    top = np.argsort(probs)[-pool:] + 1
+    result = list(found[0][1])
+    for num in top:
         if num not in result and len(result) < 12:
             result.append(num)
 
     return np.array(result)
 
+def select_with_sum_constraint(probs):
+    """Strategy 2: Top-15, filter by sum constraint (80-120)"""
+    return select_constrained(probs, PRESETS['sum'])
+
 def select_with_all_constraints(probs):
     """Strategy 3: Top-15, filter by multiple constraints"""
-    top_15 = np.argsort(probs)[-15:] + 1
-
-    best_combo = None
-    best_score = -1
-
-    for combo in combinations(top_15, 6):
-        combo_list = sorted(list(combo))
-        combo_sum = sum(combo_list)
-        span = max(combo_list) - min(combo_list)
-        odd_count = sum([1 for n in combo_list if n % 2 != 0])
-
-        # Check constraints
-        sum_ok = 80 <= combo_sum <= 120
-        span_ok = 20 <= span <= 30
-        odd_ok = 2 <= odd_count <= 4
-
-        if sum_ok and span_ok and odd_ok:
-            score = sum([probs[num-1] for num in combo])
-            if score > best_score:
-                best_score = score
-                best_combo = combo
-
-    if best_combo is None:
-        return select_top_12(probs)
-
-    result = list(best_combo)
-    for num in top_15:
-        if num not in result and len(result) < 12:
-            result.append(num)
-
-    return np.array(result)
+    return select_constrained(probs, PRESETS['exp3'])
 
 def select_dynamic_pool(probs):
     """Strategy 4: Dynamic pool size based on confidence"""
@@ -1,11 +1,47 @@
+import argparse
 import joblib
 import numpy as np
+import onnx
 import onnxmltools
 from onnxmltools.convert.common.data_types import FloatTensorType
 import onnxruntime as ort
 import os
+from red_panel import PANEL_DIM
+from train_xgboost import load_red_mask, red_columns_for
+from feature_selection import prepend_column_gather
+from boosters import booster_to_onnx, average_onnx, merge_onnx
 
-def convert():
+FUSED_FILE = 'ssq_ensemble.onnx'
+RED_TOP_K, BLUE_TOP_K = 12, 3
+
+def fuse_color(models, model_dim, top_k, columns=None, full_dim=None):
+    """XGBoost + LightGBM of one color as a single graph: shared input, in-graph average, TopK"""
+    fused = average_onnx([booster_to_onnx(m, model_dim) for m in models], model_dim, models[0].n_classes_, top_k=top_k)
+    if columns is not None:
+        fused = prepend_column_gather(fused, columns, full_dim)
+    return fused
+
+def fuse_colors(red_fused, blue_fused):
+    """
+    Both colors in one session: inputs red_input/blue_input, outputs red_*/blue_*
+    (label, probabilities, top_values, top_indices for each color, red first)
+    """
+    return merge_onnx([onnx.compose.add_prefix(red_fused, 'red_'), onnx.compose.add_prefix(blue_fused, 'blue_')])
+
+def verify_fused(fused_path, member_paths, feeds, tolerance=1e-5):
+    """The fused outputs must equal the mean of the separate sessions (up to float32 rounding)"""
+    session = ort.InferenceSession(fused_path)
+    outputs = dict(zip([o.name for o in session.get_outputs()], session.run(None, feeds)))
+    for color, paths in member_paths.items():
+        x = feeds[f'{color}_input']
+        expected = np.mean([ort.InferenceSession(p).run(None, {'input': x})[1] for p in paths], axis=0)
+        dev = np.max(np.abs(outputs[f'{color}_probabilities'] - expected))
+        top = outputs[f'{color}_top_indices']
+        print(f"Fused {color}: max |dP| vs separate sessions {dev:.1e}, top-{top.shape[1]} {(top[0] + 1).tolist()}")
+        if dev > tolerance:
+            raise ValueError(f"Fused {color} ensemble differs from the mean of its members by {dev:.1e} (tol {tolerance:g})")
+
+def convert(fused='both'):
     print("Loading models...")
     red_xgb = joblib.load('red_ball_xgb.joblib')
     red_lgbm = joblib.load('red_ball_lgbm.joblib')
@@ -18,28 +54,46 @@ def convert():
     
     # --- Red Models ---
     print("Converting Red XGBoost to ONNX...")
-    initial_type_red = [('input', FloatTensorType([None, red_input_dim]))]
-    onx_red_xgb = onnxmltools.convert_xgboost(red_xgb, initial_types=initial_type_red, target_opset=12)
+    # Models trained on a feature mask get an in-graph Gather so the ONNX input stays 1785 wide
+    red_columns = red_columns_for(red_xgb, load_red_mask())
+    red_model_dim = red_input_dim if red_columns is None else len(red_columns)
+    onx_red_xgb = booster_to_onnx(red_xgb, red_model_dim)
+    if red_columns is not None:
+        onx_red_xgb = prepend_column_gather(onx_red_xgb, red_columns, red_input_dim)
     with open("red_ball_xgb.onnx", "wb") as f:
         f.write(onx_red_xgb.SerializeToString())
         
     print("Converting Red LightGBM to ONNX...")
-    onx_red_lgbm = onnxmltools.convert_lightgbm(red_lgbm, initial_types=initial_type_red, target_opset=12, zipmap=False)
+    onx_red_lgbm = booster_to_onnx(red_lgbm, red_model_dim)
+    if red_columns is not None:
+        onx_red_lgbm = prepend_column_gather(onx_red_lgbm, red_columns, red_input_dim)
     with open("red_ball_lgbm.onnx", "wb") as f:
         f.write(onx_red_lgbm.SerializeToString())
 
     # --- Blue Models ---
     print("Converting Blue XGBoost to ONNX...")
-    initial_type_blue = [('input', FloatTensorType([None, blue_input_dim]))]
-    onx_blue_xgb = onnxmltools.convert_xgboost(blue_xgb, initial_types=initial_type_blue, target_opset=12)
+    onx_blue_xgb = booster_to_onnx(blue_xgb, blue_input_dim)
     with open("blue_ball_xgb.onnx", "wb") as f:
         f.write(onx_blue_xgb.SerializeToString())
         
     print("Converting Blue LightGBM to ONNX...")
-    onx_blue_lgbm = onnxmltools.convert_lightgbm(blue_lgbm, initial_types=initial_type_blue, target_opset=12, zipmap=False)
+    onx_blue_lgbm = booster_to_onnx(blue_lgbm, blue_input_dim)
     with open("blue_ball_lgbm.onnx", "wb") as f:
         f.write(onx_blue_lgbm.SerializeToString())
 
+    # --- Red Panel Models (optional, from red_panel.py) ---
+    panel_names = []
+    if os.path.exists('red_ball_panel_xgb.joblib') and os.path.exists('red_ball_panel_lgbm.joblib'):
+        print("Converting Red Panel XGBoost + LightGBM to ONNX...")
+        initial_type_panel = [('input', FloatTensorType([None, PANEL_DIM]))]
+        onx_panel_xgb = onnxmltools.convert_xgboost(joblib.load('red_ball_panel_xgb.joblib'), initial_types=initial_type_panel, target_opset=12)
+        with open("red_ball_panel_xgb.onnx", "wb") as f:
+            f.write(onx_panel_xgb.SerializeToString())
+        onx_panel_lgbm = onnxmltools.convert_lightgbm(joblib.load('red_ball_panel_lgbm.joblib'), initial_types=initial_type_panel, target_opset=12, zipmap=False)
+        with open("red_ball_panel_lgbm.onnx", "wb") as f:
+            f.write(onx_panel_lgbm.SerializeToString())
+        panel_names = ["red_ball_panel_xgb.onnx", "red_ball_panel_lgbm.onnx"]
+
     print("\nVerification...")
     def verify(path, input_dim, expected_classes):
         try:
@@ -65,6 +119,27 @@ def convert():
     verify("red_ball_lgbm.onnx", red_input_dim, 33)
     verify("blue_ball_xgb.onnx", blue_input_dim, 16)
     verify("blue_ball_lgbm.onnx", blue_input_dim, 16)
+    for name in panel_names:
+        # Panel models are binary: feed the 33 per-number rows of one draw as a single batch
+        verify(name, PANEL_DIM, 2)
+
+    # --- Fused ensembles: one session per color, or one for both ---
+    fused_names = []
+    if fused != 'none':
+        print("Fusing XGBoost + LightGBM graphs...")
+        red_fused = fuse_color([red_xgb, red_lgbm], red_model_dim, RED_TOP_K, red_columns, red_input_dim)
+        blue_fused = fuse_color([blue_xgb, blue_lgbm], blue_input_dim, BLUE_TOP_K)
+        if fused == 'color':
+            onnx.save(red_fused, 'red_ensemble.onnx')
+            onnx.save(blue_fused, 'blue_ensemble.onnx')
+            fused_names = ['red_ensemble.onnx', 'blue_ensemble.onnx']
+        else:
+            onnx.save(fuse_colors(red_fused, blue_fused), FUSED_FILE)
+            fused_names = [FUSED_FILE]
+            verify_fused(FUSED_FILE,
+                         {'red': ['red_ball_xgb.onnx', 'red_ball_lgbm.onnx'], 'blue': ['blue_ball_xgb.onnx', 'blue_ball_lgbm.onnx']},
+                         {'red_input': np.random.rand(1, red_input_dim).astype(np.float32),
+                          'blue_input': np.random.rand(1, blue_input_dim).astype(np.float32)})
 
     # Copy to assets
     assets_dir = "../flutter_app/assets/models/"
@@ -75,6 +150,12 @@ def convert():
         shutil.copy("red_ball_lgbm.onnx", os.path.join(assets_dir, "red_ball_lgbm.onnx"))
         shutil.copy("blue_ball_xgb.onnx", os.path.join(assets_dir, "blue_ball_xgb.onnx"))
         shutil.copy("blue_ball_lgbm.onnx", os.path.join(assets_dir, "blue_ball_lgbm.onnx"))
+        for name in panel_names + fused_names:
+            shutil.copy(name, os.path.join(assets_dir, name))
 
 if __name__ == "__main__":
-    convert()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fused', choices=['none', 'color', 'both'], default='both',
+                        help=f"also write fused ensembles: one file per color, or both colors in {FUSED_FILE}")
+    args = parser.parse_args()
+    convert(args.fused)
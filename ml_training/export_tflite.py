@@ -1,35 +1,144 @@
 import os
 os.environ["KERAS_BACKEND"] = "tensorflow"
+import argparse
+import time
+import numpy as np
+import pandas as pd
 import tensorflow as tf
 from tensorflow import keras
+from train_model import build_red_sequences
 
-def convert_models():
-    print("Converting high-precision models to TFLite...")
-    
-    # Convert Red Ensemble Model
-    red_model = keras.models.load_model('red_ball_model.keras', safe_mode=False)
+QUANT_MODES = ['none', 'dynamic', 'float16', 'int8']
+
+def load_red_windows(csv_path='ssq_data.csv', seq_len=15):
+    """Real historical (energy, balance, relational) windows, in the same layout train_model uses"""
+    df = pd.read_csv(csv_path).sort_values('issue').reset_index(drop=True)
+    X_e, X_b, X_r, y_r = build_red_sequences(df, seq_len)
+    windows = [X_e.astype(np.float32), X_b.astype(np.float32), X_r.astype(np.float32)]
+    actual = [set(np.where(t)[0] + 1) for t in y_r]
+    return windows, actual
+
+def representative_dataset(windows, num_samples=200):
+    # Calibrate on windows spread across the whole history, not just the tail we evaluate on
+    idx = np.linspace(0, len(windows[0]) - 1, num=min(num_samples, len(windows[0]))).astype(int)
+    def gen():
+        for i in idx:
+            yield [w[i:i+1] for w in windows]
+    return gen
+
+def convert_red(red_model, mode='none', windows=None):
     converter = tf.lite.TFLiteConverter.from_keras_model(red_model)
     converter.target_spec.supported_ops = [
         tf.lite.OpsSet.TFLITE_BUILTINS,
         tf.lite.OpsSet.SELECT_TF_OPS
     ]
     converter._experimental_lower_tensor_list_ops = False
-    
-    tflite_red = converter.convert()
+    if mode == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif mode == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'int8':
+        # Full-integer weights and activations; inputs/outputs stay float32 so the app's
+        # feature pipeline and output parsing do not change.
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(windows)
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+            tf.lite.OpsSet.SELECT_TF_OPS
+        ]
+    return converter.convert()
+
+def run_tflite(tflite_bytes, input_names, windows):
+    interpreter = tf.lite.Interpreter(model_content=tflite_bytes)
+    runner = interpreter.get_signature_runner()
+    heatmaps, latencies = [], []
+    for i in range(len(windows[0])):
+        feed = {name: w[i:i+1] for name, w in zip(input_names, windows)}
+        start = time.perf_counter()
+        outputs = runner(**feed)
+        latencies.append(time.perf_counter() - start)
+        heatmap = next(v for v in outputs.values() if v.shape[-1] == 33)
+        heatmaps.append(heatmap[0])
+    return np.array(heatmaps), np.array(latencies)
+
+def quantization_report(red_model, windows, actual, modes=QUANT_MODES, eval_count=100):
+    """Size / latency / accuracy of every quantization mode against the float Keras model"""
+    eval_windows = [w[-eval_count:] for w in windows]
+    eval_actual = actual[-eval_count:]
+    outputs = red_model.predict(eval_windows, verbose=0)
+    reference = outputs[0] if isinstance(outputs, list) else outputs
+    ref_top12 = [set(np.argsort(p)[-12:] + 1) for p in reference]
+    input_names = [inp.name for inp in red_model.inputs]
+
+    rows = []
+    for mode in modes:
+        try:
+            tflite_bytes = convert_red(red_model, mode, windows)
+        except Exception as e:
+            print(f"Mode {mode}: conversion failed ({e})")
+            continue
+        heatmaps, latencies = run_tflite(tflite_bytes, input_names, eval_windows)
+        top12 = [set(np.argsort(p)[-12:] + 1) for p in heatmaps]
+        rows.append({
+            'mode': mode,
+            'size_kb': len(tflite_bytes) / 1024.0,
+            'latency_ms': np.median(latencies) * 1000,
+            'max_dev': float(np.max(np.abs(heatmaps - reference))),
+            'top12_overlap': np.mean([len(a & b) for a, b in zip(top12, ref_top12)]),
+            'hit_3_plus': np.mean([len(a & t) >= 3 for a, t in zip(eval_actual, top12)]) * 100,
+            'bytes': tflite_bytes,
+        })
+
+    print("-" * 86)
+    print(f"{'Mode':<10} | {'Size (KB)':>10} | {'p50 (ms)':>9} | {'Max |dP|':>9} | {'Top-12 Overlap':>14} | {'3+ Rate':>8}")
+    print("-" * 86)
+    for r in rows:
+        print(f"{r['mode']:<10} | {r['size_kb']:>10.1f} | {r['latency_ms']:>9.3f} | {r['max_dev']:>9.4f} | {r['top12_overlap']:>11.2f}/12 | {r['hit_3_plus']:>7.1f}%")
+    print("-" * 86)
+    return rows
+
+def convert_models(mode='none', report=False):
+    print("Converting high-precision models to TFLite...")
+
+    # Convert Red Ensemble Model
+    red_model = keras.models.load_model('red_ball_model.keras', safe_mode=False)
+    windows = None
+    if mode == 'int8' or report:
+        windows, actual = load_red_windows()
+
+    if report:
+        rows = quantization_report(red_model, windows, actual)
+        tflite_red = next((r['bytes'] for r in rows if r['mode'] == mode), None)
+        if tflite_red is None:
+            tflite_red = convert_red(red_model, mode, windows)
+    else:
+        tflite_red = convert_red(red_model, mode, windows)
     with open('red_ball_model.tflite', 'wb') as f:
         f.write(tflite_red)
-    print("Red Ensemble TFLite: Success.")
+    print(f"Red Ensemble TFLite ({mode}): Success. {len(tflite_red) / 1024.0:.1f} KB")
 
     # Convert Blue Expert Model
     if os.path.exists('blue_ball_model.keras'):
         blue_model = keras.models.load_model('blue_ball_model.keras', safe_mode=False)
         converter_blue = tf.lite.TFLiteConverter.from_keras_model(blue_model)
+        if mode in ('dynamic', 'float16', 'int8'):
+            # No representative data for the blue expert, so int8 falls back to dynamic range
+            converter_blue.optimizations = [tf.lite.Optimize.DEFAULT]
+            if mode == 'float16':
+                converter_blue.target_spec.supported_types = [tf.float16]
         tflite_blue = converter_blue.convert()
         with open('blue_ball_model.tflite', 'wb') as f:
             f.write(tflite_blue)
         print("Blue Expert TFLite: Success.")
-    
+
     print("All models exported. Note: pool_discriminator.pkl must be handled separately.")
 
 if __name__ == '__main__':
-    convert_models()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quantize', choices=QUANT_MODES, default='none',
+                        help='post-training quantization applied to the exported red model')
+    parser.add_argument('--report', action='store_true',
+                        help='print a size/latency/accuracy table of all modes vs the float model')
+    args = parser.parse_args()
+    convert_models(args.quantize, args.report)
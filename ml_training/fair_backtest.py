@@ -1,13 +1,13 @@
 import os
 os.environ["KERAS_BACKEND"] = "tensorflow"
 import numpy as np
-import pandas as pd
 from tensorflow import keras
 from train_model import calculate_features, build_ensemble_red_model
+from draw_history import load_frame
 
 def run_fair_backtest():
     print("Executing Fair Backtest (Train on first 90%, Test on last 10%)...")
-    df = pd.read_csv('ssq_data.csv').sort_values('issue').reset_index(drop=True)
+    df = load_frame()
     rg, rf, m, rs, ra = calculate_features(df)
     
     seq_len = 15
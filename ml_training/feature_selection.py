@@ -0,0 +1,164 @@
+import argparse
+import json
+import numpy as np
+import xgboost as xgb
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+from sklearn.feature_selection import mutual_info_classif
+from train_xgboost import build_red_windows, RED_DIM, RED_MASK_FILE, SEQ_LEN
+from draw_history import load_frame
+from draw_bits import red_masks, top_k_masks, popcount
+
+# Names of the 1785 flattened red columns: step-major, then group, then index within the group
+RED_GROUPS = [('gap', 33), ('freq', 33), ('momentum', 33), ('stats', 10), ('affinity', 10)]
+
+def red_column_names(seq_len=SEQ_LEN):
+    names = []
+    for step in range(seq_len):
+        lag = seq_len - step
+        for group, width in RED_GROUPS:
+            names.extend(f"lag{lag}_{group}_{k + 1}" for k in range(width))
+    return names
+
+def red_column_blocks(seq_len=SEQ_LEN):
+    """Column index arrays, one per lag x group block (15 x 5 = 75 blocks)"""
+    blocks, offset = [], 0
+    for _ in range(seq_len):
+        for _, width in RED_GROUPS:
+            blocks.append(np.arange(offset, offset + width))
+            offset += width
+    return blocks
+
+def build_draw_matrix(df, seq_len=SEQ_LEN):
+    """One 1785-wide row per draw plus its set of drawn reds (not expanded per number)"""
+    reds = df[['red1','red2','red3','red4','red5','red6']].values.astype(int)
+    return build_red_windows(df, seq_len), reds[seq_len:]
+
+def expand(X, reds):
+    return np.repeat(X, 6, axis=0), (reds - 1).reshape(-1)
+
+def fit_red(X, reds, n_estimators=50):
+    X_exp, y_exp = expand(X, reds)
+    # Ensure all classes are present
+    missing = [c for c in range(33) if c not in set(y_exp)]
+    if missing:
+        X_exp = np.vstack([X_exp, np.zeros((len(missing), X.shape[1]))])
+        y_exp = np.concatenate([y_exp, missing])
+    model = xgb.XGBClassifier(n_estimators=n_estimators, max_depth=6, learning_rate=0.1,
+                              objective='multi:softprob', num_class=33, tree_method='hist', random_state=42)
+    model.fit(X_exp, y_exp)
+    return model
+
+def score_holdout(probs, reds):
+    hits = popcount(top_k_masks(probs, 12) & red_masks(reds)).astype(np.int64)
+    return hits.mean(), (hits >= 3).mean() * 100
+
+def rank_columns(method, model, X_train, reds_train, X_hold, reds_hold, seed=42):
+    """Importance score per column (higher = more useful)"""
+    if method == 'gain':
+        gain = model.get_booster().get_score(importance_type='total_gain')
+        scores = np.zeros(X_train.shape[1])
+        for key, value in gain.items():
+            scores[int(key[1:])] = value
+        return scores
+    if method == 'mi':
+        X_exp, y_exp = expand(X_train, reds_train)
+        return mutual_info_classif(X_exp, y_exp, random_state=seed)
+    if method == 'permutation':
+        # Permute whole lag x group blocks: 75 evaluations instead of 1785, no refits
+        rng = np.random.default_rng(seed)
+        base = log_likelihood(model.predict_proba(X_hold), reds_hold)
+        scores = np.zeros(X_train.shape[1])
+        for block in red_column_blocks():
+            X_perm = X_hold.copy()
+            X_perm[:, block] = X_perm[rng.permutation(len(X_perm))][:, block]
+            scores[block] = base - log_likelihood(model.predict_proba(X_perm), reds_hold)
+        return scores
+    raise ValueError(f"Unknown importance method: {method}")
+
+def log_likelihood(probs, reds):
+    return np.mean(np.log(np.take_along_axis(probs, reds - 1, axis=1) + 1e-12))
+
+def select_features(method='gain', holdout=100, tolerance=0.05, fractions=(0.05, 0.1, 0.2, 0.35, 0.5, 0.75)):
+    """
+    Rank columns on a chronological train split, then keep the smallest top-k set whose
+    mean top-12 hits on the held-out (most recent) draws stays within `tolerance` of the full input.
+    """
+    print("Loading data for feature selection...")
+    df = load_frame()
+    X, reds = build_draw_matrix(df)
+    X_train, reds_train = X[:-holdout], reds[:-holdout]
+    X_hold, reds_hold = X[-holdout:], reds[-holdout:]
+
+    print(f"Training full-width reference model on {len(X_train)} draws ({RED_DIM} columns)...")
+    full_model = fit_red(X_train, reds_train)
+    full_hits, full_rate = score_holdout(full_model.predict_proba(X_hold), reds_hold)
+    print(f"Full input: mean hits {full_hits:.3f}, 3+ rate {full_rate:.1f}%")
+
+    print(f"Ranking columns by {method}...")
+    scores = rank_columns(method, full_model, X_train, reds_train, X_hold, reds_hold)
+    order = np.argsort(-scores, kind='stable')
+
+    print("-" * 60)
+    print(f"{'Columns':>8} | {'Mean Hits':>9} | {'3+ Rate':>8} | {'Within Tol':>10}")
+    print("-" * 60)
+    chosen = None
+    for frac in sorted(fractions):
+        k = max(1, int(RED_DIM * frac))
+        columns = np.sort(order[:k])
+        model = fit_red(X_train[:, columns], reds_train)
+        hits, rate = score_holdout(model.predict_proba(X_hold[:, columns]), reds_hold)
+        ok = hits >= full_hits - tolerance
+        print(f"{k:>8} | {hits:>9.3f} | {rate:>7.1f}% | {'yes' if ok else 'no':>10}")
+        if ok and chosen is None:
+            chosen = {'columns': columns, 'mean_hits': hits, 'hit_3_plus': rate}
+    print("-" * 60)
+
+    if chosen is None:
+        print("No reduced set stays within tolerance; keeping the full input (no mask written).")
+        return None
+
+    names = red_column_names()
+    mask = {
+        'input_dim': RED_DIM,
+        'method': method,
+        'holdout_draws': holdout,
+        'tolerance': tolerance,
+        'full_mean_hits': round(float(full_hits), 4),
+        'mean_hits': round(float(chosen['mean_hits']), 4),
+        'columns': [int(c) for c in chosen['columns']],
+        'names': [names[c] for c in chosen['columns']],
+    }
+    with open(RED_MASK_FILE, 'w') as f:
+        json.dump(mask, f, indent=1)
+    print(f"Saved {len(mask['columns'])}/{RED_DIM} red columns to {RED_MASK_FILE}.")
+    print("Retrain (train_ensemble.py / incremental_update.py) and re-export to use the mask.")
+    return mask
+
+def prepend_column_gather(model_proto, columns, full_dim=RED_DIM, input_name='input'):
+    """
+    Make a model trained on masked columns accept the full-width input: a Gather node selects
+    the kept columns in-graph, so clients keep sending 1785 floats and never see the mask.
+    """
+    graph = model_proto.graph
+    inner_name = input_name + '_masked'
+    for node in graph.node:
+        node.input[:] = [inner_name if name == input_name else name for name in node.input]
+    old_input = next(i for i in graph.input if i.name == input_name)
+    graph.input.remove(old_input)
+    graph.input.insert(0, helper.make_tensor_value_info(input_name, TensorProto.FLOAT, [None, full_dim]))
+    graph.initializer.append(numpy_helper.from_array(np.asarray(columns, dtype=np.int64), name='red_feature_mask'))
+    graph.node.insert(0, helper.make_node('Gather', [input_name, 'red_feature_mask'], [inner_name], axis=1, name='RedFeatureMask'))
+    if not any(op.domain in ('', 'ai.onnx') for op in model_proto.opset_import):
+        # Pure tree graphs only import ai.onnx.ml; Gather needs the default domain
+        model_proto.opset_import.append(helper.make_opsetid('', 12))
+    onnx.checker.check_model(model_proto)
+    return model_proto
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--method', choices=['gain', 'mi', 'permutation'], default='gain')
+    parser.add_argument('--holdout', type=int, default=100, help='most recent draws used for the accuracy check')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='allowed drop in mean top-12 hits per draw')
+    args = parser.parse_args()
+    select_features(args.method, args.holdout, args.tolerance)
@@ -0,0 +1,251 @@
+import argparse
+import math
+import os
+import re
+import time
+import numpy as np
+from joblib import Parallel, delayed
+from draw_bits import red_masks, blue_masks, popcount, numbers, unpack, RED_NUMBERS, BLUE_NUMBERS
+from draw_history import sync
+
+# How would these tickets have done across the whole draw history?
+# The result per ticket is a 7 x 2 histogram of (red matches, blue matched) over all draws, from
+# which prize-tier counts and the best match follow. Two kernels build it:
+#   single tickets (6 reds + 1 blue): the index counts, for every subset of up to 6 reds, how many
+#     draws contain it (dense tables in combinatorial-number order, built once from the draws'
+#     64 subsets each). A ticket's 64 subset counts give the number of draws with exactly k red
+#     matches by inclusion-exclusion, so a ticket costs 64 table lookups instead of one
+#     comparison per draw. The blue-matched part is counted directly on the ~1/16 of draws that
+#     share the ticket's blue.
+#   pools (more than 6 reds and/or several blues): popcount(pool & draw) and a blue bit test
+#     against every draw (uint64 / uint16 masks from draw_bits), scored as the best single ticket
+#     the pool contains.
+# Batches are processed in chunks on a joblib thread pool; the NumPy kernels release the GIL.
+
+# Prize tier per (red matches, blue matched); 0 = no prize
+TIERS = np.zeros((7, 2), dtype=np.int64)
+TIERS[6, 1], TIERS[6, 0], TIERS[5, 1] = 1, 2, 3
+TIERS[5, 0] = TIERS[4, 1] = 4
+TIERS[4, 0] = TIERS[3, 1] = 5
+TIERS[2, 1] = TIERS[1, 1] = TIERS[0, 1] = 6
+TIER_NAMES = ['none', '1st', '2nd', '3rd', '4th', '5th', '6th']
+# Histogram cells from best to worst match: by tier, then by red matches, then blue
+BEST_ORDER = sorted(((r, b) for r in range(7) for b in range(2)),
+                    key=lambda cell: (TIERS[cell] or 7, -cell[0], -cell[1]))
+
+# Subsets of a 6-number ticket. A subset's combinatorial rank is sum_i C(c_i, i + 1) over its
+# sorted members c_i (0-based); with V[t, (j, p)] = C(c_j, p + 1) for ticket number j at position
+# p, the ranks of all 64 subsets are one product V @ SUBSET_TERMS.
+BINOM = np.array([[math.comb(n, k) for k in range(8)] for n in range(RED_NUMBERS + 1)], dtype=np.int64)
+SUBSET_SELECT = np.array([[(s >> j) & 1 for j in range(6)] for s in range(64)], dtype=np.int64)
+SUBSET_SIZE = SUBSET_SELECT.sum(axis=1)
+SUBSET_POSITION = np.cumsum(SUBSET_SELECT, axis=1) - SUBSET_SELECT
+
+def _subset_terms():
+    terms = np.zeros((6, 6, 64))
+    for s in range(64):
+        for j in np.flatnonzero(SUBSET_SELECT[s]):
+            terms[j, SUBSET_POSITION[s, j], s] = 1
+    return terms.reshape(36, 64)
+
+SUBSET_TERMS = _subset_terms()
+TABLE_OFFSET = np.concatenate([[0], np.cumsum([math.comb(RED_NUMBERS, j) for j in range(7)])])
+# Exactly-k counts from summed subset counts: E_k = sum_j (-1)^(j-k) C(j, k) A_j
+INCLUSION_EXCLUSION = np.array([[(-1) ** (j - k) * math.comb(j, k) if j >= k else 0 for k in range(7)]
+                                for j in range(7)], dtype=np.int64)
+
+def six_numbers(masks):
+    """[T, 6] sorted red numbers of masks with exactly six bits set"""
+    return np.nonzero(unpack(masks))[1].reshape(-1, 6) + 1
+
+def subset_indices(sorted_reds):
+    """[T, 64] positions in the flat subset-count table of every subset of each sorted 6-red ticket"""
+    zero_based = np.asarray(sorted_reds, dtype=np.int64) - 1
+    terms = BINOM[zero_based, 1:7].reshape(-1, 36).astype(np.float64)
+    # Ranks stay below C(33, 6), exact in float64, so the product can use BLAS
+    ranks = (terms @ SUBSET_TERMS).astype(np.int64)
+    return TABLE_OFFSET[SUBSET_SIZE][None, :] + ranks
+
+def parse_ticket(text):
+    """'3 5 7 16 20 24 + 8' (or with commas, '|' for '+') -> (red numbers, blue numbers)"""
+    parts = re.split(r'[+|]', text)
+    if len(parts) != 2:
+        raise ValueError(f"Ticket {text!r} needs reds and blues separated by '+'")
+    reds, blues = ([int(n) for n in re.split(r'[\s,]+', part.strip()) if n] for part in parts)
+    if len(set(reds)) < 6 or len(set(reds)) != len(reds) or not all(1 <= n <= RED_NUMBERS for n in reds):
+        raise ValueError(f"Ticket {text!r} needs at least 6 distinct reds in 1-{RED_NUMBERS}")
+    if not blues or len(set(blues)) != len(blues) or not all(1 <= n <= BLUE_NUMBERS for n in blues):
+        raise ValueError(f"Ticket {text!r} needs distinct blues in 1-{BLUE_NUMBERS}")
+    return reds, blues
+
+def ticket_masks(tickets):
+    """(red masks uint64 [T], blue masks uint16 [T]) for (reds, blues) pairs of any sizes"""
+    reds = np.array([int(red_masks(r)) for r, _ in tickets], dtype=np.uint64)
+    blues = np.array([int(np.bitwise_or.reduce(blue_masks(b))) for _, b in tickets], dtype=np.uint16)
+    return reds, blues
+
+def random_tickets(n, seed=0):
+    """n random single tickets as masks, for benchmarks"""
+    rng = np.random.default_rng(seed)
+    reds = np.argsort(rng.random((n, RED_NUMBERS)), axis=1)[:, :6] + 1
+    return red_masks(reds), blue_masks(rng.integers(1, BLUE_NUMBERS + 1, n))
+
+class MatchIndex:
+    """The full draw history as mask arrays plus subset-count tables, queried by batches of ticket masks"""
+    def __init__(self, issues, draw_reds, draw_blues):
+        self.issues = np.asarray(issues)
+        self.reds = np.asarray(draw_reds, dtype=np.uint64)
+        self.blues = np.asarray(draw_blues, dtype=np.uint16)
+        # Draws containing each subset of up to 6 reds (every draw contributes its 64 subsets)
+        self.subset_counts = np.bincount(subset_indices(six_numbers(self.reds)).ravel(), minlength=TABLE_OFFSET[-1])
+        # Draws grouped by blue ball for the blue-matched part of the single-ticket kernel
+        self.by_blue = [self.reds[self.blues == (1 << b)] for b in range(BLUE_NUMBERS)]
+
+    @classmethod
+    def load(cls, base_path=None):
+        store = sync(base_path)
+        index = cls(store.issues.astype(np.int64), red_masks(store.reds), blue_masks(store.blue))
+        store.close()
+        return index
+
+    def __len__(self):
+        return len(self.reds)
+
+    def _cells(self, ticket_reds, ticket_blues):
+        """Histogram cell (2 * min(red matches, 6) + blue matched) of every ticket x draw pair"""
+        red_hits = np.minimum(popcount(ticket_reds[:, None] & self.reds[None, :]), 6)
+        blue_hit = (ticket_blues[:, None] & self.blues[None, :]) != 0
+        return red_hits * np.uint8(2) + blue_hit
+
+    def _pool_chunk(self, ticket_reds, ticket_blues):
+        cells = self._cells(ticket_reds, ticket_blues)
+        return np.stack([np.sum(cells == cell, axis=1) for cell in range(14)], axis=1).reshape(-1, 7, 2)
+
+    def _single_chunk(self, ticket_reds, ticket_blues):
+        contained = self.subset_counts[subset_indices(six_numbers(ticket_reds))]
+        exactly = (contained @ np.eye(7, dtype=np.int64)[SUBSET_SIZE]) @ INCLUSION_EXCLUSION
+        blue_matched = np.zeros_like(exactly)
+        blue_index = np.log2(ticket_blues).astype(np.int64)
+        for b in np.unique(blue_index):
+            rows = np.flatnonzero(blue_index == b)
+            red_hits = popcount(ticket_reds[rows, None] & self.by_blue[b][None, :])
+            blue_matched[rows] = np.stack([np.sum(red_hits == k, axis=1) for k in range(7)], axis=1)
+        return np.stack([exactly - blue_matched, blue_matched], axis=2)
+
+    def _histogram_chunk(self, ticket_reds, ticket_blues, out):
+        single = (popcount(ticket_reds) == 6) & (popcount(ticket_blues) == 1)
+        if np.any(single):
+            out[single] = self._single_chunk(ticket_reds[single], ticket_blues[single])
+        if not np.all(single):
+            out[~single] = self._pool_chunk(ticket_reds[~single], ticket_blues[~single])
+
+    def histograms(self, ticket_reds, ticket_blues, chunk=4096, n_jobs=-1):
+        """int32 [T, 7, 2]: draws with r red matches and blue matched (b=1) or not (b=0), per ticket"""
+        ticket_reds = np.asarray(ticket_reds, dtype=np.uint64)
+        ticket_blues = np.asarray(ticket_blues, dtype=np.uint16)
+        out = np.zeros((len(ticket_reds), 7, 2), dtype=np.int32)
+        starts = range(0, len(ticket_reds), chunk)
+        if len(starts) <= 1:
+            n_jobs = 1
+        Parallel(n_jobs=n_jobs, prefer='threads')(
+            delayed(self._histogram_chunk)(ticket_reds[s:s + chunk], ticket_blues[s:s + chunk], out[s:s + chunk])
+            for s in starts
+        )
+        return out
+
+    def matches(self, ticket_red, ticket_blue, max_tier=6):
+        """(issues, red matches, blue matched) of the draws where one ticket won at max_tier or better"""
+        cells = self._cells(np.array([ticket_red], dtype=np.uint64), np.array([ticket_blue], dtype=np.uint16))[0]
+        red, blue = cells // 2, cells % 2
+        tier = TIERS[red, blue]
+        won = (tier > 0) & (tier <= max_tier)
+        return self.issues[won], red[won], blue[won].astype(bool)
+
+def tier_counts(histograms):
+    """int64 [T, 7]: column 0 draws without a prize, columns 1-6 draws at each prize tier"""
+    counts = np.zeros((len(histograms), 7), dtype=np.int64)
+    for r in range(7):
+        for b in range(2):
+            counts[:, TIERS[r, b]] += histograms[:, r, b]
+    return counts
+
+def best_match(histograms):
+    """(red matches, blue matched) int arrays [T]: the best cell each ticket ever reached"""
+    red = np.zeros(len(histograms), dtype=np.int64)
+    blue = np.zeros(len(histograms), dtype=np.int64)
+    found = np.zeros(len(histograms), dtype=bool)
+    for r, b in BEST_ORDER:
+        hit = ~found & (histograms[:, r, b] > 0)
+        red[hit], blue[hit] = r, b
+        found |= hit
+    return red, blue
+
+def query(tickets, base_path=None, n_jobs=-1):
+    """Python entry point: per-ticket dicts for (reds, blues) tickets against the full history"""
+    index = MatchIndex.load(base_path)
+    reds, blues = ticket_masks(tickets)
+    hist = index.histograms(reds, blues, n_jobs=n_jobs)
+    counts, (best_red, best_blue) = tier_counts(hist), best_match(hist)
+    return [{
+        'reds': sorted(r), 'blues': sorted(b), 'draws': len(index),
+        'tiers': {TIER_NAMES[t]: int(counts[i, t]) for t in range(7)},
+        'best': {'red': int(best_red[i]), 'blue': bool(best_blue[i]), 'tier': int(TIERS[best_red[i], best_blue[i]])},
+        'histogram': hist[i].tolist(),
+    } for i, (r, b) in enumerate(tickets)]
+
+def report(index, tickets, n_jobs=-1, show_issues=False):
+    reds, blues = ticket_masks(tickets)
+    hist = index.histograms(reds, blues, n_jobs=n_jobs)
+    counts, (best_red, best_blue) = tier_counts(hist), best_match(hist)
+    labels = [' '.join(f'{n:02d}' for n in sorted(r)) + ' + ' + ' '.join(f'{n:02d}' for n in sorted(b)) for r, b in tickets]
+    width = max(len(label) for label in labels)
+    print(f"Matched against {len(index)} draws ({index.issues[0]}-{index.issues[-1]})")
+    print(f"{'Ticket':<{width}} | " + " | ".join(f"{name:>5}" for name in TIER_NAMES[1:]) + f" | {'none':>5} | best")
+    print("-" * (width + 66))
+    for i, label in enumerate(labels):
+        tier = TIERS[best_red[i], best_blue[i]]
+        print(f"{label:<{width}} | " + " | ".join(f"{counts[i, t]:>5}" for t in range(1, 7)) + f" | {counts[i, 0]:>5} | "
+              f"{best_red[i]}+{best_blue[i]} ({TIER_NAMES[tier]})")
+        if show_issues:
+            issues, red, blue = index.matches(reds[i], blues[i], max_tier=5)
+            for issue, rr, bb in zip(issues, red, blue):
+                print(f"    {issue}: {rr}+{int(bb)} ({TIER_NAMES[TIERS[rr, int(bb)]]})")
+
+def bench(index, n, n_jobs=-1, chunk=4096):
+    reds, blues = random_tickets(n)
+    start = time.perf_counter()
+    hist = index.histograms(reds, blues, chunk=chunk, n_jobs=n_jobs)
+    elapsed = time.perf_counter() - start
+    pairs = n * len(index)
+    print(f"{n} tickets x {len(index)} draws in {elapsed:.2f} s ({pairs / elapsed / 1e6:.0f} M ticket-draws/s, "
+          f"n_jobs={n_jobs}, {os.cpu_count()} cores)")
+    # Spot-check the vectorized pass against a plain per-draw loop
+    for i in range(0, n, max(1, n // 5)):
+        expected = np.zeros((7, 2), dtype=np.int64)
+        mine = set(numbers(reds[i]))
+        for draw_red, draw_blue in zip(index.reds, index.blues):
+            expected[len(mine & set(numbers(draw_red))), int(blues[i] & draw_blue != 0)] += 1
+        assert np.array_equal(expected, hist[i]), f"ticket {i}: {hist[i].tolist()} != {expected.tolist()}"
+    print("Spot checks against a per-draw loop passed")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prize-tier history of tickets across every historical draw')
+    parser.add_argument('--ticket', action='append', default=[], help="e.g. '3 5 7 16 20 24 + 8' (repeatable; pools allowed)")
+    parser.add_argument('--file', default=None, help='one ticket per line in the --ticket format')
+    parser.add_argument('--issues', action='store_true', help='list the draws where each ticket won 5th tier or better')
+    parser.add_argument('--random', type=int, default=None, help='benchmark N random tickets instead')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='worker threads (-1 = all cores)')
+    parser.add_argument('--base-path', default=None, help='directory with ssq_data.csv (default: this one)')
+    args = parser.parse_args()
+
+    index = MatchIndex.load(args.base_path)
+    if args.random:
+        bench(index, args.random, args.n_jobs)
+    else:
+        lines = list(args.ticket)
+        if args.file:
+            with open(args.file) as f:
+                lines += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        if not lines:
+            parser.error('give --ticket, --file or --random')
+        report(index, [parse_ticket(line) for line in lines], args.n_jobs, args.issues)
@@ -1,16 +1,50 @@
 import os
 import pandas as pd
 import numpy as np
-import xgboost as xgb
-import lightgbm as lgb
 import joblib
+import argparse
 import shutil
-import onnxmltools
-from onnxmltools.convert.common.data_types import FloatTensorType
 from data_crawler import fetch_full_ssq_data
-from train_xgboost import calculate_features, prepare_blue_features
+from train_xgboost import build_red_dataset, build_blue_dataset, build_red_windows, build_blue_windows, load_red_mask, RED_DIM, SEQ_LEN
+from feature_selection import prepend_column_gather
+from boosters import train_member, save_meta, booster_to_onnx, average_onnx, record_release
+from compact_boosters import compact_verified, PROB_TOL as COMPACT_TOL
+from ensemble_predictor import EnsemblePredictor, top_k
+from next_prediction import build_prediction, save_prediction, model_hash, PREDICTION_FILE
+from export_ensemble_onnx import fuse_colors, FUSED_FILE, RED_TOP_K, BLUE_TOP_K
+from onnx_features import prepend_features, draws_array, DRAWS_FILE
+from optimize_onnx import optimize_verified, optimize_exact, feeds_for, TARGETS as OPTIMIZE_TARGETS, PROB_TOL as FP16_TOL
+from draw_history import sync_copies, HISTORY
 
-def incremental_update():
+# Historical windows the --optimize stage is verified on (as optimize_onnx.py's default)
+OPTIMIZE_ROWS = 500
+
+# Each release step returns (proto, max |dP| it is allowed to add), summed per file into the
+# release tolerance parity_harness.py checks the shipped file against
+
+def compact_for_release(name, proto, X, k):
+    compacted, report = compact_verified(proto, X, k, prob_tol=COMPACT_TOL)
+    if report is None:
+        print(f"  {name}: compaction failed verification, exporting as trained")
+        return compacted, 0.0
+    print(f"  {name}: {report['nodes'][0]} -> {report['nodes'][1]} nodes (leaf tol {report['leaf_tol']}, max |dP| {report['max_dp']:.1e})")
+    return compacted, COMPACT_TOL
+
+def optimize_for_release(name, proto, windows):
+    inputs, outputs = OPTIMIZE_TARGETS[name]
+    optimized, report = optimize_verified(proto, feeds_for(inputs, windows), outputs, prob_tol=FP16_TOL)
+    print(f"  {name}: offline-optimized, float16 thresholds {'kept' if report['fp16'] else 'rejected'} (max |dP| {report['max_dp']:.1e})")
+    return optimized, FP16_TOL if report['fp16'] else 0.0
+
+def predict_released(proto, df_next):
+    """Next-draw probabilities of the draws-in model as exported, in EnsemblePredictor.predict's form"""
+    import onnxruntime as ort
+    session = ort.InferenceSession(proto.SerializeToString(), providers=['CPUExecutionProvider'])
+    red_probs, blue_probs = session.run(['red_probabilities', 'blue_probabilities'], {'draws': draws_array(df_next)})
+    return {'red_probs': red_probs, 'blue_probs': blue_probs,
+            'red_top': top_k(red_probs, 12), 'blue_top': top_k(blue_probs, 3)}
+
+def incremental_update(early_stopping=False, holdout_draws=10, time_budget=None, bags=1, compact=False, optimize=False):
     # 1. Fetch the latest data
     print("Step 1: Fetching latest draw data...")
     try:
@@ -25,6 +59,8 @@ def incremental_update():
         df_combined['issue'] = df_combined['issue'].astype(int)
         df_combined = df_combined.sort_values('issue').reset_index(drop=True)
         df_combined.to_csv(csv_path, index=False)
+        # Binary draw store and the CSV copies (repo root, app assets) follow ssq_data.csv
+        sync_copies(os.path.dirname(csv_path))
         print(f"Dataset updated. Total records: {len(df_combined)}")
     except Exception as e:
         print(f"Crawl failed: {e}")
@@ -36,96 +72,110 @@ def incremental_update():
     # Red Training
     red_window_size = 50
     df_red = df_combined.tail(red_window_size + 15).copy().reset_index(drop=True)
-    rg, rf, m, rs, ra = calculate_features(df_red)
     
     # Blue Training
     blue_window_size = 1000
     df_blue = df_combined.tail(blue_window_size + 15).copy().reset_index(drop=True)
-    bg, bf = prepare_blue_features(df_blue)
     
-    seq_len = 15
-    X_red, y_red = [], []
-    X_blue, y_blue = [], []
+    X_red, y_red = build_red_dataset(df_red)
+    X_blue, y_blue = build_blue_dataset(df_blue)
     
-    # Red features
-    for i in range(seq_len, len(df_red)):
-        red_feat = []
-        for step in range(i - seq_len, i):
-            red_feat.extend(rg[step])
-            red_feat.extend(rf[step])
-            red_feat.extend(m[step])
-            red_feat.extend(rs[step])
-            red_feat.extend(ra[step])
-        for val in df_red[['red1','red2','red3','red4','red5','red6']].values[i]:
-            X_red.append(red_feat)
-            y_red.append(int(val) - 1)
-            
-    # Blue features
-    for i in range(seq_len, len(df_blue)):
-        blue_feat = []
-        for step in range(i - seq_len, i):
-            blue_feat.extend(bg[step])
-            blue_feat.extend(bf[step])
-        X_blue.append(blue_feat)
-        y_blue.append(int(df_blue.iloc[i]['blue']) - 1)
-        
-    # Ensure all classes are present
-    for c in range(33):
-        if c not in y_red:
-            X_red.append(np.zeros(len(X_red[0])))
-            y_red.append(c)
-    for c in range(16):
-        if c not in y_blue:
-            X_blue.append(np.zeros(len(X_blue[0])))
-            y_blue.append(c)
-
-    X_red, y_red = np.array(X_red), np.array(y_red)
-    X_blue, y_blue = np.array(X_blue), np.array(y_blue)
+    red_mask = load_red_mask()
+    if red_mask is not None:
+        print(f"Applying red feature mask: {len(red_mask)}/{RED_DIM} columns.")
+        X_red = X_red[:, red_mask]
 
     # 3. Retrain Models
     print("Step 3: Retraining Ensemble models (XGBoost + LightGBM)...")
     base_path = os.path.dirname(__file__)
     
-    # Red Ensemble
-    print("Training Red Models...")
-    red_xgb = xgb.XGBClassifier(n_estimators=100, max_depth=6, learning_rate=0.1, objective='multi:softprob', num_class=33, tree_method='hist', random_state=42)
-    red_xgb.fit(X_red, y_red)
-    joblib.dump(red_xgb, os.path.join(base_path, 'red_ball_xgb.joblib'))
-    
-    red_lgbm = lgb.LGBMClassifier(n_estimators=100, max_depth=6, learning_rate=0.1, objective='multiclass', num_class=33, random_state=42, verbose=-1)
-    red_lgbm.fit(X_red, y_red)
-    joblib.dump(red_lgbm, os.path.join(base_path, 'red_ball_lgbm.joblib'))
+    n_red_draws, n_blue_draws = len(df_red) - 15, len(df_blue) - 15
+    members = {
+        'red_ball_xgb': ('xgb', 33, X_red, y_red, n_red_draws, 6),
+        'red_ball_lgbm': ('lgbm', 33, X_red, y_red, n_red_draws, 6),
+        'blue_ball_xgb': ('xgb', 16, X_blue, y_blue, n_blue_draws, 1),
+        'blue_ball_lgbm': ('lgbm', 16, X_blue, y_blue, n_blue_draws, 1),
+    }
+    models, meta = {}, {}
+    for name, (kind, num_class, X, y, n_draws, rows_per_draw) in members.items():
+        print(f"Training {name}...")
+        models[name], info = train_member(kind, num_class, X, y, n_draws, rows_per_draw, early_stopping,
+                                          holdout_draws=holdout_draws, time_budget=time_budget, bags=bags)
+        print(f"  {info['rounds']} rounds / {info['trees']} trees in {info['train_seconds']}s")
+        joblib.dump(models[name], os.path.join(base_path, f'{name}.joblib'))
+        meta[f'{name}.joblib'] = info
+    save_meta(meta, base_path)
+    red_xgb, red_lgbm = models['red_ball_xgb'], models['red_ball_lgbm']
+    blue_xgb, blue_lgbm = models['blue_ball_xgb'], models['blue_ball_lgbm']
 
-    # Blue Ensemble
-    print("Training Blue Models...")
-    blue_xgb = xgb.XGBClassifier(n_estimators=100, max_depth=6, learning_rate=0.1, objective='multi:softprob', num_class=16, tree_method='hist', random_state=42)
-    blue_xgb.fit(X_blue, y_blue)
-    joblib.dump(blue_xgb, os.path.join(base_path, 'blue_ball_xgb.joblib'))
-    
-    blue_lgbm = lgb.LGBMClassifier(n_estimators=100, max_depth=6, learning_rate=0.1, objective='multiclass', num_class=16, random_state=42, verbose=-1)
-    blue_lgbm.fit(X_blue, y_blue)
-    joblib.dump(blue_lgbm, os.path.join(base_path, 'blue_ball_lgbm.joblib'))
+    # 4. Verify the retrained ensemble end to end before anything is exported, on the same
+    # HISTORY-draw window predict_next, the server, the draws-in model and the app use
+    print("Step 4: Verifying ensemble prediction for the next draw...")
+    df_next = df_combined.tail(HISTORY).copy().reset_index(drop=True)
+    predictor = EnsemblePredictor([red_xgb, red_lgbm], [blue_xgb, blue_lgbm], red_columns=red_mask)
+    prediction = predictor.predict(build_red_windows(df_next, include_next=True)[-1:],
+                                   build_blue_windows(df_next, include_next=True)[-1:], blue_k=3)
+    for color, width in (('red', 33), ('blue', 16)):
+        probs = prediction[f'{color}_probs']
+        if probs.shape != (1, width) or not np.all(np.isfinite(probs)) or abs(probs.sum() - 1.0) > 1e-4:
+            raise ValueError(f"{color} ensemble produced invalid probabilities: shape {probs.shape}, sum {probs.sum()}")
+    next_issue = int(df_combined.iloc[-1]['issue']) + 1
+    print(f"  {next_issue}: red top-12 {sorted(prediction['red_top'][0].tolist())}, blue top-1 {prediction['blue_top'][0][0]}")
 
-    # 4. Export to ONNX
-    print("Step 4: Exporting to ONNX...")
+    # 5. Export to ONNX
+    print("Step 5: Exporting to ONNX...")
     
     # Red ONNX
-    initial_type_red = [('input', FloatTensorType([None, 1785]))]
-    onx_red_xgb = onnxmltools.convert_xgboost(red_xgb, initial_types=initial_type_red, target_opset=12)
-    onx_red_lgbm = onnxmltools.convert_lightgbm(red_lgbm, initial_types=initial_type_red, target_opset=12, zipmap=False)
+    onx_red_xgb = booster_to_onnx(red_xgb, X_red.shape[1])
+    onx_red_lgbm = booster_to_onnx(red_lgbm, X_red.shape[1])
+    tolerances = dict.fromkeys(['red_ball_xgb.onnx', 'red_ball_lgbm.onnx', 'blue_ball_xgb.onnx', 'blue_ball_lgbm.onnx'], 0.0)
+    if compact:
+        # Verified on this update's own training windows; a model that fails verification ships uncompacted
+        onx_red_xgb, tolerances['red_ball_xgb.onnx'] = compact_for_release('red_ball_xgb', onx_red_xgb, X_red, 12)
+        onx_red_lgbm, tolerances['red_ball_lgbm.onnx'] = compact_for_release('red_ball_lgbm', onx_red_lgbm, X_red, 12)
+    # The fused session reuses the (compacted) member graphs, averaged in-graph
+    red_fused = average_onnx([onx_red_xgb, onx_red_lgbm], X_red.shape[1], 33, top_k=RED_TOP_K)
+    if red_mask is not None:
+        # Keep the app-facing input 1785 wide; the mask is applied in-graph
+        onx_red_xgb = prepend_column_gather(onx_red_xgb, red_mask)
+        onx_red_lgbm = prepend_column_gather(onx_red_lgbm, red_mask)
+        red_fused = prepend_column_gather(red_fused, red_mask)
     
     # Blue ONNX
-    initial_type_blue = [('input', FloatTensorType([None, 480]))]
-    onx_blue_xgb = onnxmltools.convert_xgboost(blue_xgb, initial_types=initial_type_blue, target_opset=12)
-    onx_blue_lgbm = onnxmltools.convert_lightgbm(blue_lgbm, initial_types=initial_type_blue, target_opset=12, zipmap=False)
+    onx_blue_xgb = booster_to_onnx(blue_xgb, 480)
+    onx_blue_lgbm = booster_to_onnx(blue_lgbm, 480)
+    if compact:
+        onx_blue_xgb, tolerances['blue_ball_xgb.onnx'] = compact_for_release('blue_ball_xgb', onx_blue_xgb, X_blue, 3)
+        onx_blue_lgbm, tolerances['blue_ball_lgbm.onnx'] = compact_for_release('blue_ball_lgbm', onx_blue_lgbm, X_blue, 3)
+    blue_fused = average_onnx([onx_blue_xgb, onx_blue_lgbm], 480, 16, top_k=BLUE_TOP_K)
 
     # Save and Copy
     paths = {
         "red_ball_xgb.onnx": onx_red_xgb,
         "red_ball_lgbm.onnx": onx_red_lgbm,
         "blue_ball_xgb.onnx": onx_blue_xgb,
-        "blue_ball_lgbm.onnx": onx_blue_lgbm
+        "blue_ball_lgbm.onnx": onx_blue_lgbm,
+        FUSED_FILE: fuse_colors(red_fused, blue_fused)
     }
+    # The fused graph averages the (compacted) members, so it drifts no more than the worst of them
+    tolerances[FUSED_FILE] = max(tolerances.values())
+    if optimize:
+        # Verified on recent historical windows at the full app-facing input width; both colors come
+        # from one frame so the fused two-input graph sees equal red and blue batches
+        df_verify = df_combined.tail(OPTIMIZE_ROWS + SEQ_LEN).reset_index(drop=True)
+        windows = {'red': build_red_windows(df_verify).astype(np.float32), 'blue': build_blue_windows(df_verify).astype(np.float32)}
+        for name in paths:
+            paths[name], added = optimize_for_release(name, paths[name], windows)
+            tolerances[name] += added
+    # Same ensemble behind the in-graph feature pass: clients send the raw draw window
+    paths[DRAWS_FILE] = prepend_features(paths[FUSED_FILE])
+    tolerances[DRAWS_FILE] = tolerances[FUSED_FILE]
+    if optimize:
+        # The feature subgraph is new here; pre-optimize it too (exact rewrites only, the tree
+        # thresholds were settled above) so the app can skip graph optimization for every file
+        paths[DRAWS_FILE], max_dp = optimize_exact(paths[DRAWS_FILE], {'draws': draws_array(df_next)},
+                                                   {'red_probabilities': RED_TOP_K, 'blue_probabilities': BLUE_TOP_K})
+        print(f"  {DRAWS_FILE}: offline-optimized (max |dP| {max_dp:.1e} on the next-draw window)")
     
     asset_dir = os.path.join(base_path, '../flutter_app/assets/models/')
     for name, proto in paths.items():
@@ -134,8 +184,34 @@ def incremental_update():
             f.write(proto.SerializeToString())
         if os.path.exists(asset_dir):
             shutil.copy(local_path, os.path.join(asset_dir, name))
+        if name in tolerances:
+            record_release(local_path, tolerances[name])
+
+    # 6. Publish the next-draw answer of the files as shipped (compaction and optimization
+    # included), tied to the draws-in model that computed it
+    print("Step 6: Publishing materialized next-draw prediction...")
+    released = predict_released(paths[DRAWS_FILE], df_next)
+    drift = max(np.abs(released[f'{c}_probs'] - prediction[f'{c}_probs']).max() for c in ('red', 'blue'))
+    print(f"  {DRAWS_FILE}: max |dP| {drift:.1e} from the in-memory ensemble")
+    record = build_prediction(released, df_combined.iloc[-1]['issue'], model_hash(base_path))
+    prediction_path = save_prediction(record, base_path)
+    if os.path.exists(asset_dir):
+        shutil.copy(prediction_path, os.path.join(asset_dir, PREDICTION_FILE))
+    print(f"  {PREDICTION_FILE}: issue {record['issue']}, models {record['model_sha256'][:12]}")
     
     print("Incremental Update Complete (Ensemble)!")
 
 if __name__ == '__main__':
-    incremental_update()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--early-stopping', action='store_true',
+                        help='choose the number of rounds on the most recent draws instead of a fixed 100')
+    parser.add_argument('--holdout-draws', type=int, default=10, help='chronological validation block size')
+    parser.add_argument('--time-budget', type=float, default=None, help='seconds allowed per booster search')
+    parser.add_argument('--bags', type=int, default=1,
+                        help='train N seed/subsample variants per booster in parallel and average them')
+    parser.add_argument('--compact', action='store_true',
+                        help='merge near-identical leaves in the exported ONNX after verifying probabilities')
+    parser.add_argument('--optimize', action='store_true',
+                        help='ship ONNX Runtime pre-optimized graphs, with float16 thresholds where top-k is unchanged')
+    args = parser.parse_args()
+    incremental_update(args.early_stopping, args.holdout_draws, args.time_budget, args.bags, args.compact, args.optimize)
@@ -0,0 +1,281 @@
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import time
+import numpy as np
+from draw_history import load as load_draws, load_frame
+
+# One file for every shipped model member instead of scattered joblib / JSON / ONNX files.
+#
+#   magic 'SSQBNDL1' | uint64 index length | JSON index | member blobs (64-byte aligned)
+#
+# Members are stored in their library's native format: XGBoost as UBJSON (save_raw), LightGBM as
+# its model string (LightGBM has no binary model format), ONNX graphs as serialized protos. The
+# index records offset/length/sha256 per member plus the feature schema, training windows, red
+# mask and a hash of the data the models were trained on. The file is memory-mapped on open and a
+# member is only parsed when it is first asked for, so opening the bundle costs one index read.
+
+BUNDLE_FILE = 'ssq_models.bundle'
+MAGIC = b'SSQBNDL1'
+ALIGN = 64
+RED_STEP_LAYOUT = [['gaps', 33], ['freqs', 33], ['momentum', 33], ['stats', 10], ['affinity', 10]]
+BLUE_STEP_LAYOUT = [['gaps', 16], ['freqs', 16]]
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _json_params(params):
+    return {k: v for k, v in params.items() if isinstance(v, (str, int, float, bool, type(None)))}
+
+def _member_entries(name, model):
+    """[(member name, format, bytes, info)] for one fitted ensemble artifact (bags become several members)"""
+    import xgboost as xgb
+    import lightgbm as lgb
+    from boosters import BaggedBooster
+    members = model.members if isinstance(model, BaggedBooster) else [model]
+    entries = []
+    for k, member in enumerate(members):
+        member_name = f'{name}/bag{k}' if isinstance(model, BaggedBooster) else name
+        info = {'artifact': name, 'n_classes': int(member.n_classes_), 'n_features': int(member.n_features_in_)}
+        if isinstance(member, xgb.XGBClassifier):
+            entries.append((member_name, 'xgboost-ubj', bytes(member.get_booster().save_raw('ubj')), info))
+        elif isinstance(member, lgb.LGBMClassifier):
+            info['params'] = _json_params(member.get_params())
+            info['objective'] = member._objective
+            entries.append((member_name, 'lightgbm-text', member.booster_.model_to_string().encode(), info))
+        else:
+            raise ValueError(f"Cannot bundle {type(member).__name__} from {name}")
+    return entries
+
+def collect(base_path='.'):
+    """Every model artifact under base_path as bundle entries"""
+    import joblib
+    import xgboost as xgb
+    from ensemble_predictor import RED_MEMBERS, BLUE_MEMBERS
+    entries = []
+    for name in RED_MEMBERS + BLUE_MEMBERS:
+        path = os.path.join(base_path, name)
+        if os.path.exists(path):
+            entries.extend(_member_entries(name, joblib.load(path)))
+    json_paths = [os.path.join(base_path, n) for n in ('red_ball_xgb.json', 'red_ball_one.json')]
+    json_paths += sorted(glob.glob(os.path.join(base_path, 'red_boosters', '*.json')))
+    for path in json_paths:
+        if os.path.exists(path):
+            booster = xgb.Booster(model_file=path)
+            entries.append((os.path.relpath(path, base_path), 'xgboost-ubj', bytes(booster.save_raw('ubj')),
+                            {'n_features': booster.num_features()}))
+    for path in sorted(glob.glob(os.path.join(base_path, '*.onnx'))):
+        with open(path, 'rb') as f:
+            entries.append((os.path.basename(path), 'onnx', f.read(), {}))
+    return entries
+
+def metadata(base_path='.', red_window=50, blue_window=1000):
+    from train_xgboost import SEQ_LEN, RED_DIM, BLUE_DIM, load_red_mask
+    from boosters import META_FILE
+    meta = {
+        'features': {'seq_len': SEQ_LEN, 'red_dim': RED_DIM, 'blue_dim': BLUE_DIM,
+                     'red_step': RED_STEP_LAYOUT, 'blue_step': BLUE_STEP_LAYOUT},
+        'windows': {'red': red_window, 'blue': blue_window},
+    }
+    mask = load_red_mask(base_path)
+    meta['red_columns'] = None if mask is None else mask.tolist()
+    data_path = os.path.join(base_path, 'ssq_data.csv')
+    if os.path.exists(data_path):
+        with open(data_path, 'rb') as f:
+            meta['data_sha256'] = _sha256(f.read())
+        meta['last_issue'] = int(load_draws(base_path)[0][-1])
+    meta_path = os.path.join(base_path, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta['training'] = json.load(f)
+    return meta
+
+def write_bundle(path, entries, meta):
+    """Write atomically; blob offsets are relative to the first byte after the index"""
+    index = {'version': 1, 'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'metadata': meta, 'members': {}}
+    offset = 0
+    for name, fmt, data, info in entries:
+        offset += -offset % ALIGN
+        index['members'][name] = {'format': fmt, 'offset': offset, 'length': len(data), 'sha256': _sha256(data), **info}
+        offset += len(data)
+    index_bytes = json.dumps(index, separators=(',', ':')).encode()
+    header = MAGIC + struct.pack('<Q', len(index_bytes)) + index_bytes
+    header += b'\0' * (-len(header) % ALIGN)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        position = 0
+        for name, _, data, _ in entries:
+            f.write(b'\0' * (index['members'][name]['offset'] - position))
+            f.write(data)
+            position = index['members'][name]['offset'] + len(data)
+    os.replace(tmp_path, path)
+    return index
+
+class ModelBundle:
+    """Read side: mmap the file, parse the index, materialize members on first use"""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        (index_len,) = struct.unpack_from('<Q', self._map, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.index = json.loads(self._map[start:start + index_len])
+        self._data_start = start + index_len + (-(start + index_len) % ALIGN)
+        self.members = self.index['members']
+        self.metadata = self.index['metadata']
+        self._loaded = {}
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def raw(self, name):
+        """Zero-copy view of a member's bytes"""
+        entry = self.members[name]
+        start = self._data_start + entry['offset']
+        return memoryview(self._map)[start:start + entry['length']]
+
+    def verify(self):
+        """Names of members whose bytes no longer match the recorded sha256"""
+        return [name for name, entry in self.members.items() if _sha256(self.raw(name)) != entry['sha256']]
+
+    def load(self, name):
+        """Fitted model for an ensemble artifact (bags reassembled), an xgb.Booster, or ONNX bytes"""
+        if name not in self._loaded:
+            bag = sorted((n for n in self.members if n.startswith(name + '/bag')), key=lambda n: int(n.rsplit('bag', 1)[1]))
+            if bag:
+                from boosters import BaggedBooster
+                self._loaded[name] = BaggedBooster([self._load_member(n) for n in bag])
+            else:
+                self._loaded[name] = self._load_member(name)
+        return self._loaded[name]
+
+    def _load_member(self, name):
+        entry = self.members[name]
+        data = self.raw(name)
+        if entry['format'] == 'onnx':
+            return bytes(data)
+        if entry['format'] == 'xgboost-ubj':
+            import xgboost as xgb
+            if 'n_classes' in entry:
+                model = xgb.XGBClassifier()
+                model.load_model(bytearray(data))
+                return model
+            booster = xgb.Booster()
+            booster.load_model(bytearray(data))
+            return booster
+        if entry['format'] == 'lightgbm-text':
+            return _lightgbm_classifier(bytes(data).decode(), entry)
+        raise ValueError(f"Unknown member format {entry['format']}")
+
+def _lightgbm_classifier(model_str, entry):
+    """An LGBMClassifier around a booster parsed from its model string, as fit() would leave it"""
+    import lightgbm as lgb
+    from sklearn.preprocessing import LabelEncoder
+    booster = lgb.Booster(model_str=model_str)
+    model = lgb.LGBMClassifier(**entry.get('params', {}))
+    classes = np.arange(entry['n_classes'])
+    model._Booster = booster
+    model._n_features = model._n_features_in = booster.num_feature()
+    model._n_classes, model._classes = entry['n_classes'], classes
+    model._le = LabelEncoder().fit(classes)
+    model._objective = entry.get('objective', 'multiclass')
+    model.fitted_ = True
+    return model
+
+def build(base_path='.', output=None, red_window=50, blue_window=1000):
+    output = output or os.path.join(base_path, BUNDLE_FILE)
+    entries = collect(base_path)
+    index = write_bundle(output, entries, metadata(base_path, red_window, blue_window))
+    print(f"Wrote {output}: {len(index['members'])} members, {os.path.getsize(output) / 1024 / 1024:.1f} MB")
+    return output
+
+_TIMING_SNIPPETS = {
+    # label: (setup, timed) run in a fresh interpreter so imports and file caches count the same way
+    'joblib: 4 ensemble members': ("import joblib, os\nfrom ensemble_predictor import RED_MEMBERS, BLUE_MEMBERS",
+                                   "[joblib.load(n) for n in RED_MEMBERS + BLUE_MEMBERS if os.path.exists(n)]"),
+    'bundle: 4 ensemble members': ("import os\nfrom model_bundle import ModelBundle\nfrom ensemble_predictor import RED_MEMBERS, BLUE_MEMBERS",
+                                   "b = ModelBundle('{bundle}'); [b.load(n) for n in RED_MEMBERS + BLUE_MEMBERS if n in b.members or n + '/bag0' in b.members]"),
+    'json: 33 red_boosters': ("import glob, xgboost as xgb",
+                              "[xgb.Booster(model_file=p) for p in sorted(glob.glob('red_boosters/*.json'))]"),
+    'bundle: 33 red_boosters': ("from model_bundle import ModelBundle",
+                                "b = ModelBundle('{bundle}'); [b.load(n) for n in b.members if n.startswith('red_boosters/')]"),
+    'bundle: open + 1 member': ("from model_bundle import ModelBundle",
+                                "b = ModelBundle('{bundle}'); b.load(next(n for n in b.members if b.members[n]['format'] != 'onnx'))"),
+}
+
+def benchmark(base_path='.', bundle_path=None, repeats=5):
+    """Load time of the current per-file path vs the bundle, measured after imports in fresh processes"""
+    bundle_path = bundle_path or os.path.join(base_path, BUNDLE_FILE)
+    print("-" * 56)
+    print(f"{'Load path':<30} | {'p50 (ms)':>9} | {'min (ms)':>9}")
+    print("-" * 56)
+    for label, (setup, timed) in _TIMING_SNIPPETS.items():
+        # Library imports are paid by every path alike and kept out of the timed part
+        code = (f"import xgboost, lightgbm\n{setup}\nimport time\nstart = time.perf_counter()\n{timed.format(bundle=bundle_path)}\n"
+                f"print((time.perf_counter() - start) * 1000)")
+        times = []
+        for _ in range(repeats):
+            result = subprocess.run([sys.executable, '-c', code], cwd=base_path, capture_output=True, text=True,
+                                    env={**os.environ, 'PYTHONPATH': os.path.dirname(os.path.abspath(__file__))})
+            if result.returncode != 0:
+                break
+            times.append(float(result.stdout.strip().splitlines()[-1]))
+        if times:
+            print(f"{label:<30} | {np.median(times):>9.1f} | {min(times):>9.1f}")
+        else:
+            print(f"{label:<30} | {'n/a':>9} | {'n/a':>9}")
+    print("-" * 56)
+
+def check(base_path='.', bundle_path=None, rows=50):
+    """Bundle members must predict exactly like the files they were packed from"""
+    import joblib
+    from ensemble_predictor import RED_MEMBERS, BLUE_MEMBERS
+    from train_xgboost import build_red_windows, build_blue_windows
+    bundle = ModelBundle(bundle_path or os.path.join(base_path, BUNDLE_FILE))
+    corrupt = bundle.verify()
+    if corrupt:
+        raise ValueError(f"Bundle members fail their sha256: {corrupt}")
+    df = load_frame(base_path).tail(rows + 15)
+    windows = {'red': build_red_windows(df.reset_index(drop=True)), 'blue': build_blue_windows(df.reset_index(drop=True))}
+    columns = bundle.metadata['red_columns']
+    for name in RED_MEMBERS + BLUE_MEMBERS:
+        if not os.path.exists(os.path.join(base_path, name)):
+            continue
+        X = windows['red' if name.startswith('red') else 'blue']
+        original = joblib.load(os.path.join(base_path, name))
+        if X.shape[1] != original.n_features_in_:
+            X = X[:, columns]
+        dev = float(np.max(np.abs(bundle.load(name).predict_proba(X) - original.predict_proba(X))))
+        print(f"{name:<24} max |dP| vs joblib {dev:.1e}")
+        if dev > 0:
+            raise ValueError(f"{name} from the bundle differs from {name} by {dev:.1e}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['build', 'check', 'bench', 'info'])
+    parser.add_argument('--bundle', default=None, help=f'bundle path (default {BUNDLE_FILE} in this directory)')
+    args = parser.parse_args()
+    if args.command == 'build':
+        build('.', args.bundle)
+        check('.', args.bundle)
+        benchmark('.', args.bundle)
+    elif args.command == 'check':
+        check('.', args.bundle)
+    elif args.command == 'bench':
+        benchmark('.', args.bundle)
+    else:
+        bundle = ModelBundle(args.bundle or BUNDLE_FILE)
+        print(json.dumps({k: v for k, v in bundle.metadata.items() if k != 'red_columns'}, indent=1))
+        for name, entry in bundle.members.items():
+            print(f"  {name:<32} {entry['format']:<14} {entry['length'] / 1024:>8.0f} KB")
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import time
+from draw_history import DRAWS_FILE
+
+# Materialized next-draw prediction.
+# incremental_update.py runs the exported draws-in model on the last HISTORY draws once per
+# retrain and publishes its probabilities here; predict_next.py and the app read the answer directly and only fall back
+# to live inference when history has moved past `based_on_issue` or the models changed.
+
+PREDICTION_FILE = 'next_prediction.json'
+SCHEMA_VERSION = 1
+# The file the published probabilities are computed with (the shipped members, compacted and
+# optimized as released, behind the in-graph feature pass)
+MODEL_FILES = [DRAWS_FILE]
+
+def model_hash(base_path='.'):
+    """sha256 over the shipped model file the prediction was computed with"""
+    digest = hashlib.sha256()
+    for name in MODEL_FILES:
+        digest.update(name.encode())
+        with open(os.path.join(base_path, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def build_prediction(prediction, last_issue, models_sha256):
+    """`prediction` has EnsemblePredictor.predict's keys for the single next-draw row"""
+    return {
+        'schema': SCHEMA_VERSION,
+        'issue': int(last_issue) + 1,
+        'based_on_issue': int(last_issue),
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'model_sha256': models_sha256,
+        'red_probs': [round(float(p), 6) for p in prediction['red_probs'][0]],
+        'blue_probs': [round(float(p), 6) for p in prediction['blue_probs'][0]],
+        'red_top': [int(n) for n in prediction['red_top'][0]],
+        'blue_top': [int(n) for n in prediction['blue_top'][0]],
+    }
+
+def save_prediction(record, base_path='.'):
+    path = os.path.join(base_path, PREDICTION_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f, indent=1)
+    os.replace(tmp_path, path)
+    return path
+
+def load_prediction(base_path, latest_issue, check_models=True):
+    """The stored prediction if it still answers the draw after `latest_issue`, else None"""
+    path = os.path.join(base_path, PREDICTION_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        record = json.load(f)
+    if record.get('schema') != SCHEMA_VERSION or record.get('based_on_issue') != int(latest_issue):
+        return None
+    if check_models:
+        try:
+            if record.get('model_sha256') != model_hash(base_path):
+                return None
+        except FileNotFoundError:
+            return None
+    return record
@@ -0,0 +1,223 @@
+import argparse
+import os
+import shutil
+import time
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnx import helper, numpy_helper, TensorProto
+from train_xgboost import calculate_features, prepare_blue_features, SEQ_LEN, RED_DIM, BLUE_DIM
+from export_ensemble_onnx import FUSED_FILE
+from draw_history import HISTORY, DRAWS_FILE
+from draw_history import load_frame
+
+# calculate_features / prepare_blue_features as ONNX ops.
+# The graph takes the raw draw window the Python path works on (H x 7 int64: red1..red6, blue,
+# oldest first) and produces the same 1785 / 480 floats that build_*_windows(window, include_next=True)
+# gives for the draw after it, so clients send integers instead of reimplementing the feature pass.
+# Like the Python code, every feature is relative to the window itself (gaps count from its first
+# draw, co-occurrence only covers its draws); predict_next uses H = 45.
+#
+# Steps are the last SEQ_LEN draw indices t of the window; everything is computed for all steps at
+# once from masks over draw index u:  before = u < t,  in30 = t - 30 <= u < t,  in5 = t - 5 <= u < t.
+
+PRIMES = {2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31}
+ANCHORS = [idx * 3 for idx in range(10)]   # 0-based columns of the affinity anchors 1, 4, ..., 28
+
+def draws_array(df):
+    """H x 7 int64 input for the graph, in df order"""
+    return df[['red1', 'red2', 'red3', 'red4', 'red5', 'red6', 'blue']].values.astype(np.int64)
+
+class _GraphBuilder:
+    def __init__(self):
+        self.nodes, self.initializers = [], []
+
+    def const(self, name, value, dtype):
+        self.initializers.append(numpy_helper.from_array(np.asarray(value, dtype=dtype), name=name))
+        return name
+
+    def op(self, op_type, inputs, output=None, **attrs):
+        output = output or f'{op_type.lower()}_{len(self.nodes)}'
+        self.nodes.append(helper.make_node(op_type, inputs, [output], **attrs))
+        return output
+
+    def window_mask(self, width, t, u, before):
+        """float [SEQ_LEN, H]: 1 where t - width <= u < t"""
+        recent = self.op('Cast', [self.op('LessOrEqual', [self.op('Sub', [t, u]), width])], to=TensorProto.FLOAT)
+        return self.op('Mul', [before, recent])
+
+    def gaps(self, onehot, u_float, t_float, before):
+        """Draws since each number last appeared before t (t when never in the window), capped at 50, / 50"""
+        last_seen = self.op('Sub', [self.op('Mul', [onehot, self.op('Add', [u_float, 'one'])]), 'one'])
+        masked = self.op('Where', [self.op('Unsqueeze', [before], axes=[2]), self.op('Unsqueeze', [last_seen], axes=[0]), 'minus_one'])
+        gap = self.op('Sub', [self.op('Sub', [t_float, 'one']), self.op('ReduceMax', [masked], axes=[1], keepdims=0)])
+        return self.op('Div', [self.op('Min', [gap, 'fifty']), 'fifty'])
+
+def _number_masks():
+    """[33, 7] columns: value, odd, > 16, prime, 1-11, 12-22, 23-33 (red_stats 0, 2..7 before scaling)"""
+    numbers = np.arange(1, 34)
+    return np.stack([numbers, numbers % 2, numbers > 16, np.isin(numbers, list(PRIMES)),
+                     numbers <= 11, (numbers >= 12) & (numbers <= 22), numbers >= 23], axis=1).astype(np.float32)
+
+def build_feature_graph():
+    """ONNX model: 'draws' [H, 7] int64 -> 'red_features' [1, 1785], 'blue_features' [1, 480] (float32)"""
+    g = _GraphBuilder()
+    g.const('one', 1.0, np.float32)
+    g.const('minus_one', -1.0, np.float32)
+    g.const('fifty', 50.0, np.float32)
+    g.const('int_zero', 0, np.int64)
+    g.const('int_one', 1, np.int64)
+    g.const('int_one_1d', [1], np.int64)
+    g.const('seq_len', SEQ_LEN, np.int64)
+
+    # One-hot occurrence per draw: O [H, 33], B [H, 16]
+    reds = g.op('Slice', ['draws', g.const('red_start', [0], np.int64), g.const('red_end', [6], np.int64), g.const('col_axis', [1], np.int64)])
+    blue = g.op('Slice', ['draws', g.const('blue_start', [6], np.int64), g.const('blue_end', [7], np.int64), 'col_axis'])
+    red_hit = g.op('Equal', [g.op('Unsqueeze', [reds], axes=[2]), g.const('red_numbers', np.arange(1, 34), np.int64)])
+    O = g.op('ReduceSum', [g.op('Cast', [red_hit], to=TensorProto.FLOAT)], axes=[1], keepdims=0)
+    B = g.op('Cast', [g.op('Equal', [blue, g.const('blue_numbers', np.arange(1, 17), np.int64)])], to=TensorProto.FLOAT)
+
+    # Draw indices u = 0..H-1 and step indices t = H-15..H-1
+    H = g.op('Gather', [g.op('Shape', ['draws']), 'int_zero'], axis=0)
+    u = g.op('Range', ['int_zero', H, 'int_one'])
+    t = g.op('Range', [g.op('Sub', [H, 'seq_len']), H, 'int_one'])
+    t_col = g.op('Unsqueeze', [t], axes=[1])
+    u_float = g.op('Unsqueeze', [g.op('Cast', [u], to=TensorProto.FLOAT)], axes=[1])
+    t_float = g.op('Cast', [t_col], to=TensorProto.FLOAT)
+    before_bool = g.op('Less', [u, t_col])
+    before = g.op('Cast', [before_bool], to=TensorProto.FLOAT)
+    in30 = g.window_mask(g.const('int_thirty', 30, np.int64), t_col, u, before)
+    in5 = g.window_mask(g.const('int_five', 5, np.int64), t_col, u, before)
+
+    red_gaps = g.gaps(O, u_float, t_float, before_bool)
+    red_freqs = g.op('Div', [g.op('MatMul', [in30, O]), g.const('thirty', 30.0, np.float32)])
+    momentum = g.op('Div', [g.op('MatMul', [in5, O]), g.const('five', 5.0, np.float32)])
+
+    # The previous draw of each step; the first draw of a window has none and gets zero stats/affinity
+    prev = g.op('Max', [g.op('Sub', [t, 'int_one']), 'int_zero'])
+    has_prev = g.op('Cast', [g.op('Greater', [t_col, 'int_zero'])], to=TensorProto.FLOAT)
+    prev_onehot = g.op('Gather', [O, prev], axis=0)
+    prev_reds = g.op('Gather', [reds, prev], axis=0)
+
+    # red_stats: linear counts, AC value, span, longest consecutive run
+    counts = g.op('MatMul', [prev_onehot, g.const('number_masks', _number_masks(), np.float32)])
+    diffs = g.op('Abs', [g.op('Sub', [g.op('Unsqueeze', [prev_reds], axes=[2]), g.op('Unsqueeze', [prev_reds], axes=[1])])])
+    diff_seen = g.op('Equal', [g.op('Unsqueeze', [diffs], axes=[3]), g.const('diff_values', np.arange(1, 33), np.int64)])
+    distinct = g.op('ReduceSum', [g.op('ReduceMax', [g.op('Cast', [diff_seen], to=TensorProto.FLOAT)], axes=[1, 2], keepdims=0)], axes=[1], keepdims=1)
+    ac = g.op('Sub', [distinct, g.const('five_pairs', 5.0, np.float32)])
+    span = g.op('Cast', [g.op('Sub', [g.op('ReduceMax', [prev_reds], axes=[1], keepdims=1),
+                                      g.op('ReduceMin', [prev_reds], axes=[1], keepdims=1)])], to=TensorProto.FLOAT)
+    # run >= k exists iff some k consecutive numbers were all drawn; summing those indicators gives the longest run
+    run, longest = prev_onehot, g.op('ReduceMax', [prev_onehot], axes=[1], keepdims=1)
+    for k in range(2, 7):
+        run = g.op('Mul', [g.op('Slice', [run, g.const(f'run{k}_start', [0], np.int64), g.const(f'run{k}_end', [-1], np.int64), 'col_axis']),
+                           g.op('Slice', [prev_onehot, g.const(f'run{k}_shift', [k - 1], np.int64), g.const(f'run{k}_stop', [33], np.int64), 'col_axis'])])
+        longest = g.op('Add', [longest, g.op('ReduceMax', [run], axes=[1], keepdims=1)])
+    first = g.op('Slice', [counts, 'red_start', 'int_one_1d', 'col_axis'])
+    rest = g.op('Slice', [counts, 'int_one_1d', g.const('counts_end', [7], np.int64), 'col_axis'])
+    raw_stats = g.op('Concat', [first, ac, rest, span, longest], axis=1)
+    stats_scale = g.const('stats_scale', [200.0, 10.0, 6.0, 6.0, 6.0, 6.0, 6.0, 6.0, 32.0, 6.0], np.float32)
+    red_stats = g.op('Mul', [g.op('Div', [raw_stats, stats_scale]), has_prev])
+
+    # Affinity: co-occurrence over the window's draws before t, summed over the previous draw's numbers.
+    #   sum_p co[a, p] prev[p] = sum_{u<t} O[u, a] (O[u] . prev - O[u, a] prev[a])
+    overlap = g.op('Transpose', [g.op('MatMul', [O, g.op('Transpose', [prev_onehot], perm=[1, 0])])], perm=[1, 0])
+    pairs = g.op('MatMul', [g.op('Mul', [before, overlap]), O])
+    self_pairs = g.op('Mul', [g.op('MatMul', [before, O]), prev_onehot])
+    affinity = g.op('Gather', [g.op('Sub', [pairs, self_pairs]), g.const('anchors', ANCHORS, np.int64)], axis=1)
+    red_affinity = g.op('Mul', [g.op('Div', [affinity, 'fifty']), has_prev])
+
+    red_steps = g.op('Concat', [red_gaps, red_freqs, momentum, red_stats, red_affinity], axis=1)
+    g.op('Reshape', [red_steps, g.const('red_shape', [1, RED_DIM], np.int64)], output='red_features')
+
+    blue_gaps = g.gaps(B, u_float, t_float, before_bool)
+    blue_freqs = g.op('Div', [g.op('MatMul', [in30, B]), 'thirty'])
+    blue_steps = g.op('Concat', [blue_gaps, blue_freqs], axis=1)
+    g.op('Reshape', [blue_steps, g.const('blue_shape', [1, BLUE_DIM], np.int64)], output='blue_features')
+
+    graph = helper.make_graph(
+        g.nodes, 'ssq_features',
+        [helper.make_tensor_value_info('draws', TensorProto.INT64, [None, 7])],
+        [helper.make_tensor_value_info('red_features', TensorProto.FLOAT, [1, RED_DIM]),
+         helper.make_tensor_value_info('blue_features', TensorProto.FLOAT, [1, BLUE_DIM])],
+        g.initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 12)])
+    model.ir_version = 7
+    onnx.checker.check_model(model)
+    return model
+
+def prepend_features(fused):
+    """Feature graph + the two-input fused ensemble (ssq_ensemble.onnx): 'draws' in, red_*/blue_* out"""
+    features = build_feature_graph()
+    opset = max(op.version for op in fused.opset_import if op.domain in ('', 'ai.onnx'))
+    features = onnx.version_converter.convert_version(features, opset) if opset > 12 else features
+    features.ir_version = fused.ir_version = max(features.ir_version, fused.ir_version)
+    model = onnx.compose.merge_models(features, fused, io_map=[('red_features', 'red_input'), ('blue_features', 'blue_input')])
+    onnx.checker.check_model(model)
+    return model
+
+def python_features(window):
+    """Reference: the next-draw rows build_*_windows(window, include_next=True) produce, as float32"""
+    red = np.hstack(calculate_features(window))[-SEQ_LEN:].reshape(1, -1)
+    blue = np.hstack(prepare_blue_features(window))[-SEQ_LEN:].reshape(1, -1)
+    return red.astype(np.float32), blue.astype(np.float32)
+
+def verify(session, df, history, n_windows, seed=0):
+    """Max |feature difference| against the Python pass over random historical windows"""
+    rng = np.random.default_rng(seed)
+    ends = rng.choice(np.arange(history, len(df) + 1), size=min(n_windows, len(df) - history + 1), replace=False)
+    worst = {'red_features': 0.0, 'blue_features': 0.0}
+    python_ms, graph_ms = [], []
+    for end in ends:
+        window = df.iloc[end - history:end].reset_index(drop=True)
+        start = time.perf_counter()
+        expected = dict(zip(worst, python_features(window)))
+        python_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        got = dict(zip(worst, session.run(list(worst), {'draws': draws_array(window)})))
+        graph_ms.append((time.perf_counter() - start) * 1000)
+        for name in worst:
+            worst[name] = max(worst[name], float(np.max(np.abs(got[name] - expected[name]))))
+    return worst, len(ends), np.median(python_ms), np.median(graph_ms)
+
+def export(history=HISTORY, n_windows=30, tolerance=1e-6):
+    df = load_frame()
+    features = build_feature_graph()
+    session = ort.InferenceSession(features.SerializeToString())
+    print(f"Checking the feature graph against calculate_features on {history}-draw windows...")
+    for h in sorted({SEQ_LEN + 1, history}):
+        worst, n, python_ms, graph_ms = verify(session, df, h, n_windows)
+        print(f"  H={h:<3} {n} windows: max |dx| red {worst['red_features']:.1e}, blue {worst['blue_features']:.1e}; "
+              f"p50 Python {python_ms:.1f} ms, graph {graph_ms:.3f} ms")
+        if max(worst.values()) > tolerance:
+            raise ValueError(f"Feature graph differs from calculate_features by {max(worst.values()):.1e} at H={h}")
+
+    if not os.path.exists(FUSED_FILE):
+        print(f"{FUSED_FILE} not found; run export_ensemble_onnx.py first")
+        return
+    fused = onnx.load(FUSED_FILE)
+    model = prepend_features(fused)
+    onnx.save(model, DRAWS_FILE)
+
+    # End to end: the composed model must equal the fused ensemble fed the Python features
+    window = df.iloc[-history:].reset_index(drop=True)
+    red, blue = python_features(window)
+    expected = ort.InferenceSession(FUSED_FILE).run(['red_probabilities', 'blue_probabilities'], {'red_input': red, 'blue_input': blue})
+    got = ort.InferenceSession(DRAWS_FILE).run(['red_probabilities', 'blue_probabilities', 'red_top_indices'], {'draws': draws_array(window)})
+    dev = max(float(np.max(np.abs(a - b))) for a, b in zip(got[:2], expected))
+    print(f"{DRAWS_FILE}: max |dP| vs {FUSED_FILE} on Python features {dev:.1e}; "
+          f"next-draw red top-12 {sorted((got[2][0] + 1).tolist())} ({os.path.getsize(DRAWS_FILE) / 1024:.0f} KB)")
+
+    assets_dir = "../flutter_app/assets/models/"
+    if os.path.exists(assets_dir):
+        shutil.copy(DRAWS_FILE, os.path.join(assets_dir, DRAWS_FILE))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--history', type=int, default=HISTORY, help='draws per window sent by clients')
+    parser.add_argument('--windows', type=int, default=30,
+                        help='random historical windows checked per window size (the Python pass takes ~1 s each)')
+    parser.add_argument('--tolerance', type=float, default=1e-6, help='max allowed feature difference')
+    args = parser.parse_args()
+    export(args.history, args.windows, args.tolerance)
@@ -0,0 +1,181 @@
+import argparse
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import onnx
+import onnxruntime as ort
+from train_xgboost import build_red_windows, build_blue_windows
+from export_ensemble_onnx import FUSED_FILE, RED_TOP_K, BLUE_TOP_K
+from draw_history import load_frame
+from boosters import record_release, release_tolerance
+
+# Release-time optimization of the exported tree ensembles.
+#   1. ONNX Runtime offline optimization (constant folding, redundant Identity/Cast elimination) at the
+#      BASIC level, which only rewrites standard ONNX ops and stays portable to the mobile runtime.
+#      The saved graph is pre-optimized, so clients can create sessions without re-running it.
+#   2. float16 split thresholds: every TreeEnsembleClassifier threshold is rounded to a float16
+#      value (still stored as float32, since the runtime has no float16 tree kernel), which zeroes
+#      their low mantissa bits for the compressed app bundle. It is kept only if the ordered top-k
+#      of every historical window is unchanged; the gzip column shows what it is worth.
+# Before/after file size (raw and gzip), session-creation time and single-row latency are reported.
+
+# Max |dP| float16 thresholds may add on any verification window
+PROB_TOL = 1e-4
+
+TARGETS = {
+    # file: {input: color}, {probabilities output: top-k compared}
+    'red_ball_xgb.onnx': ({'input': 'red'}, {'probabilities': RED_TOP_K}),
+    'red_ball_lgbm.onnx': ({'input': 'red'}, {'probabilities': RED_TOP_K}),
+    'blue_ball_xgb.onnx': ({'input': 'blue'}, {'probabilities': BLUE_TOP_K}),
+    'blue_ball_lgbm.onnx': ({'input': 'blue'}, {'probabilities': BLUE_TOP_K}),
+    FUSED_FILE: ({'red_input': 'red', 'blue_input': 'blue'}, {'red_probabilities': RED_TOP_K, 'blue_probabilities': BLUE_TOP_K}),
+}
+
+def ort_optimize(proto, level=ort.GraphOptimizationLevel.ORT_ENABLE_BASIC):
+    """The graph as ONNX Runtime rewrites it at session creation, saved back as a model"""
+    with tempfile.TemporaryDirectory() as tmp:
+        options = ort.SessionOptions()
+        options.graph_optimization_level = level
+        options.optimized_model_filepath = os.path.join(tmp, 'optimized.onnx')
+        ort.InferenceSession(proto.SerializeToString(), options, providers=['CPUExecutionProvider'])
+        optimized = onnx.load(options.optimized_model_filepath)
+    # The runtime lists every domain it knows (some twice); keep the original imports
+    del optimized.opset_import[:]
+    optimized.opset_import.extend(proto.opset_import)
+    onnx.checker.check_model(optimized)
+    return optimized
+
+def _round_toward(values, down, dtype):
+    rounded = values.astype(dtype)
+    overshoot = np.where(down, rounded.astype(np.float32) > values, rounded.astype(np.float32) < values)
+    stepped = np.nextafter(rounded, np.where(down, -np.inf, np.inf).astype(dtype))
+    return np.where(overshoot, stepped, rounded).astype(np.float32)
+
+def round_thresholds(proto, dtype=np.float16):
+    """
+    Copy of `proto` with every tree split threshold rounded to `dtype` precision. XGBoost splits
+    sit exactly on feature values, so each threshold moves away from the values it compares equal
+    to: down for x < t / x >= t, up for x <= t / x > t.
+    """
+    rounded = onnx.ModelProto()
+    rounded.CopyFrom(proto)
+    for node in rounded.graph.node:
+        if node.op_type != 'TreeEnsembleClassifier':
+            continue
+        attrs = {a.name: a for a in node.attribute}
+        values = np.asarray(attrs['nodes_values'].floats, dtype=np.float32)
+        down = np.isin(np.asarray(attrs['nodes_modes'].strings), [b'BRANCH_LT', b'BRANCH_GTE'])
+        del attrs['nodes_values'].floats[:]
+        attrs['nodes_values'].floats.extend(_round_toward(values, down, dtype).tolist())
+    onnx.checker.check_model(rounded)
+    return rounded
+
+def _session(proto, preoptimized=False):
+    options = ort.SessionOptions()
+    if preoptimized:
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    return ort.InferenceSession(proto.SerializeToString(), options, providers=['CPUExecutionProvider'])
+
+def _top(probs, k):
+    return np.argsort(-probs, axis=1, kind='stable')[:, :k]
+
+def compare(reference, candidate, feeds, outputs):
+    """(max |dP|, fraction of rows whose ordered top-k matches in every output)"""
+    names = list(outputs)
+    ref = reference.run(names, feeds)
+    got = candidate.run(names, feeds)
+    max_dp = max(float(np.max(np.abs(a - b))) for a, b in zip(ref, got))
+    same = np.all([np.all(_top(a, k) == _top(b, k), axis=1) for a, b, k in zip(ref, got, outputs.values())], axis=0)
+    return max_dp, float(np.mean(same))
+
+def measure(proto, feeds, preoptimized=False, runs=200, loads=5):
+    """(raw KB, gzip KB, median session-creation ms, median single-row run ms)"""
+    data = proto.SerializeToString()
+    load_ms = []
+    for _ in range(loads):
+        start = time.perf_counter()
+        session = _session(proto, preoptimized)
+        load_ms.append((time.perf_counter() - start) * 1000)
+    single = {name: x[-1:] for name, x in feeds.items()}
+    session.run(None, single)
+    run_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        session.run(None, single)
+        run_ms.append((time.perf_counter() - start) * 1000)
+    return len(data) / 1024.0, len(gzip.compress(data)) / 1024.0, np.median(load_ms), np.median(run_ms)
+
+def optimize_exact(proto, feeds, outputs, reference=None):
+    """(offline-optimized model, max |dP| on `feeds`); raises if the ordered top-k of any row changes"""
+    optimized = ort_optimize(proto)
+    max_dp, agreement = compare(reference or _session(proto), _session(optimized, True), feeds, outputs)
+    if agreement < 1.0:
+        raise ValueError(f"Offline optimization changed top-k on {1 - agreement:.1%} of rows")
+    return optimized, max_dp
+
+def optimize_verified(proto, feeds, outputs, prob_tol=PROB_TOL):
+    """
+    Offline-optimized model, with float16 thresholds when the ordered top-k of every row in
+    `feeds` is unchanged and |dP| <= prob_tol. Returns (proto, report).
+    """
+    reference = _session(proto)
+    optimized, max_dp = optimize_exact(proto, feeds, outputs, reference)
+    report = {'fp16': False, 'max_dp': max_dp, 'fp16_dp': None, 'fp16_agreement': None}
+    rounded = round_thresholds(optimized)
+    fp16_dp, fp16_agreement = compare(reference, _session(rounded, True), feeds, outputs)
+    report.update(fp16_dp=fp16_dp, fp16_agreement=fp16_agreement)
+    if fp16_agreement == 1.0 and fp16_dp <= prob_tol:
+        optimized, report['fp16'], report['max_dp'] = rounded, True, fp16_dp
+    return optimized, report
+
+def feeds_for(inputs, windows):
+    return {name: windows[color] for name, color in inputs.items()}
+
+def run(files=None, rows=500, prob_tol=PROB_TOL):
+    print(f"Loading the last {rows} historical windows for verification...")
+    df = load_frame().tail(rows + 15).reset_index(drop=True)
+    windows = {'red': build_red_windows(df).astype(np.float32), 'blue': build_blue_windows(df).astype(np.float32)}
+
+    results = []
+    for name in files or list(TARGETS):
+        if not os.path.exists(name):
+            print(f"Skipping {name} (not exported)")
+            continue
+        inputs, outputs = TARGETS[name]
+        feeds = feeds_for(inputs, windows)
+        print(f"Optimizing {name}...")
+        original = onnx.load(name)
+        before = measure(original, feeds)
+        optimized, report = optimize_verified(original, feeds, outputs, prob_tol)
+        if not report['fp16']:
+            print(f"  float16 thresholds rejected: max |dP| {report['fp16_dp']:.1e}, top-k unchanged on {report['fp16_agreement']:.1%} of windows")
+        drift = release_tolerance(name) + (prob_tol if report['fp16'] else 0.0)
+        onnx.save(optimized, name)
+        record_release(name, drift)
+        results.append((name, report, before, measure(optimized, feeds, preoptimized=True)))
+
+    print("-" * 118)
+    print(f"{'Model':<20} | {'fp16':>4} | {'Size (KB)':>15} | {'gzip (KB)':>15} | {'Session (ms)':>15} | {'p50 run (ms)':>13} | {'max|dP|':>8}")
+    print("-" * 118)
+    for name, r, (kb0, gz0, load0, ms0), (kb1, gz1, load1, ms1) in results:
+        print(f"{name:<20} | {'yes' if r['fp16'] else 'no':>4} | {kb0:>7.0f}->{kb1:<6.0f} | {gz0:>7.0f}->{gz1:<6.0f} | "
+              f"{load0:>7.1f}->{load1:<6.1f} | {ms0:>6.3f}->{ms1:<5.3f} | {r['max_dp']:>8.1e}")
+    print("-" * 118)
+    print("Session times for optimized files are measured with graph optimization disabled, as clients can load them.")
+
+    assets_dir = "../flutter_app/assets/models/"
+    if results and os.path.exists(assets_dir):
+        print(f"Copying optimized models to {assets_dir}...")
+        for name, *_ in results:
+            shutil.copy(name, os.path.join(assets_dir, name))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', nargs='+', choices=sorted(TARGETS), default=None)
+    parser.add_argument('--rows', type=int, default=500, help='most recent historical windows used for verification')
+    parser.add_argument('--prob-tol', type=float, default=PROB_TOL, help='max allowed |dP| for float16 thresholds')
+    args = parser.parse_args()
+    run(args.files, args.rows, args.prob_tol)
@@ -0,0 +1,284 @@
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from draw_history import load_frame
+
+# Pure-NumPy inference for the tree models.
+# An XGBoost or LightGBM model is compiled once into flat struct-of-arrays (split feature,
+# threshold, child pointers, leaf value, output slot per tree) and saved as .npz. Prediction
+# then needs only NumPy: every tree of the forest is walked at once for a whole batch, one
+# level per step, so the Python loop runs max_depth times instead of once per tree or row.
+# xgboost / lightgbm are only imported when compiling from a live model object.
+
+PACKED_SUFFIX = '.forest.npz'
+
+class PackedForest:
+    """
+    Nodes of all trees in one set of arrays. Leaves point to themselves, so the level-wise walk
+    needs no per-row "finished" bookkeeping: a row that reached a leaf just stays there.
+    """
+    def __init__(self, feature, threshold, left, right, default_left, value, roots, tree_slot,
+                 base_margin, max_depth, transform, inclusive, n_outputs):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.tree_slot = tree_slot
+        self.base_margin = base_margin
+        self.max_depth = int(max_depth)
+        # 'softmax' (multiclass), 'sigmoid' (one binary target -> 2 columns like predict_proba),
+        # 'sigmoid_multi' (XGBoost multi-target binary:logistic -> one column per target)
+        self.transform = str(transform)
+        # XGBoost goes left on x < t (float32); LightGBM on x <= t (float64)
+        self.inclusive = bool(inclusive)
+        self.n_outputs = int(n_outputs)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def margins(self, X, batch_size=256):
+        X = np.asarray(X, dtype=self.threshold.dtype)
+        if X.ndim == 1:
+            X = X[None, :]
+        slot_onehot = np.zeros((self.n_trees, len(self.base_margin)), dtype=np.float64)
+        slot_onehot[np.arange(self.n_trees), self.tree_slot] = 1.0
+        out = np.empty((len(X), len(self.base_margin)))
+        for start in range(0, len(X), batch_size):
+            chunk = X[start:start + batch_size]
+            rows = np.arange(len(chunk))[:, None]
+            node = np.broadcast_to(self.roots, (len(chunk), self.n_trees)).copy()
+            for _ in range(self.max_depth):
+                x = chunk[rows, self.feature[node]]
+                t = self.threshold[node]
+                go_left = (x <= t) if self.inclusive else (x < t)
+                go_left = np.where(np.isnan(x), self.default_left[node], go_left)
+                node = np.where(go_left, self.left[node], self.right[node])
+            out[start:start + len(chunk)] = self.value[node] @ slot_onehot
+        return out + self.base_margin
+
+    def predict_proba(self, X):
+        margin = self.margins(X)
+        if self.transform == 'softmax':
+            e = np.exp(margin - margin.max(axis=1, keepdims=True))
+            return e / e.sum(axis=1, keepdims=True)
+        p = 1.0 / (1.0 + np.exp(-margin))
+        if self.transform == 'sigmoid':
+            return np.hstack([1.0 - p, p])
+        return p
+
+    def save(self, path):
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                 default_left=self.default_left, value=self.value, roots=self.roots, tree_slot=self.tree_slot,
+                 base_margin=self.base_margin, max_depth=self.max_depth, transform=self.transform,
+                 inclusive=self.inclusive, n_outputs=self.n_outputs)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{key: data[key] for key in data.files})
+
+class _Builder:
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right = [], [], [], []
+        self.default_left, self.value, self.roots, self.tree_slot = [], [], [], []
+        self.max_depth = 0
+
+    def add_tree(self, nodes, slot):
+        """nodes: list of (feature, threshold, left, right, default_left, leaf_value) with local child ids (-1 = leaf)"""
+        offset = len(self.feature)
+        self.roots.append(offset)
+        self.tree_slot.append(slot)
+        depth = {0: 0}
+        for k, (feature, threshold, left, right, default_left, leaf_value) in enumerate(nodes):
+            if left < 0:
+                self.feature.append(0); self.threshold.append(0.0)
+                self.left.append(offset + k); self.right.append(offset + k)
+                self.default_left.append(True); self.value.append(leaf_value)
+                continue
+            self.feature.append(feature); self.threshold.append(threshold)
+            self.left.append(offset + left); self.right.append(offset + right)
+            self.default_left.append(bool(default_left)); self.value.append(0.0)
+            depth[left] = depth[right] = depth[k] + 1
+        self.max_depth = max(self.max_depth, max(depth.values()))
+
+    def build(self, base_margin, transform, inclusive, n_outputs, threshold_dtype):
+        return PackedForest(
+            np.array(self.feature, dtype=np.int32), np.array(self.threshold, dtype=threshold_dtype),
+            np.array(self.left, dtype=np.int32), np.array(self.right, dtype=np.int32),
+            np.array(self.default_left, dtype=bool), np.array(self.value, dtype=np.float64),
+            np.array(self.roots, dtype=np.int32), np.array(self.tree_slot, dtype=np.int32),
+            np.asarray(base_margin, dtype=np.float64), self.max_depth, transform, inclusive, n_outputs,
+        )
+
+def from_xgboost_json(model_json):
+    """Compile a model saved with XGBoost's save_model('*.json') (a dict or a path)"""
+    if isinstance(model_json, (str, os.PathLike)):
+        with open(model_json) as f:
+            model_json = json.load(f)
+    learner = model_json['learner']
+    objective = learner['objective']['name']
+    params = learner['learner_model_param']
+    base_score = np.array([float(v) for v in params['base_score'].strip('[]').split(',')])
+    gbm = learner['gradient_booster']['model']
+    n_slots = max(int(params.get('num_class', 0)), int(params.get('num_target', 1)), 1)
+
+    builder = _Builder()
+    for tree, slot in zip(gbm['trees'], gbm['tree_info']):
+        # Leaves keep their value in split_conditions
+        nodes = list(zip(tree['split_indices'], tree['split_conditions'], tree['left_children'],
+                         tree['right_children'], tree['default_left'], tree['split_conditions']))
+        builder.add_tree(nodes, slot)
+
+    if objective.startswith('multi:'):
+        transform, base_margin = 'softmax', np.broadcast_to(base_score, (n_slots,))
+    elif objective == 'binary:logistic':
+        base_margin = np.log(base_score / (1.0 - base_score))
+        transform = 'sigmoid' if n_slots == 1 else 'sigmoid_multi'
+        base_margin = np.broadcast_to(base_margin, (n_slots,))
+    else:
+        raise ValueError(f"Unsupported XGBoost objective: {objective}")
+    n_outputs = 2 if transform == 'sigmoid' else n_slots
+    return builder.build(base_margin, transform, False, n_outputs, np.float32)
+
+def from_lightgbm_dump(dump):
+    """Compile the dict returned by lightgbm.Booster.dump_model()"""
+    objective = dump['objective'].split()[0]
+    num_class = int(dump['num_class'])
+    builder = _Builder()
+    for k, info in enumerate(dump['tree_info']):
+        nodes = []
+
+        def visit(node):
+            index = len(nodes)
+            nodes.append(None)
+            if 'leaf_value' in node or 'split_index' not in node:
+                nodes[index] = (0, 0.0, -1, -1, True, node.get('leaf_value', 0.0))
+                return index
+            if node['decision_type'] != '<=':
+                raise ValueError("Categorical LightGBM splits are not supported")
+            left = visit(node['left_child'])
+            right = visit(node['right_child'])
+            nodes[index] = (node['split_feature'], node['threshold'], left, right, node['default_left'], 0.0)
+            return index
+
+        visit(info['tree_structure'])
+        builder.add_tree(nodes, k % num_class)
+
+    if objective in ('multiclass', 'softmax'):
+        transform, n_outputs = 'softmax', num_class
+    elif objective == 'binary':
+        transform, n_outputs = 'sigmoid', 2
+    else:
+        raise ValueError(f"Unsupported LightGBM objective: {objective}")
+    # LightGBM bakes its initial score into the first trees
+    return builder.build(np.zeros(num_class), transform, True, n_outputs, np.float64)
+
+def compile_model(model):
+    """PackedForest from an XGBoost/LightGBM sklearn model or native Booster"""
+    import xgboost as xgb
+    import lightgbm as lgb
+    if isinstance(model, xgb.XGBModel):
+        model = model.get_booster()
+    if isinstance(model, xgb.Booster):
+        return from_xgboost_json(json.loads(model.save_raw('json')))
+    if isinstance(model, lgb.LGBMModel):
+        model = model.booster_
+    if isinstance(model, lgb.Booster):
+        return from_lightgbm_dump(model.dump_model())
+    raise ValueError(f"Cannot compile {type(model).__name__}")
+
+def _native_probs(model, X):
+    import xgboost as xgb
+    if isinstance(model, xgb.Booster):
+        probs = model.inplace_predict(X)
+        # Single-target binary boosters return P(positive) only; match predict_proba's two columns
+        return np.column_stack([1.0 - probs, probs]) if probs.ndim == 1 else probs
+    return model.predict_proba(X)
+
+def pack_models(base_path='.', verify_rows=200, tolerance=1e-5):
+    """
+    Compile every booster artifact (the ensemble joblibs, red_ball_xgb.json, red_boosters/*.json)
+    to <name>.forest.npz, checking probabilities against the native library on historical rows.
+    """
+    import joblib
+    import xgboost as xgb
+    from boosters import BaggedBooster
+    from train_xgboost import build_red_windows, build_blue_windows, load_red_mask, red_columns_for
+
+    df = load_frame(base_path)
+    X_red = build_red_windows(df.tail(verify_rows + 15).reset_index(drop=True))
+    X_blue = build_blue_windows(df.tail(verify_rows + 15).reset_index(drop=True))
+
+    jobs = []
+    for name in ['red_ball_xgb', 'red_ball_lgbm', 'blue_ball_xgb', 'blue_ball_lgbm']:
+        path = os.path.join(base_path, f'{name}.joblib')
+        if not os.path.exists(path):
+            continue
+        model = joblib.load(path)
+        X = X_blue if name.startswith('blue') else X_red
+        if name.startswith('red'):
+            columns = red_columns_for(model, load_red_mask(base_path))
+            X = X if columns is None else X[:, columns]
+        members = model.members if isinstance(model, BaggedBooster) else [model]
+        for k, member in enumerate(members):
+            suffix = f'.bag{k}' if len(members) > 1 else ''
+            jobs.append((f'{name}{suffix}', member, X))
+    for path in [os.path.join(base_path, 'red_ball_xgb.json')] + sorted(glob.glob(os.path.join(base_path, 'red_boosters', '*.json'))):
+        booster = xgb.Booster()
+        booster.load_model(path)
+        if booster.num_features() == X_red.shape[1]:
+            # Keep '.json' in the name so red_ball_xgb.json never overwrites the joblib model's forest
+            jobs.append((path, booster, X_red))
+
+    print("-" * 92)
+    print(f"{'Model':<28} | {'Trees':>6} | {'Nodes':>7} | {'max|dP|':>8} | {'Native 1-row':>12} | {'NumPy 1-row':>11}")
+    print("-" * 92)
+    worst = 0.0
+    for name, model, X in jobs:
+        forest = compile_model(model)
+        forest.save(os.path.join(base_path, name) + PACKED_SUFFIX)
+        dev = float(np.max(np.abs(forest.predict_proba(X) - _native_probs(model, X))))
+        worst = max(worst, dev)
+        native_ms = _row_latency_ms(lambda row: _native_probs(model, row), X)
+        packed_ms = _row_latency_ms(forest.predict_proba, X)
+        print(f"{os.path.basename(name):<28} | {forest.n_trees:>6} | {forest.n_nodes:>7} | {dev:>8.1e} | {native_ms:>9.3f} ms | {packed_ms:>8.3f} ms")
+    print("-" * 92)
+    if worst > tolerance:
+        raise ValueError(f"Packed forest deviates from the native model by {worst:.2e} (> {tolerance})")
+    print(f"All {len(jobs)} packed forests match native probabilities within {tolerance}.")
+
+    # Cold-start cost of a prediction host: interpreter + imports, measured in fresh processes
+    for label, code in [('numpy only', 'import numpy'), ('xgboost + lightgbm', 'import xgboost, lightgbm')]:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        print(f"Startup ({label}): {(time.perf_counter() - start) * 1000:.0f} ms")
+
+def _row_latency_ms(predict, X, runs=50):
+    row = X[-1:]
+    predict(row)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200, help='most recent historical windows used for verification')
+    parser.add_argument('--tolerance', type=float, default=1e-5)
+    args = parser.parse_args()
+    pack_models('.', args.rows, args.tolerance)
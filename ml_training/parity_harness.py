@@ -0,0 +1,183 @@
+import os
+os.environ["KERAS_BACKEND"] = "tensorflow"
+import argparse
+import time
+import joblib
+import numpy as np
+import onnxruntime as ort
+from boosters import BaggedBooster, release_tolerance
+from ensemble_predictor import EnsemblePredictor, RED_MEMBERS, BLUE_MEMBERS, _native_predictor
+from export_ensemble_onnx import FUSED_FILE, RED_TOP_K, BLUE_TOP_K
+from packed_forest import PackedForest, PACKED_SUFFIX
+from train_xgboost import build_red_windows, build_blue_windows, load_red_mask, red_columns_for, SEQ_LEN
+from draw_history import load_frame
+
+# Replays real historical feature windows through every artifact format a model ships in and
+# compares each runtime with the training-side reference:
+#   boosters  sklearn predict_proba (reference) | native booster | ONNX Runtime | packed NumPy forest
+#   ensemble  EnsemblePredictor (reference) | fused ONNX
+#   networks  Keras (reference) | TFLite interpreter | ONNX Runtime
+# Artifacts that are not on disk are skipped. Any runtime outside its tolerance fails the run.
+
+# Max |dP| per runtime; float32 ONNX / TFLite inputs cannot match float64 references bit for bit.
+# Shipped ONNX files are also allowed the drift they were released under (compaction, float16
+# thresholds), as recorded in model_meta.json for the file on disk.
+TOLERANCES = {'native': 1e-6, 'packed': 1e-5, 'onnx': 1e-4, 'tflite': 1e-3}
+BATCH_SIZES = (1, 64)
+
+def _onnx_runtime(path):
+    session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+    input_name = session.get_inputs()[0].name
+    output = session.get_outputs()[-1].name
+    return lambda X: session.run([output], {input_name: X.astype(np.float32)})[0]
+
+def _fused_runtime(path, color):
+    """One color of the two-input fused ensemble; the other color is fed zeros"""
+    session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+    widths = {i.name: i.shape[1] for i in session.get_inputs()}
+    def predict(X):
+        feed = {name: np.zeros((len(X), width), dtype=np.float32) for name, width in widths.items()}
+        feed[f'{color}_input'] = X.astype(np.float32)
+        return session.run([f'{color}_probabilities'], feed)[0]
+    return predict
+
+def _tflite_runtime(path):
+    import tensorflow as tf
+    interpreter = tf.lite.Interpreter(model_path=path)
+    detail = interpreter.get_input_details()[0]
+    output = next(d for d in interpreter.get_output_details() if len(d['shape']) == 2)
+    state = {'batch': None}
+    def predict(X):
+        if state['batch'] != len(X):
+            interpreter.resize_tensor_input(detail['index'], [len(X)] + list(detail['shape'][1:]))
+            interpreter.allocate_tensors()
+            state['batch'] = len(X)
+        interpreter.set_tensor(detail['index'], X.astype(np.float32))
+        interpreter.invoke()
+        return interpreter.get_tensor(output['index'])
+    return predict
+
+def _load(make, *args):
+    """A runtime's predict function, or the exception raised while loading it (reported as a failure)"""
+    try:
+        return make(*args)
+    except Exception as e:
+        return e
+
+def booster_cases(base_path, windows):
+    """(label, X, k, reference, {runtime: predict}, {runtime: release |dP|}) for every ensemble member and the fused ensemble"""
+    cases = []
+    red_mask = load_red_mask(base_path)
+    for names, color in ((RED_MEMBERS, 'red'), (BLUE_MEMBERS, 'blue')):
+        X = windows[color]
+        k = RED_TOP_K if color == 'red' else BLUE_TOP_K
+        for name in names:
+            path = os.path.join(base_path, name)
+            if not os.path.exists(path):
+                continue
+            model = joblib.load(path)
+            columns = red_columns_for(model, red_mask) if color == 'red' else None
+            select = (lambda X: X) if columns is None else (lambda X, c=columns: X[:, c])
+            stem = name[:-len('.joblib')]
+            runtimes = {}
+            if not isinstance(model, BaggedBooster):
+                native = _native_predictor(model)
+                runtimes['native'] = lambda X, p=native, s=select: p(np.ascontiguousarray(s(X)))
+                packed = os.path.join(base_path, stem + PACKED_SUFFIX)
+                if os.path.exists(packed):
+                    forest = PackedForest.load(packed)
+                    runtimes['packed'] = lambda X, f=forest, s=select: f.predict_proba(s(X))
+            onnx_path = os.path.join(base_path, stem + '.onnx')
+            if os.path.exists(onnx_path):
+                # Exported graphs take the full-width row and apply the mask in-graph
+                runtimes['onnx'] = _load(_onnx_runtime, onnx_path)
+            cases.append((stem, X, k, lambda X, m=model, s=select: m.predict_proba(s(X)), runtimes,
+                          {'onnx': release_tolerance(onnx_path)}))
+
+    fused = os.path.join(base_path, FUSED_FILE)
+    if all(os.path.exists(os.path.join(base_path, n)) for n in RED_MEMBERS + BLUE_MEMBERS):
+        predictor = EnsemblePredictor.load(base_path)
+        for color, k, reference in (('red', RED_TOP_K, predictor.predict_red), ('blue', BLUE_TOP_K, predictor.predict_blue)):
+            runtimes = {}
+            if os.path.exists(fused):
+                runtimes['onnx'] = _load(_fused_runtime, fused, color)
+            cases.append((f'{color} ensemble', windows[color], k, reference, runtimes, {'onnx': release_tolerance(fused)}))
+    return cases
+
+def network_cases(base_path, df):
+    """Keras networks against their TFLite / ONNX exports (input layouts as in train_model)"""
+    cases = []
+    blue_keras = os.path.join(base_path, 'blue_ball_model.keras')
+    if os.path.exists(blue_keras):
+        from tensorflow import keras
+        model = keras.models.load_model(blue_keras, safe_mode=False)
+        X = build_blue_windows(df).reshape(-1, SEQ_LEN, 32).astype(np.float32)
+        runtimes = {}
+        for runtime, path, make in (('tflite', 'blue_ball_model.tflite', _tflite_runtime),
+                                    ('onnx', '../flutter_app/assets/models/blue_ball_model.onnx', _onnx_runtime)):
+            if os.path.exists(os.path.join(base_path, path)):
+                runtimes[runtime] = _load(make, os.path.join(base_path, path))
+        cases.append(('blue network', X, BLUE_TOP_K, lambda X, m=model: m(X, training=False).numpy(), runtimes, {}))
+    elif os.path.exists(os.path.join(base_path, 'blue_ball_model.tflite')):
+        print("blue_ball_model.tflite has no Keras reference on disk; not checked")
+    if not os.path.exists(os.path.join(base_path, 'red_ball_model.keras')) and os.path.exists(os.path.join(base_path, 'red_ball_model.tflite')):
+        print("red_ball_model.tflite has no Keras reference on disk (train_model.py writes it); not checked")
+    return cases
+
+def latency_ms(predict, X, batch, runs):
+    """(p50, p99) of one call on `batch` consecutive rows, cycling through X"""
+    timings = []
+    predict(X[:batch])
+    for r in range(runs):
+        start = (r * batch) % max(len(X) - batch + 1, 1)
+        chunk = X[start:start + batch]
+        t0 = time.perf_counter()
+        predict(chunk)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+def top_k_agreement(a, b, k):
+    top_a = np.sort(np.argsort(-a, axis=1, kind='stable')[:, :k], axis=1)
+    top_b = np.sort(np.argsort(-b, axis=1, kind='stable')[:, :k], axis=1)
+    return float(np.mean(np.all(top_a == top_b, axis=1)))
+
+def run(base_path='.', rows=300, runs=200, min_agreement=0.99, tolerances=TOLERANCES):
+    df = load_frame(base_path)
+    df = df.tail(rows + SEQ_LEN).reset_index(drop=True)
+    print(f"Replaying the last {rows} historical windows...")
+    windows = {'red': build_red_windows(df), 'blue': build_blue_windows(df)}
+    cases = booster_cases(base_path, windows) + network_cases(base_path, df)
+
+    width = 18 + 10 + 10 + 9 + 4 * 10 + 16
+    print("-" * width)
+    print(f"{'Model':<18} | {'Runtime':<8} | {'max|dP|':>8} | {'Top-k':>6} | {'b1 p50':>7} | {'b1 p99':>7} | "
+          f"{'b64 p50':>7} | {'b64 p99':>7}   (ms)")
+    print("-" * width)
+    failures = []
+    for label, X, k, reference, runtimes, released in cases:
+        expected = np.asarray(reference(X))
+        for runtime, predict in [('ref', reference)] + list(runtimes.items()):
+            if isinstance(predict, Exception):
+                print(f"{label:<18} | {runtime:<8} | failed to load: {str(predict).splitlines()[0][:90]}")
+                failures.append(f"{label}/{runtime}: failed to load ({type(predict).__name__})")
+                continue
+            probs = np.asarray(predict(X))
+            dev = float(np.max(np.abs(probs - expected)))
+            agreement = top_k_agreement(probs, expected, k)
+            timings = [t for batch in BATCH_SIZES for t in latency_ms(predict, X, batch, runs)]
+            print(f"{label:<18} | {runtime:<8} | {dev:>8.1e} | {agreement:>6.1%} | " + " | ".join(f"{t:>7.3f}" for t in timings))
+            tolerance = tolerances.get(runtime, 0.0) + released.get(runtime, 0.0)
+            if runtime != 'ref' and (dev > tolerance or agreement < min_agreement):
+                failures.append(f"{label}/{runtime}: max |dP| {dev:.1e} (tol {tolerance:g}), top-{k} agreement {agreement:.1%}")
+        print("-" * width)
+    if failures:
+        raise ValueError("Runtime parity drifted:\n  " + "\n  ".join(failures))
+    print(f"All runtimes within tolerance (top-k agreement >= {min_agreement:.0%}).")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=300, help='most recent historical windows replayed')
+    parser.add_argument('--runs', type=int, default=200, help='timed calls per batch size')
+    parser.add_argument('--min-agreement', type=float, default=0.99, help='fraction of windows whose top-k set must match')
+    args = parser.parse_args()
+    run('.', args.rows, args.runs, args.min_agreement)
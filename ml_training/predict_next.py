@@ -1,8 +1,8 @@
-import pandas as pd
 import numpy as np
-import joblib
 import os
-import xgboost as xgb
+import argparse
+from next_prediction import load_prediction
+from draw_history import load as load_draws, load_frame, HISTORY, DRAWS_FILE
 
 def calculate_ac_value(reds):
     diffs = set()
@@ -94,17 +94,45 @@ def prepare_blue_features_single(df_window):
             
     return np.clip(blue_gaps / 50.0, 0, 1), blue_freqs
 
-def predict():
-    base_path = os.path.dirname(__file__)
-    csv_path = os.path.join(base_path, 'ssq_data.csv')
-    df = pd.read_csv(csv_path).sort_values('issue').reset_index(drop=True)
-    
-    red_model = joblib.load(os.path.join(base_path, 'red_ball_xgb.joblib'))
-    blue_model = joblib.load(os.path.join(base_path, 'blue_ball_xgb.joblib'))
+def predict_from_draws(base_path, draws):
+    """(red top-12, blue top-1) from the exported draws-in ensemble, or None when it is not on disk"""
+    path = os.path.join(base_path, DRAWS_FILE)
+    if not os.path.exists(path):
+        return None
+    import onnxruntime as ort
+    session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+    red_top, blue_top = session.run(['red_top_indices', 'blue_top_indices'], {'draws': draws[-HISTORY:]})
+    return sorted(int(n) + 1 for n in red_top[0]), int(blue_top[0][0]) + 1
+
+def predict(live=False):
+    # Heavy imports (pandas, xgboost, lightgbm) are deferred to the full in-process path below
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    issues, draws = load_draws(base_path)
+    next_issue = int(issues[-1]) + 1
+    
+    # The scheduled retrain already published the answer for the next issue; use it while it is current
+    record = None if live else load_prediction(base_path, issues[-1])
+    if record is not None:
+        print(f"Predictions for Draw {record['issue']} (materialized {record['generated_at']}):")
+        print(f"Red Balls (Top 12): {sorted(record['red_top'])}")
+        print(f"Blue Ball (Top 1): {record['blue_top'][0]}")
+        return
+    
+    # Next best: one ONNX Runtime session computes the features and the ensemble from the raw draws
+    answer = None if live else predict_from_draws(base_path, draws)
+    if answer is not None:
+        print(f"Predictions for Draw {next_issue} ({DRAWS_FILE}):")
+        print(f"Red Balls (Top 12): {answer[0]}")
+        print(f"Blue Ball (Top 1): {answer[1]}")
+        return
+    
+    from ensemble_predictor import EnsemblePredictor
+    df = load_frame(base_path)
+    predictor = EnsemblePredictor.load(base_path)
     
     # We need the last 15 draws + context for stats (30 draws context)
     # Total 45 draws
-    df_context = df.tail(45).copy().reset_index(drop=True)
+    df_context = df.tail(HISTORY).copy().reset_index(drop=True)
     rg, rf, m, rs, ra = calculate_features_single(df_context)
     bg, bf = prepare_blue_features_single(df_context)
     
@@ -135,9 +163,6 @@ def predict():
         red_feat.extend(ra[step])
     
     X_red = np.array([red_feat])
-    red_probs = red_model.predict_proba(X_red)[0]
-    top_12_red = np.argsort(red_probs)[-12:] + 1
-    top_12_red = sorted(top_12_red)
     
     # Blue Features
     blue_feat = []
@@ -146,11 +171,9 @@ def predict():
         blue_feat.extend(bf[step])
     
     X_blue = np.array([blue_feat])
-    blue_probs = blue_model.predict_proba(X_blue)[0]
-    pred_blue = np.argmax(blue_probs) + 1
-    
-    last_issue = df.iloc[-1]['issue']
-    next_issue = int(last_issue) + 1
+    prediction = predictor.predict(X_red, X_blue)
+    top_12_red = sorted(prediction['red_top'][0])
+    pred_blue = prediction['blue_top'][0][0]
     
     print(f"Predictions for Draw {next_issue}:")
     print(f"Red Balls (Top 12): {top_12_red}")
@@ -173,7 +196,7 @@ def predict():
         red_feat_26012.extend(ra[step])
     
     X_red_26012 = np.array([red_feat_26012])
-    probs_26012 = red_model.predict_proba(X_red_26012)[0]
+    probs_26012 = predictor.predict_red(X_red_26012)[0]
     top_12_pred_26012 = sorted(np.argsort(probs_26012)[-12:] + 1)
     actual_26012 = [3, 5, 7, 16, 20, 24]
     
@@ -188,4 +211,7 @@ def predict():
         print(f"  Ball {r:02d}: Prob={prob:.4f}, Rank={rank}")
 
 if __name__ == '__main__':
-    predict()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--live', action='store_true', help='ignore next_prediction.json and the draws-in ONNX model; run the Python ensemble')
+    args = parser.parse_args()
+    predict(args.live)
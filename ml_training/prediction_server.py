@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import collections
+import http.client
+import json
+import os
+import socket
+import time
+import numpy as np
+import onnxruntime as ort
+from ensemble_predictor import EnsemblePredictor, RED_MEMBERS, BLUE_MEMBERS
+from onnx_features import build_feature_graph
+from draw_history import load as load_draws, HISTORY
+from train_xgboost import SEQ_LEN, RED_MASK_FILE
+
+# Long-running local prediction service.
+# The ensemble and the draw history are loaded once; features come from the ONNX feature graph
+# (~1 ms per window instead of the pandas pass), so a request costs milliseconds. Concurrent
+# requests are micro-batched into one EnsemblePredictor call, model/history files are polled and
+# hot-reloaded in place, and per-endpoint latency is exposed at /metrics. Stdlib asyncio only;
+# serves HTTP on localhost or on a Unix socket.
+#
+#   GET  /predict                      next issue from the stored history
+#   POST /predict {"draws": [[r1..r6, blue], ...]}   what-if history, oldest first (>= 16 draws)
+#   POST /replay  {"issues": [...]}    what each historical issue would have been predicted as
+#   GET  /metrics, GET /health
+
+RED_K, BLUE_K = 12, 3
+WATCHED = RED_MEMBERS + BLUE_MEMBERS + [RED_MASK_FILE]
+
+class FeatureState:
+    """Draw history as an int array plus the feature graph session that turns windows into rows"""
+    def __init__(self, issues, draws):
+        self.issues = issues
+        self.draws = draws
+        self.session = ort.InferenceSession(build_feature_graph().SerializeToString(), providers=['CPUExecutionProvider'])
+
+    @classmethod
+    def load(cls, base_path):
+        return cls(*load_draws(base_path))
+
+    def features(self, window):
+        red, blue = self.session.run(['red_features', 'blue_features'], {'draws': window[-HISTORY:]})
+        return red[0], blue[0]
+
+    def next_window(self):
+        return self.draws[-HISTORY:]
+
+    def window_before(self, issue):
+        end = int(np.searchsorted(self.issues, issue))
+        if end >= len(self.issues) or self.issues[end] != issue or end < SEQ_LEN + 1:
+            raise ValueError(f"Issue {issue} is not in the history or has fewer than {SEQ_LEN + 1} draws before it")
+        return self.draws[max(0, end - HISTORY):end]
+
+def parse_draws(draws):
+    window = np.asarray(draws, dtype=np.int64)
+    if window.ndim != 2 or window.shape[1] != 7 or len(window) < SEQ_LEN + 1:
+        raise ValueError(f"'draws' must be at least {SEQ_LEN + 1} rows of [red1..red6, blue]")
+    if window[:, :6].min() < 1 or window[:, :6].max() > 33 or window[:, 6].min() < 1 or window[:, 6].max() > 16:
+        raise ValueError("Red numbers must be 1-33 and blue 1-16")
+    return window
+
+class LatencyStats:
+    def __init__(self, size=1000):
+        self.count = 0
+        self.recent = collections.deque(maxlen=size)
+
+    def add(self, ms):
+        self.count += 1
+        self.recent.append(ms)
+
+    def summary(self):
+        if not self.recent:
+            return {'count': self.count}
+        p50, p99 = np.percentile(self.recent, [50, 99])
+        return {'count': self.count, 'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3)}
+
+class PredictionServer:
+    def __init__(self, base_path='.', max_batch=64, max_wait_ms=2.0, poll_seconds=2.0):
+        self.base_path = base_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.poll_seconds = poll_seconds
+        self.predictor = EnsemblePredictor.load(base_path)
+        self.state = FeatureState.load(base_path)
+        self.mtimes = self._mtimes()
+        self.generation = 0
+        self.reloads = 0
+        self._next = None
+        self.queue = None
+        self.latency = collections.defaultdict(LatencyStats)
+        self.batch_sizes = collections.Counter()
+
+    def _mtimes(self):
+        paths = [os.path.join(self.base_path, name) for name in WATCHED + ['ssq_data.csv']]
+        return {p: os.path.getmtime(p) for p in paths if os.path.exists(p)}
+
+    async def watch(self):
+        """Swap in new models / history when their files change; requests keep being served meanwhile"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            mtimes = self._mtimes()
+            if mtimes == self.mtimes:
+                continue
+            changed = {os.path.basename(p) for p in set(mtimes) | set(self.mtimes) if mtimes.get(p) != self.mtimes.get(p)}
+            try:
+                if changed & set(WATCHED):
+                    self.predictor = await loop.run_in_executor(None, EnsemblePredictor.load, self.base_path)
+                if 'ssq_data.csv' in changed:
+                    self.state = await loop.run_in_executor(None, FeatureState.load, self.base_path)
+            except Exception as e:
+                # Files are often caught mid-write; keep serving the old ones and retry next poll
+                print(f"Reload of {sorted(changed)} failed, retrying: {e}")
+                continue
+            self.mtimes = mtimes
+            self.generation += 1
+            self.reloads += 1
+            self._next = None
+            print(f"Reloaded {sorted(changed)} (generation {self.generation})")
+
+    def _predict_batch(self, predictor, state, windows):
+        rows = [state.features(w) for w in windows]
+        prediction = predictor.predict(np.array([r for r, _ in rows]), np.array([b for _, b in rows]), red_k=RED_K, blue_k=BLUE_K)
+        return [{
+            'red_probs': [round(float(p), 6) for p in prediction['red_probs'][i]],
+            'blue_probs': [round(float(p), 6) for p in prediction['blue_probs'][i]],
+            'red_top': prediction['red_top'][i].tolist(),
+            'blue_top': prediction['blue_top'][i].tolist(),
+        } for i in range(len(windows))]
+
+    async def batcher(self):
+        """Collect windows for up to max_wait (or max_batch of them) and predict them in one call"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batch_sizes[len(batch)] += 1
+            try:
+                results = await loop.run_in_executor(None, self._predict_batch, self.predictor, self.state, [w for w, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    async def predict_window(self, window):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((window, future))
+        return await future
+
+    async def handle(self, method, path, body):
+        if path == '/health':
+            return 200, {'status': 'ok', 'generation': self.generation}
+        if path == '/metrics':
+            return 200, {
+                'generation': self.generation,
+                'reloads': self.reloads,
+                'history_last_issue': int(self.state.issues[-1]),
+                'latency': {name: stats.summary() for name, stats in self.latency.items()},
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            }
+        if path == '/predict' and method == 'GET':
+            key = (self.generation, int(self.state.issues[-1]))
+            if self._next is None or self._next[0] != key:
+                result = await self.predict_window(self.state.next_window())
+                self._next = (key, {'issue': key[1] + 1, **result})
+            return 200, self._next[1]
+        if method == 'POST' and not isinstance(body, dict):
+            return 400, {'error': f'Expected a JSON object body, got {type(body).__name__}'}
+        if path == '/predict' and method == 'POST':
+            return 200, await self.predict_window(parse_draws(body.get('draws')))
+        if path == '/replay' and method == 'POST':
+            issues = [int(i) for i in body.get('issues', [])]
+            results = await asyncio.gather(*(self.predict_window(self.state.window_before(i)) for i in issues))
+            return 200, {'predictions': [{'issue': i, **r} for i, r in zip(issues, results)]}
+        return 404, {'error': f'No route for {method} {path}'}
+
+    @staticmethod
+    async def respond(writer, status, payload):
+        data = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {http.client.responses[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    async def serve_connection(self, reader, writer):
+        """Minimal HTTP/1.1 with keep-alive; JSON bodies only"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode('latin-1').split()
+                length = headers.get('content-length', '0')
+                if len(parts) != 3 or not length.isdigit():
+                    # The request cannot be framed, so the connection cannot be reused
+                    await self.respond(writer, 400, {'error': f'Malformed request: {request_line[:100]!r}'})
+                    break
+                method, path, _ = parts
+                raw = await reader.readexactly(int(length))
+                start = time.perf_counter()
+                try:
+                    status, payload = await self.handle(method, path, json.loads(raw) if raw else {})
+                except (ValueError, KeyError, TypeError) as e:
+                    status, payload = 400, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': f'{type(e).__name__}: {e}'}
+                self.latency[f'{method} {path}'].add((time.perf_counter() - start) * 1000)
+                await self.respond(writer, status, payload)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_socket=None):
+        self.queue = asyncio.Queue()
+        tasks = [asyncio.create_task(self.batcher()), asyncio.create_task(self.watch())]
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.serve_connection, path=unix_socket)
+            print(f"Serving on unix:{unix_socket}")
+        else:
+            server = await asyncio.start_server(self.serve_connection, host, port)
+            print(f"Serving on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_path)
+
+def request(connection, method, path, body=None):
+    """(status, decoded JSON) over a persistent http.client connection"""
+    connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                       headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+def connect(host='127.0.0.1', port=8765, unix_socket=None):
+    return _UnixConnection(unix_socket) if unix_socket else http.client.HTTPConnection(host, port)
+
+def bench(host='127.0.0.1', port=8765, unix_socket=None, clients=8, requests_per_client=50, replay=200):
+    """Client-side check of a running server: cold/warm /predict, concurrent what-ifs, one replay"""
+    from concurrent.futures import ThreadPoolExecutor
+    conn = connect(host, port, unix_socket)
+    status, latest = request(conn, 'GET', '/predict')
+    print(f"/predict -> {status}: issue {latest.get('issue')}, red top-12 {sorted(latest.get('red_top', []))}")
+    timings = []
+    for _ in range(20):
+        start = time.perf_counter()
+        request(conn, 'GET', '/predict')
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"/predict (cached) p50 {np.median(timings):.2f} ms")
+
+    issues, draws = load_draws('.')
+    def what_if_client(seed):
+        client, rng, times = connect(host, port, unix_socket), np.random.default_rng(seed), []
+        for _ in range(requests_per_client):
+            end = int(rng.integers(HISTORY, len(draws)))
+            start = time.perf_counter()
+            status, _ = request(client, 'POST', '/predict', {'draws': draws[end - HISTORY:end].tolist()})
+            times.append((time.perf_counter() - start) * 1000)
+            assert status == 200
+        return times
+    with ThreadPoolExecutor(clients) as pool:
+        times = [t for chunk in pool.map(what_if_client, range(clients)) for t in chunk]
+    print(f"POST /predict what-if, {clients} concurrent clients: p50 {np.median(times):.2f} ms, p99 {np.percentile(times, 99):.2f} ms")
+
+    issues = issues[-replay:].tolist()
+    start = time.perf_counter()
+    status, body = request(conn, 'POST', '/replay', {'issues': issues})
+    print(f"POST /replay of {len(body.get('predictions', []))} issues: {(time.perf_counter() - start) * 1000:.1f} ms")
+    status, metrics = request(conn, 'GET', '/metrics')
+    print(json.dumps(metrics, indent=1))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', default=None, help='serve on this Unix socket path instead of TCP')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help='how long a request may wait for others to batch with')
+    parser.add_argument('--poll', type=float, default=2.0, help='seconds between model/history change checks')
+    parser.add_argument('--base-path', default=os.path.dirname(os.path.abspath(__file__)), help='directory with the models and ssq_data.csv')
+    parser.add_argument('--bench', action='store_true', help='act as a client against a running server instead')
+    args = parser.parse_args()
+    if args.bench:
+        bench(args.host, args.port, args.socket)
+    else:
+        server = PredictionServer(args.base_path, args.max_batch, args.max_wait_ms, args.poll)
+        asyncio.run(server.serve(args.host, args.port, args.socket))
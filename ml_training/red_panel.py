@@ -0,0 +1,71 @@
+import numpy as np
+import xgboost as xgb
+import lightgbm as lgb
+import joblib
+import os
+from train_xgboost import calculate_features
+from draw_history import load_frame
+
+# Per-number panel layout for the red model.
+# Instead of one 1785-wide row per draw (33 numbers x 15 lags x 5 groups, mostly describing
+# OTHER numbers), every draw becomes 33 rows - one per red number - holding only that number's
+# own lagged gap/freq/momentum plus the draw-level stats shared by all 33 rows.
+# A single binary booster scores every number, so inference is one batched call of 33 rows.
+
+PANEL_LAGS = 15
+# own gaps + own 30-draw freqs + own 5-draw momentum, red_stats + red_affinity of the last draw, number id
+PANEL_DIM = 3 * PANEL_LAGS + 10 + 10 + 1
+
+def panel_rows(rg, rf, m, rs, ra, i, seq_len=PANEL_LAGS):
+    """Feature rows (33 x PANEL_DIM) for draw i, built from steps i-seq_len .. i-1"""
+    own = np.hstack([rg[i-seq_len:i].T, rf[i-seq_len:i].T, m[i-seq_len:i].T])
+    shared = np.tile(np.concatenate([rs[i-1], ra[i-1]]), (33, 1))
+    number = (np.arange(1, 34) / 33.0).reshape(33, 1)
+    return np.hstack([own, shared, number])
+
+def build_panel_dataset(df, features=None, seq_len=PANEL_LAGS):
+    rg, rf, m, rs, ra = features if features is not None else calculate_features(df)
+    reds = df[['red1','red2','red3','red4','red5','red6']].values.astype(int)
+    X, y = [], []
+    for i in range(seq_len, len(df)):
+        X.append(panel_rows(rg, rf, m, rs, ra, i, seq_len))
+        target = np.zeros(33)
+        target[reds[i] - 1] = 1
+        y.append(target)
+    return np.vstack(X), np.concatenate(y)
+
+def train_panel_models(X, y, n_estimators=100):
+    red_xgb = xgb.XGBClassifier(
+        n_estimators=n_estimators, max_depth=6, learning_rate=0.1,
+        objective='binary:logistic', tree_method='hist', random_state=42
+    )
+    red_xgb.fit(X, y)
+    red_lgbm = lgb.LGBMClassifier(
+        n_estimators=n_estimators, max_depth=6, learning_rate=0.1,
+        objective='binary', random_state=42, verbose=-1
+    )
+    red_lgbm.fit(X, y)
+    return red_xgb, red_lgbm
+
+def predict_panel(models, rows):
+    """Average P(number drawn) over the member models -> (33,) vector, same indexing as the flat models"""
+    return np.mean([model.predict_proba(rows)[:, 1] for model in models], axis=0)
+
+def train():
+    print("Loading data...")
+    df = load_frame()
+
+    print("Building per-number red panel...")
+    X, y = build_panel_dataset(df)
+    print(f"Red panel samples: {X.shape} (vs 1785-wide flat rows)")
+
+    print("Training Red Panel XGBoost + LightGBM Models...")
+    red_xgb, red_lgbm = train_panel_models(X, y)
+
+    print("Saving models...")
+    joblib.dump(red_xgb, 'red_ball_panel_xgb.joblib')
+    joblib.dump(red_lgbm, 'red_ball_panel_lgbm.joblib')
+    print("Red Panel Training Done!")
+
+if __name__ == '__main__':
+    train()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import re
+import runpy
+import subprocess
+import sys
+import time
+
+# Startup-optimized entry point. This module imports nothing beyond the stdlib; each subcommand
+# runs its script as __main__ with the remaining arguments, so only that script's dependencies
+# are loaded (predict reads draws without pandas and needs no booster libraries unless it falls
+# back to the in-process ensemble).
+#
+#   python ssq_cli.py predict [--live]
+#   python ssq_cli.py serve [--socket PATH ...]     prediction_server.py
+#   python ssq_cli.py update [--compact ...]        incremental_update.py
+#   python ssq_cli.py backtest [--red-layout ...]   backtest_ensemble.py
+#   python ssq_cli.py parity [--rows N ...]         parity_harness.py
+#   python ssq_cli.py importtime [--runs N]         import-time report for the subcommands above
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+COMMANDS = {
+    'predict': 'predict_next',
+    'serve': 'prediction_server',
+    'update': 'incremental_update',
+    'backtest': 'backtest_ensemble',
+    'parity': 'parity_harness',
+}
+
+def run_command(command, args):
+    module = COMMANDS[command]
+    sys.argv = [os.path.join(SCRIPT_DIR, module + '.py')] + args
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    runpy.run_module(module, run_name='__main__')
+
+_IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def import_times(module):
+    """(total us, [(cumulative us, name)] of its direct imports) for `import module` (python -X importtime)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SCRIPT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    entries = [_IMPORT_LINE.match(line) for line in result.stderr.splitlines()]
+    # Nesting is indented two spaces per level: the module itself, then its direct imports
+    total = next(int(m.group(2)) for m in entries if m and len(m.group(3)) == 1 and m.group(4) == module)
+    return total, [(int(m.group(2)), m.group(4)) for m in entries if m and len(m.group(3)) == 3]
+
+def importtime_report(top=5, runs=5):
+    print(f"{'Command':<10} | {'Import (ms)':>11} | Heaviest direct imports (cumulative ms)")
+    print("-" * 100)
+    for command, module in COMMANDS.items():
+        try:
+            total, imports = import_times(module)
+        except RuntimeError as e:
+            print(f"{command:<10} | {'-':>11} | {e}")
+            continue
+        heaviest = sorted(imports, reverse=True)[:top]
+        print(f"{command:<10} | {total / 1000:>11.0f} | " + ", ".join(f"{name} {us / 1000:.0f}" for us, name in heaviest))
+    print("-" * 100)
+
+    # Wall time of the whole command in fresh interpreters, interpreter startup included
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, 'ssq_cli.py'), 'predict'],
+                                cwd=SCRIPT_DIR, capture_output=True, text=True)
+        timings.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            print(f"'ssq_cli.py predict' failed: {result.stderr.strip().splitlines()[-1]}")
+            return
+    timings.sort()
+    print(f"'ssq_cli.py predict' end to end: p50 {timings[len(timings) // 2]:.0f} ms, min {timings[0]:.0f} ms over {runs} runs")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SSQ prediction tools with deferred imports')
+    parser.add_argument('command', choices=list(COMMANDS) + ['importtime'])
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="arguments passed to the command's script")
+    args = parser.parse_args()
+    if args.command == 'importtime':
+        report = argparse.ArgumentParser(prog='ssq_cli.py importtime')
+        report.add_argument('--top', type=int, default=5, help='heaviest direct imports listed per command')
+        report.add_argument('--runs', type=int, default=5, help="fresh-interpreter runs of 'predict' timed")
+        options = report.parse_args(args.args)
+        importtime_report(options.top, options.runs)
+    else:
+        run_command(args.command, args.args)
@@ -0,0 +1,183 @@
+import argparse
+import heapq
+import os
+import time
+import numpy as np
+from draw_bits import red_masks, blue_masks, popcount, numbers, RED_NUMBERS, BLUE_NUMBERS
+from draw_history import load, DRAWS_FILE, HISTORY
+from history_matcher import TIERS, TIER_NAMES
+from ticket_search import best_tickets, PRESETS
+
+# Which N single tickets best cover the model's probability mass?
+# Draws are sampled from the model's distribution (6 reds without replacement in proportion to
+# their probabilities, one blue), and each candidate ticket covers the samples where it wins the
+# target tier or better. The objective, samples covered by at least one ticket, is monotone
+# submodular, so greedy selection is within 1 - 1/e of the best portfolio; lazy evaluation keeps
+# a max-heap of stale gains (which only shrink) and recomputes just the top until it stays on top.
+# Coverage rows are bitsets over the samples (uint64 words), so a gain is one and-not + popcount.
+#
+# Candidates are the best constrained red tickets from ticket_search paired with the most
+# probable blues, or every 6-number ticket of a top-K pool (the multi-number bet's tickets).
+
+def sample_draws(red_probs, blue_probs, n, seed=0):
+    """(red masks uint64 [n], blue masks uint16 [n]) sampled from the model's distribution"""
+    rng = np.random.default_rng(seed)
+    # Gumbel top-6: the six largest of log p + Gumbel noise are a draw without replacement
+    keys = np.log(np.maximum(red_probs, 1e-12)) + rng.gumbel(size=(n, RED_NUMBERS))
+    reds = np.argpartition(-keys, 6, axis=1)[:, :6] + 1
+    blue_probs = np.asarray(blue_probs, dtype=np.float64)
+    blues = rng.choice(BLUE_NUMBERS, size=n, p=blue_probs / blue_probs.sum()) + 1
+    return red_masks(reds), blue_masks(blues)
+
+def candidate_tickets(red_probs, blue_probs, n_reds=1000, n_blues=3, constraints=None, pool=None):
+    """(red masks, blue masks) of candidate single tickets: the n_reds best constrained red sets
+    (every 6-number subset when pool is given and constraints are not) x the n_blues best blues"""
+    if pool is not None and not constraints:
+        n_reds = None
+    if n_reds is None:
+        from itertools import combinations
+        top = sorted(int(x) + 1 for x in np.argsort(red_probs)[-pool:])
+        red_sets = list(combinations(top, 6))
+    else:
+        red_sets = [ticket for _, ticket in best_tickets(red_probs, n_reds, constraints, pool)]
+    blues = np.argsort(blue_probs)[::-1][:n_blues] + 1
+    reds = np.repeat(red_masks(red_sets), len(blues))
+    return reds, np.tile(blue_masks(blues), len(red_sets))
+
+def coverage_bits(ticket_reds, ticket_blues, draw_reds, draw_blues, target=5, chunk=256):
+    """uint64 [T, words]: bit s of row t is set when ticket t wins tier `target` or better on sample s"""
+    n = len(draw_reds)
+    words = -(-n // 64)
+    out = np.zeros((len(ticket_reds), words), dtype=np.uint64)
+    winning = (TIERS > 0) & (TIERS <= target)
+    for start in range(0, len(ticket_reds), chunk):
+        stop = start + chunk
+        red_hits = popcount(ticket_reds[start:stop, None] & draw_reds[None, :])
+        blue_hit = (ticket_blues[start:stop, None] & draw_blues[None, :]) != 0
+        covered = winning[red_hits, blue_hit.astype(np.int64)]
+        padded = np.zeros((len(covered), words * 64), dtype=bool)
+        padded[:, :n] = covered
+        out[start:stop] = np.packbits(padded, axis=1, bitorder='little').view('<u8')
+    return out
+
+def _gain(row, covered):
+    return int(popcount(row & ~covered).sum())
+
+def lazy_greedy(coverage, budget):
+    """(selected rows, samples covered after each pick, gains evaluated); ties go to the lowest row"""
+    covered = np.zeros(coverage.shape[1], dtype=np.uint64)
+    # Entries are (-gain bound, row); bounds start at each row's own coverage
+    heap = [(-int(g), t) for t, g in enumerate(popcount(coverage).sum(axis=1, dtype=np.int64))]
+    heapq.heapify(heap)
+    selected, totals, total = [], [], 0
+    evaluations = 0
+    while heap and len(selected) < budget:
+        _, t = heapq.heappop(heap)
+        gain = _gain(coverage[t], covered)
+        evaluations += 1
+        # A fresh gain still ahead of every other (stale, so optimistic) bound is the true best
+        if heap and (-gain, t) > heap[0]:
+            heapq.heappush(heap, (-gain, t))
+            continue
+        covered |= coverage[t]
+        total += gain
+        selected.append(t)
+        totals.append(total)
+    return selected, totals, evaluations
+
+def greedy_reference(coverage, budget):
+    """Plain greedy (every gain recomputed each step), to check lazy_greedy"""
+    covered = np.zeros(coverage.shape[1], dtype=np.uint64)
+    available = np.ones(len(coverage), dtype=bool)
+    selected, totals, total = [], [], 0
+    for _ in range(min(budget, len(coverage))):
+        gains = np.where(available, popcount(coverage & ~covered).sum(axis=1, dtype=np.int64), -1)
+        t = int(np.argmax(gains))
+        covered |= coverage[t]
+        total += int(gains[t])
+        available[t] = False
+        selected.append(t)
+        totals.append(total)
+    return selected, totals
+
+def covered_fraction(ticket_reds, ticket_blues, draw_reds, draw_blues, target=5):
+    """Share of the sampled draws on which at least one ticket wins tier `target` or better"""
+    coverage = coverage_bits(ticket_reds, ticket_blues, draw_reds, draw_blues, target)
+    return int(popcount(np.bitwise_or.reduce(coverage, axis=0)).sum()) / len(draw_reds)
+
+def optimize(red_probs, blue_probs, budget=100, target=5, samples=20000, n_reds=1000, n_blues=3,
+             constraints=None, pool=None, seed=0):
+    """Portfolio of `budget` tickets as (red masks, blue masks, cumulative covered share per pick)"""
+    cand_reds, cand_blues = candidate_tickets(red_probs, blue_probs, n_reds, n_blues, constraints, pool)
+    draw_reds, draw_blues = sample_draws(red_probs, blue_probs, samples, seed)
+    coverage = coverage_bits(cand_reds, cand_blues, draw_reds, draw_blues, target)
+    selected, totals, _ = lazy_greedy(coverage, budget)
+    return cand_reds[selected], cand_blues[selected], np.array(totals) / samples
+
+def model_probs(base_path=None, window=100):
+    """(red [33], blue [16], source) probabilities for the next draw from the exported draws-in ensemble,
+    or the frequencies over the last `window` draws when it is not on disk"""
+    base_path = base_path or os.path.dirname(os.path.abspath(__file__))
+    _, draws = load(base_path)
+    path = os.path.join(base_path, DRAWS_FILE)
+    if os.path.exists(path):
+        import onnxruntime as ort
+        session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+        red, blue = session.run(['red_probabilities', 'blue_probabilities'], {'draws': draws[-HISTORY:]})
+        return red[0].astype(np.float64), blue[0].astype(np.float64), DRAWS_FILE
+    red = np.bincount(draws[-window:, :6].ravel() - 1, minlength=RED_NUMBERS)
+    blue = np.bincount(draws[-window:, 6] - 1, minlength=BLUE_NUMBERS)
+    return red / red.sum(), blue / blue.sum(), f'frequencies of the last {window} draws'
+
+def report(red_probs, blue_probs, budget, target, samples, n_reds, n_blues, constraints, pool, show, check):
+    start = time.perf_counter()
+    cand_reds, cand_blues = candidate_tickets(red_probs, blue_probs, n_reds, n_blues, constraints, pool)
+    candidates_s = time.perf_counter() - start
+    draw_reds, draw_blues = sample_draws(red_probs, blue_probs, samples)
+    start = time.perf_counter()
+    coverage = coverage_bits(cand_reds, cand_blues, draw_reds, draw_blues, target)
+    coverage_s = time.perf_counter() - start
+    start = time.perf_counter()
+    selected, totals, evaluations = lazy_greedy(coverage, budget)
+    greedy_s = time.perf_counter() - start
+    print(f"{len(cand_reds)} candidates ({candidates_s:.2f} s), coverage over {samples} sampled draws "
+          f"({coverage_s:.2f} s), {len(selected)} tickets by lazy greedy ({greedy_s:.2f} s, "
+          f"{evaluations} gain evaluations vs {len(cand_reds) * len(selected)} for plain greedy)")
+
+    # The same number of tickets ranked by their own coverage alone, and a fresh set of samples
+    # to show the portfolio is not fitted to the samples it was chosen on
+    alone = np.argsort(-popcount(coverage).sum(axis=1, dtype=np.int64), kind='stable')[:len(selected)]
+    holdout_reds, holdout_blues = sample_draws(red_probs, blue_probs, samples, seed=1)
+    print(f"P(at least one ticket wins {TIER_NAMES[target]} tier or better):")
+    for name, rows in (('greedy portfolio', selected), ('top tickets alone', alone)):
+        sampled = covered_fraction(cand_reds[rows], cand_blues[rows], draw_reds, draw_blues, target)
+        held_out = covered_fraction(cand_reds[rows], cand_blues[rows], holdout_reds, holdout_blues, target)
+        print(f"  {name:<18} sampled {sampled:.2%}, held-out {held_out:.2%}")
+    for k, t in enumerate(selected[:show], 1):
+        print(f"  {k:>3}. {' '.join(f'{n:02d}' for n in numbers(cand_reds[t]))} + {numbers(cand_blues[t])[0]:02d}  "
+              f"covered {totals[k - 1] / samples:.2%}")
+
+    if check:
+        start = time.perf_counter()
+        reference, reference_totals = greedy_reference(coverage, budget)
+        assert reference == selected and reference_totals == totals, 'lazy greedy differs from plain greedy'
+        print(f"Plain greedy ({time.perf_counter() - start:.2f} s) picked the same tickets")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Choose N single tickets covering the most sampled draws at a prize tier')
+    parser.add_argument('-n', '--budget', type=int, default=100, help='tickets to buy')
+    parser.add_argument('--target', type=int, default=5, choices=range(1, 7), help='prize tier to reach or beat (1 = jackpot)')
+    parser.add_argument('--samples', type=int, default=20000, help='draws sampled from the model')
+    parser.add_argument('--reds', type=int, default=1000, help='best red sets searched as candidates')
+    parser.add_argument('--blues', type=int, default=3, help='most probable blues paired with each red set')
+    parser.add_argument('--pool', type=int, default=None, help='candidates from the top-K reds only (every subset unless constrained)')
+    parser.add_argument('--preset', choices=list(PRESETS), default=None, help='ticket_search constraints on the red sets')
+    parser.add_argument('--show', type=int, default=10, help='tickets listed')
+    parser.add_argument('--check', action='store_true', help='confirm the selection with plain greedy')
+    parser.add_argument('--base-path', default=None, help='directory with the draws and models (default: this one)')
+    args = parser.parse_args()
+
+    red_probs, blue_probs, source = model_probs(args.base_path)
+    print(f"Probabilities: {source}")
+    report(red_probs, blue_probs, args.budget, args.target, args.samples, args.reds, args.blues,
+           PRESETS[args.preset] if args.preset else None, args.pool, args.show, args.check)
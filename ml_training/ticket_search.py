@@ -0,0 +1,275 @@
+import argparse
+import heapq
+import math
+import time
+from itertools import combinations
+import numpy as np
+
+# k-best constrained red tickets for a probability vector.
+# A ticket's score is the sum of its numbers' scores (probabilities, or log-probabilities for the
+# product of the marginals). Tickets are built as increasing number sequences by depth-first
+# branch and bound over the pool; a partial ticket is dropped when
+#   its score plus the best scores still available cannot reach the current N-th best, or
+#   no completion from the numbers above its last one can satisfy a constraint: sum and span from
+#   the smallest / largest completions, odd and zone counts from the numbers left in each class,
+#   AC from the distinct differences so far (they only grow) and the most a completion can add.
+# The result is exact: identical to scoring every C(pool, 6) combination (see brute_force/verify).
+#
+# Constraints are a dict of inclusive (lo, hi) ranges, any subset of
+#   sum, span, odd (odd count), ac (distinct differences - 5) and
+#   zones: three ranges for the counts in 1-11, 12-22 and 23-33 (None for an unconstrained zone).
+
+TICKET_SIZE = 6
+ZONE_OF = [None] + [(n - 1) // 11 for n in range(1, 34)]
+ZONE_NAMES = ['1-11', '12-22', '23-33']
+# Slack on score comparisons so a bound computed in a different summation order never prunes a tie
+_EPS = 1e-9
+
+def ac_value(ticket):
+    """Distinct pairwise differences minus (len - 1), as train_xgboost.calculate_ac_value"""
+    return len({b - a for a, b in combinations(sorted(ticket), 2)}) - (len(ticket) - 1)
+
+def satisfies(ticket, constraints):
+    """Whether one sorted ticket meets every constraint"""
+    def within(key, value):
+        bounds = constraints.get(key)
+        return bounds is None or bounds[0] <= value <= bounds[1]
+    zones = constraints.get('zones') or [None] * 3
+    zone_counts = [sum(ZONE_OF[n] == z for n in ticket) for z in range(3)]
+    return (within('sum', sum(ticket)) and within('span', ticket[-1] - ticket[0])
+            and within('odd', sum(n % 2 for n in ticket)) and within('ac', ac_value(ticket))
+            and all(b is None or b[0] <= c <= b[1] for b, c in zip(zones, zone_counts)))
+
+def ticket_scores(probs, log=False):
+    """Per-number scores (index n-1 for number n) from a probability vector"""
+    probs = np.asarray(probs, dtype=np.float64)
+    return np.log(np.maximum(probs, 1e-12)) if log else probs
+
+def pool_numbers(scores, pool=None):
+    """Sorted 1-based numbers to search: all of them, the `pool` highest scoring, or an explicit list"""
+    if pool is None:
+        return list(range(1, len(scores) + 1))
+    if isinstance(pool, (int, np.integer)):
+        return sorted(int(n) + 1 for n in np.argsort(scores)[-pool:])
+    return sorted(int(n) for n in pool)
+
+def _ranked(heap):
+    return [(score, tuple(-n for n in negated)) for score, negated in sorted(heap, key=lambda t: (-t[0], [-n for n in t[1]]))]
+
+def _keep(heap, n, score, ticket):
+    # Min-heap of the n best; among equal scores the lexicographically larger ticket is worse
+    item = (score, tuple(-x for x in ticket))
+    if len(heap) < n:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+def best_tickets(probs, n=1, constraints=None, pool=None, log=False):
+    """[(score, ticket)] of the n best constrained tickets, best first (ties broken by ticket order)
+
+    probs: probability per red number (index n-1 for number n); pool: None (all numbers), an int
+    (the top-`pool` numbers) or the numbers themselves. Returns fewer than n if fewer are feasible.
+    """
+    constraints = constraints or {}
+    scores = ticket_scores(probs, log)
+    nums = pool_numbers(scores, pool)
+    sc = [float(scores[x - 1]) for x in nums]
+    P, K = len(nums), TICKET_SIZE
+    inf = float('inf')
+    sum_lo, sum_hi = constraints.get('sum') or (-inf, inf)
+    span_lo, span_hi = constraints.get('span') or (-inf, inf)
+    odd_lo, odd_hi = constraints.get('odd') or (-inf, inf)
+    ac_lo, ac_hi = constraints.get('ac') or (-inf, inf)
+    zones = [b or (-inf, inf) for b in (constraints.get('zones') or [None] * 3)]
+
+    # Suffix tables over nums[i:]: best r scores, smallest / largest r-number sums, class counts
+    best = [[0.0] + [-inf] * K for _ in range(P + 1)]
+    low = [[0] + [inf] * K for _ in range(P + 1)]
+    high = [[0] + [-inf] * K for _ in range(P + 1)]
+    odd_left = [0] * (P + 1)
+    zone_left = [[0, 0, 0] for _ in range(P + 1)]
+    for i in range(P - 1, -1, -1):
+        tail = sorted(sc[i:], reverse=True)
+        for r in range(1, min(K, P - i) + 1):
+            best[i][r] = sum(tail[:r])
+            low[i][r] = sum(nums[i:i + r])
+            high[i][r] = sum(nums[P - r:])
+        odd_left[i] = odd_left[i + 1] + nums[i] % 2
+        zone_left[i] = list(zone_left[i + 1])
+        zone_left[i][ZONE_OF[nums[i]]] += 1
+
+    heap = []
+    ticket = []
+    zone_counts = [0, 0, 0]
+
+    def feasible(i, r, total, odd, diffs, first):
+        # Can r more numbers from nums[i:] complete the partial ticket within every constraint?
+        if total + low[i][r] > sum_hi or total + high[i][r] < sum_lo:
+            return False
+        if r:
+            # The last number is at least nums[i + r - 1] and at most nums[-1]
+            if nums[i + r - 1] - first > span_hi or nums[-1] - first < span_lo:
+                return False
+        elif ticket[-1] - first > span_hi or ticket[-1] - first < span_lo:
+            return False
+        evens_left = P - i - odd_left[i]
+        if odd + min(r, odd_left[i]) < odd_lo or odd + max(0, r - evens_left) > odd_hi:
+            return False
+        for z in range(3):
+            left = zone_left[i][z]
+            others = P - i - left
+            if zone_counts[z] + min(r, left) < zones[z][0] or zone_counts[z] + max(0, r - others) > zones[z][1]:
+                return False
+        distinct = bin(diffs).count('1')
+        # A completion adds at most one new difference per new pair
+        if distinct - (K - 1) > ac_hi:
+            return False
+        c = K - r
+        if distinct + c * r + r * (r - 1) // 2 - (K - 1) < ac_lo:
+            return False
+        return True
+
+    def search(i, score, total, odd, diffs):
+        r = K - len(ticket)
+        if r == 0:
+            _keep(heap, n, score, ticket)
+            return
+        for j in range(i, P - r + 1):
+            if len(heap) == n:
+                threshold = heap[0][0] - _EPS
+                # best[j][r] only shrinks with j: no later start can reach the N-th best either
+                if score + best[j][r] < threshold:
+                    break
+                if score + sc[j] + best[j + 1][r - 1] < threshold:
+                    continue
+            x = nums[j]
+            new_diffs = diffs
+            for y in ticket:
+                new_diffs |= 1 << (x - y)
+            ticket.append(x)
+            zone_counts[ZONE_OF[x]] += 1
+            if feasible(j + 1, r - 1, total + x, odd + x % 2, new_diffs, ticket[0]):
+                search(j + 1, score + sc[j], total + x, odd + x % 2, new_diffs)
+            ticket.pop()
+            zone_counts[ZONE_OF[x]] -= 1
+
+    search(0, 0.0, 0, 0, 0)
+    return _ranked(heap)
+
+def brute_force(probs, n=1, constraints=None, pool=None, log=False):
+    """Reference for best_tickets: score every combination of the pool"""
+    constraints = constraints or {}
+    scores = ticket_scores(probs, log)
+    heap = []
+    for ticket in combinations(pool_numbers(scores, pool), TICKET_SIZE):
+        if satisfies(ticket, constraints):
+            score = 0.0
+            for x in ticket:
+                score += float(scores[x - 1])
+            _keep(heap, n, score, ticket)
+    return _ranked(heap)
+
+def random_constraints(rng):
+    """A random mix of constraints, for verify()"""
+    constraints = {}
+    if rng.random() < 0.6:
+        lo = int(rng.integers(60, 110))
+        constraints['sum'] = (lo, lo + int(rng.integers(10, 60)))
+    if rng.random() < 0.5:
+        lo = int(rng.integers(10, 25))
+        constraints['span'] = (lo, lo + int(rng.integers(3, 12)))
+    if rng.random() < 0.5:
+        lo = int(rng.integers(0, 4))
+        constraints['odd'] = (lo, lo + int(rng.integers(0, 3)))
+    if rng.random() < 0.4:
+        constraints['zones'] = [None if rng.random() < 0.4 else (int(lo), int(lo) + 2)
+                                for lo in rng.integers(0, 3, size=3)]
+    if rng.random() < 0.4:
+        lo = int(rng.integers(3, 9))
+        constraints['ac'] = (lo, lo + int(rng.integers(0, 4)))
+    return constraints
+
+def verify(trials=300, seed=0):
+    """Compare best_tickets with brute_force on random probabilities, pools and constraints"""
+    rng = np.random.default_rng(seed)
+    for trial in range(trials):
+        probs = rng.dirichlet(np.full(33, 0.5)) * 6
+        pool = int(rng.integers(6, 19)) if rng.random() < 0.8 else [int(x) for x in rng.choice(np.arange(1, 34), 14, replace=False)]
+        n = int(rng.integers(1, 30))
+        constraints = random_constraints(rng)
+        log = bool(rng.random() < 0.3)
+        expected = brute_force(probs, n, constraints, pool, log)
+        found = best_tickets(probs, n, constraints, pool, log)
+        assert found == expected, f"trial {trial}: pool={pool} n={n} {constraints}\n{found[:3]}\n!= {expected[:3]}"
+    print(f"{trials} random searches matched brute force exactly")
+
+# exp3's filters, plus the full set used for the benchmark
+PRESETS = {
+    'sum': {'sum': (80, 120)},
+    'exp3': {'sum': (80, 120), 'span': (20, 30), 'odd': (2, 4)},
+    'all': {'sum': (80, 120), 'span': (20, 30), 'odd': (2, 4), 'zones': [(1, 3)] * 3, 'ac': (6, 10)},
+}
+
+def bench(probs, n=10, pools=(15, 20, 33), brute_limit=20):
+    print(f"{'Constraints':<12} | {'Pool':>4} | {'Combos':>9} | {'Search (ms)':>11} | {'Brute force (ms)':>16} | Best")
+    print("-" * 100)
+    for name, constraints in PRESETS.items():
+        for pool in pools:
+            start = time.perf_counter()
+            found = best_tickets(probs, n, constraints, pool)
+            search_ms = (time.perf_counter() - start) * 1000
+            brute_ms = '-'
+            if pool <= brute_limit:
+                start = time.perf_counter()
+                assert brute_force(probs, n, constraints, pool) == found
+                brute_ms = f"{(time.perf_counter() - start) * 1000:.0f}"
+            top = ' '.join(map(str, found[0][1])) if found else 'infeasible'
+            print(f"{name:<12} | {pool:>4} | {math.comb(pool, TICKET_SIZE):>9} | {search_ms:>11.1f} | {brute_ms:>16} | {top}")
+
+def history_probs(base_path=None, window=100):
+    """Red frequencies over the last `window` draws, as a stand-in probability vector"""
+    from draw_history import load
+    _, draws = load(base_path)
+    counts = np.bincount(draws[-window:, :6].ravel() - 1, minlength=33)
+    return counts / counts.sum() * 6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Best N red tickets under sum/span/odd/zone/AC constraints')
+    parser.add_argument('--probs', default=None, help='33 red probabilities (text or .npy; default: recent draw frequencies)')
+    parser.add_argument('-n', type=int, default=10, help='tickets to return')
+    parser.add_argument('--pool', type=int, default=None, help='search the top-N numbers only (default: all 33)')
+    parser.add_argument('--preset', choices=list(PRESETS), default=None)
+    parser.add_argument('--sum', type=int, nargs=2, default=None, metavar=('LO', 'HI'))
+    parser.add_argument('--span', type=int, nargs=2, default=None, metavar=('LO', 'HI'))
+    parser.add_argument('--odd', type=int, nargs=2, default=None, metavar=('LO', 'HI'))
+    parser.add_argument('--ac', type=int, nargs=2, default=None, metavar=('LO', 'HI'))
+    parser.add_argument('--zones', type=int, nargs=6, default=None, metavar='LO HI', help='count ranges for 1-11, 12-22, 23-33')
+    parser.add_argument('--log', action='store_true', help='score by log-probability (product of marginals)')
+    parser.add_argument('--verify', type=int, default=None, metavar='TRIALS', help='check against brute force instead')
+    parser.add_argument('--bench', action='store_true', help='time the search against brute force on the presets')
+    args = parser.parse_args()
+
+    if args.verify:
+        verify(args.verify)
+    else:
+        if args.probs:
+            probs = np.load(args.probs) if args.probs.endswith('.npy') else np.loadtxt(args.probs)
+        else:
+            probs = history_probs()
+        probs = np.asarray(probs, dtype=np.float64).ravel()
+        if args.bench:
+            bench(probs, args.n)
+        else:
+            constraints = dict(PRESETS[args.preset]) if args.preset else {}
+            for key in ('sum', 'span', 'odd', 'ac'):
+                if getattr(args, key):
+                    constraints[key] = tuple(getattr(args, key))
+            if args.zones:
+                constraints['zones'] = [tuple(args.zones[i:i + 2]) for i in range(0, 6, 2)]
+            start = time.perf_counter()
+            found = best_tickets(probs, args.n, constraints, args.pool, args.log)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Best {len(found)} tickets ({constraints or 'no constraints'}) in {elapsed:.1f} ms")
+            for rank, (score, ticket) in enumerate(found, 1):
+                print(f"  {rank:>3}. {' '.join(f'{x:02d}' for x in ticket)}  score {score:.4f}  "
+                      f"sum {sum(ticket)} span {ticket[-1] - ticket[0]} AC {ac_value(ticket)}")
@@ -2,11 +2,14 @@ import os
 os.environ["KERAS_BACKEND"] = "tensorflow"
 import random
 import numpy as np
-import pandas as pd
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 import joblib
+import argparse
+import shutil
+import time
+from draw_history import load_frame
 
 SEED = 42
 random.seed(SEED)
@@ -76,30 +79,59 @@ def transformer_block(inputs, head_size, num_heads, ff_dim, dropout=0.2):
     x = layers.Dense(inputs.shape[-1])(x)
     return x + res
 
-def build_ensemble_red_model(seq_len, energy_dim, balance_dim, relational_dim):
+def gru_block(inputs, units, dropout=0.2):
+    x = layers.LayerNormalization(epsilon=1e-6)(inputs)
+    return layers.GRU(units, dropout=dropout)(x)
+
+def depthwise_conv_block(inputs, kernel_size=3, dropout=0.2):
+    # Per-feature temporal filters followed by a pointwise mix, causal so step t only sees <= t
+    x = layers.LayerNormalization(epsilon=1e-6)(inputs)
+    x = layers.ZeroPadding1D((kernel_size - 1, 0))(x)
+    x = layers.DepthwiseConv1D(kernel_size, activation='gelu')(x)
+    x = layers.Conv1D(inputs.shape[-1], 1, activation='gelu')(x)
+    x = layers.Dropout(dropout)(x)
+    return layers.GlobalAveragePooling1D()(x + inputs)
+
+def pooled_mlp_block(inputs, units, dropout=0.2):
+    last_step = layers.Flatten()(layers.Cropping1D((inputs.shape[1] - 1, 0))(inputs))
+    x = layers.Concatenate()([layers.GlobalAveragePooling1D()(inputs), last_step])
+    x = layers.Dense(units, activation='gelu')(x)
+    return layers.Dropout(dropout)(x)
+
+# name -> (encoder for (inputs, width), hidden units of the shared head)
+RED_ENCODERS = {
+    'transformer': (lambda t, w: layers.GlobalAveragePooling1D()(transformer_block(t, w, 4 if w >= 128 else 2, w)), 512),
+    'gru': (lambda t, w: gru_block(t, w // 2), 128),
+    'tcn': (lambda t, w: depthwise_conv_block(t), 128),
+    'mlp': (lambda t, w: pooled_mlp_block(t, w // 2), 128),
+}
+
+def build_ensemble_red_model(seq_len, energy_dim, balance_dim, relational_dim, encoder='transformer'):
+    """
+    All encoders share the same three inputs and the out_heatmap/out_zones outputs,
+    so any variant is a drop-in replacement for backtest.py and the exporters.
+    """
+    encode, head_units = RED_ENCODERS[encoder]
     energy_in = layers.Input(shape=(seq_len, energy_dim))
-    e = layers.GlobalAveragePooling1D()(transformer_block(energy_in, 128, 4, 128))
+    e = encode(energy_in, 128)
     balance_in = layers.Input(shape=(seq_len, balance_dim))
-    b = layers.GlobalAveragePooling1D()(transformer_block(balance_in, 64, 2, 64))
+    b = encode(balance_in, 64)
     relational_in = layers.Input(shape=(seq_len, relational_dim))
-    r = layers.GlobalAveragePooling1D()(transformer_block(relational_in, 64, 2, 64))
+    r = encode(relational_in, 64)
     
     merged = layers.Concatenate()([e, b, r])
-    x = layers.BatchNormalization()(layers.Dense(512, activation="gelu")(merged))
+    x = layers.BatchNormalization()(layers.Dense(head_units, activation="gelu")(merged))
     
     # EXPLICIT ORDERING
-    num_output = layers.Dense(33, activation="sigmoid", name="out_heatmap")(layers.Dense(256, activation="gelu")(x))
+    num_output = layers.Dense(33, activation="sigmoid", name="out_heatmap")(layers.Dense(head_units // 2, activation="gelu")(x))
     zone_output = layers.Dense(3, activation="sigmoid", name="out_zones")(layers.Dense(64, activation="gelu")(x))
     
     model = keras.Model(inputs=[energy_in, balance_in, relational_in], outputs=[num_output, zone_output])
     model.compile(optimizer=keras.optimizers.Adam(1e-4), loss={'out_heatmap':'binary_crossentropy', 'out_zones':'mse'})
     return model
 
-def train():
-    print("Executing Output Alignment Training...")
-    df = pd.read_csv('ssq_data.csv').sort_values('issue').reset_index(drop=True)
+def build_red_sequences(df, seq_len=15):
     rg, rf, m, rs, ra = calculate_features(df)
-    seq_len = 15
     X_e, X_b, X_r, y_r = [], [], [], []
     for i in range(seq_len, len(df)):
         X_e.append(np.hstack([rg[i-seq_len:i], rf[i-seq_len:i], m[i-seq_len:i]]))
@@ -108,8 +140,91 @@ def train():
         target = np.zeros(33)
         for val in df[['red1','red2','red3','red4','red5','red6']].values[i]: target[int(val)-1] = 1
         y_r.append(target)
-    
-    X_e, X_b, X_r, y_r = np.array(X_e), np.array(X_b), np.array(X_r), np.array(y_r)
+    return np.array(X_e), np.array(X_b), np.array(X_r), np.array(y_r)
+
+class TrainingCheckpoint(keras.callbacks.Callback):
+    """
+    Periodically snapshots everything needed to continue a fit() call:
+    model + optimizer (model.keras), the EarlyStopping/ReduceLROnPlateau
+    counters and the Python/NumPy/Keras RNG states (state.pkl).
+    Must be placed AFTER the callbacks it tracks, because their own
+    on_train_begin() resets the counters we restore here.
+    """
+    def __init__(self, checkpoint_dir, tracked, every=1, time_budget=None, resume_state=None):
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.tracked = tracked
+        self.every = every
+        self.time_budget = time_budget
+        self.resume_state = resume_state
+        self.budget_exhausted = False
+        self.start_time = None
+
+    def on_train_begin(self, logs=None):
+        self.start_time = time.time()
+        if self.resume_state is None:
+            return
+        for cb, cb_state in zip(self.tracked, self.resume_state['callbacks']):
+            for key, value in cb_state.items():
+                setattr(cb, key, value)
+        random.setstate(self.resume_state['python_rng'])
+        np.random.set_state(self.resume_state['numpy_rng'])
+        seed_vars = {v.path: v for v in self.model.variables if 'seed_generator_state' in v.path}
+        for path, value in self.resume_state['seed_generators'].items():
+            if path in seed_vars:
+                seed_vars[path].assign(value)
+
+    def on_epoch_end(self, epoch, logs=None):
+        out_of_time = self.time_budget is not None and (time.time() - self.start_time) > self.time_budget
+        if (epoch + 1) % self.every == 0 or out_of_time or self.model.stop_training:
+            self.save(epoch)
+        if out_of_time and not self.model.stop_training:
+            print(f"\nTime budget of {self.time_budget:.0f}s exhausted after epoch {epoch + 1}, checkpoint saved.")
+            self.budget_exhausted = True
+            self.model.stop_training = True
+
+    def save(self, epoch):
+        state = {
+            'epoch': epoch + 1,
+            'finished': bool(self.model.stop_training) and not self.budget_exhausted,
+            'callbacks': [
+                {key: getattr(cb, key) for key in CALLBACK_STATE_KEYS[type(cb).__name__]}
+                for cb in self.tracked
+            ],
+            'python_rng': random.getstate(),
+            'numpy_rng': np.random.get_state(),
+            'seed_generators': {
+                v.path: np.array(v.numpy()) for v in self.model.variables if 'seed_generator_state' in v.path
+            },
+        }
+        # Write to temp files first so a job killed mid-save never leaves a torn checkpoint
+        tmp_dir = self.checkpoint_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        self.model.save(os.path.join(tmp_dir, 'model.keras'))
+        joblib.dump(state, os.path.join(tmp_dir, 'state.pkl'))
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        os.replace(tmp_dir, self.checkpoint_dir)
+
+CALLBACK_STATE_KEYS = {
+    'EarlyStopping': ['wait', 'stopped_epoch', 'best', 'best_weights', 'best_epoch'],
+    'ReduceLROnPlateau': ['wait', 'best', 'cooldown_counter'],
+}
+
+def load_checkpoint(checkpoint_dir):
+    model_path = os.path.join(checkpoint_dir, 'model.keras')
+    state_path = os.path.join(checkpoint_dir, 'state.pkl')
+    if not (os.path.exists(model_path) and os.path.exists(state_path)):
+        return None, None
+    # The saved optimizer carries the current (possibly reduced) learning rate
+    model = keras.models.load_model(model_path, safe_mode=False)
+    return model, joblib.load(state_path)
+
+def train(checkpoint_dir='checkpoints/red_model', resume=False, checkpoint_every=1, time_budget=None, encoder='transformer'):
+    print("Executing Output Alignment Training...")
+    df = load_frame()
+    seq_len = 15
+    X_e, X_b, X_r, y_r = build_red_sequences(df, seq_len)
     
     # Split data: Use 90% for training, 10% for validation
     split_idx = int(len(y_r) * 0.9)
@@ -118,13 +233,29 @@ def train():
     val_inputs = [X_e[split_idx:], X_b[split_idx:], X_r[split_idx:]]
     val_targets = {'out_heatmap': y_r[split_idx:], 'out_zones': np.zeros((len(y_r) - split_idx, 3))}
 
-    red_model = build_ensemble_red_model(seq_len, 99, 10, 10)
+    red_model, state = load_checkpoint(checkpoint_dir) if resume else (None, None)
+    initial_epoch = 0
+    if state is not None:
+        if state['finished']:
+            print(f"Checkpoint in {checkpoint_dir} already finished training at epoch {state['epoch']}.")
+            best_weights = state['callbacks'][0]['best_weights']
+            if best_weights is not None:
+                red_model.set_weights(best_weights)
+            red_model.save('red_ball_model.keras')
+            return
+        initial_epoch = state['epoch']
+        print(f"Resuming from checkpoint at epoch {initial_epoch}...")
+    else:
+        if resume:
+            print(f"No checkpoint found in {checkpoint_dir}, starting from scratch.")
+        red_model = build_ensemble_red_model(seq_len, 99, 10, 10, encoder)
     
     # Use EarlyStopping and ModelCheckpoint to get the best generalizable model
-    callbacks = [
-        keras.callbacks.EarlyStopping(monitor='val_out_heatmap_loss', patience=15, restore_best_weights=True, mode='min'),
-        keras.callbacks.ReduceLROnPlateau(monitor='val_out_heatmap_loss', factor=0.5, patience=5, mode='min')
-    ]
+    early_stopping = keras.callbacks.EarlyStopping(monitor='val_out_heatmap_loss', patience=15, restore_best_weights=True, mode='min')
+    reduce_lr = keras.callbacks.ReduceLROnPlateau(monitor='val_out_heatmap_loss', factor=0.5, patience=5, mode='min')
+    checkpoint = TrainingCheckpoint(checkpoint_dir, [early_stopping, reduce_lr], every=checkpoint_every,
+                                    time_budget=time_budget, resume_state=state)
+    callbacks = [early_stopping, reduce_lr, checkpoint]
     
     print(f"Training on {split_idx} samples, validating on {len(y_r) - split_idx}...")
     red_model.fit(
@@ -132,12 +263,24 @@ def train():
         train_targets, 
         validation_data=(val_inputs, val_targets),
         epochs=150, 
+        initial_epoch=initial_epoch,
         batch_size=32, 
         callbacks=callbacks,
         verbose=1
     )
+    if checkpoint.budget_exhausted:
+        print(f"Training paused. Re-run with --resume to continue from {checkpoint_dir}.")
+        return
     red_model.save('red_ball_model.keras')
     print("Output Alignment Complete (with Validation).")
 
 if __name__ == '__main__':
-    train()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resume', action='store_true', help='continue from the last checkpoint if one exists')
+    parser.add_argument('--checkpoint-dir', default='checkpoints/red_model')
+    parser.add_argument('--checkpoint-every', type=int, default=1, help='save a checkpoint every N epochs')
+    parser.add_argument('--time-budget', type=float, default=None, help='stop and checkpoint after this many seconds')
+    parser.add_argument('--encoder', choices=sorted(RED_ENCODERS), default='transformer',
+                        help='sequence encoder used for the three red input streams')
+    args = parser.parse_args()
+    train(args.checkpoint_dir, args.resume, args.checkpoint_every, args.time_budget, args.encoder)
@@ -1,10 +1,13 @@
-import pandas as pd
 import numpy as np
 import xgboost as xgb
 from sklearn.multioutput import MultiOutputClassifier
 from sklearn.metrics import classification_report
 import joblib
+import json
 import os
+from draw_history import load_frame
+from draw_bits import (red_masks, blue_masks, unpack, popcount, distinct_differences, longest_run,
+                       ODD, HIGH, PRIMES, ZONES, BLUE_NUMBERS)
 
 def calculate_ac_value(reds):
     diffs = set()
@@ -13,137 +16,157 @@ def calculate_ac_value(reds):
             diffs.add(abs(reds[i] - reds[j]))
     return len(diffs) - (len(reds) - 1)
 
+AFFINITY_ANCHORS = [idx * 3 for idx in range(10)]   # 0-based columns of the anchor numbers 1, 4, ..., 28
+
+def _gaps_before(membership):
+    """Draws since each number last appeared, as seen before each draw (the draw index if never)"""
+    index = np.arange(len(membership))[:, None]
+    last = np.maximum.accumulate(np.where(membership, index, -1), axis=0)
+    last_before = np.vstack([np.full((1, membership.shape[1]), -1), last[:-1]])
+    return (index - 1 - last_before).astype(np.float64)
+
+def _window_counts(membership, window):
+    """Appearances of each number in the `window` draws before each draw"""
+    cumulative = np.vstack([np.zeros((1, membership.shape[1]), dtype=np.int64), np.cumsum(membership, axis=0)])
+    index = np.arange(len(membership))
+    return cumulative[index] - cumulative[np.maximum(index - window, 0)]
+
 def calculate_features(df):
+    """
+    Per-draw red features, each computed from the draws before it (row 0 sees none). Draws are
+    33-bit masks (draw_bits), so membership, window counts and the draw statistics are array
+    operations over the whole frame.
+    """
     num_samples = len(df)
-    red_cols = ['red1', 'red2', 'red3', 'red4', 'red5', 'red6']
-    primes = {2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31}
-    
-    red_gaps = np.zeros((num_samples, 33))
-    red_freqs = np.zeros((num_samples, 33))
-    momentum = np.zeros((num_samples, 33))
+    reds = np.sort(df[['red1', 'red2', 'red3', 'red4', 'red5', 'red6']].values.astype(np.int64), axis=1)
+    masks = red_masks(reds)
+    membership = unpack(masks).astype(np.int64)
+
+    red_gaps = _gaps_before(membership)
+    red_freqs = _window_counts(membership, 30) / 30.0
+    momentum = _window_counts(membership, 5) / 5.0
+
+    # Stats and affinity describe the previous draw; row 0 stays zero
     red_stats = np.zeros((num_samples, 10))
     red_affinity = np.zeros((num_samples, 10))
-    
-    current_red_gaps = np.zeros(33)
-    co_matrix = np.zeros((34, 34))
-    
-    for i in range(num_samples):
-        red_gaps[i] = current_red_gaps
-        row = df.iloc[i]
-        reds = sorted([int(row[col]) for col in red_cols])
-        
-        if i > 0:
-            w30, w5 = df.iloc[max(0, i-30):i], df.iloc[max(0, i-5):i]
-            for num in range(1, 34):
-                red_freqs[i, num-1] = (w30[red_cols] == num).any(axis=1).sum() / 30.0
-                momentum[i, num-1] = (w5[red_cols] == num).any(axis=1).sum() / 5.0
-            
-            prev_reds = sorted([int(df.iloc[i-1][col]) for col in red_cols])
-            red_stats[i, 0] = sum(prev_reds) / 200.0
-            red_stats[i, 1] = calculate_ac_value(prev_reds) / 10.0
-            red_stats[i, 2] = len([n for n in prev_reds if n % 2 != 0]) / 6.0
-            red_stats[i, 3] = len([n for n in prev_reds if n > 16]) / 6.0
-            red_stats[i, 4] = len([n for n in prev_reds if n in primes]) / 6.0
-            red_stats[i, 5] = len([n for n in prev_reds if 1 <= n <= 11]) / 6.0
-            red_stats[i, 6] = len([n for n in prev_reds if 12 <= n <= 22]) / 6.0
-            red_stats[i, 7] = len([n for n in prev_reds if 23 <= n <= 33]) / 6.0
-            red_stats[i, 8] = (max(prev_reds) - min(prev_reds)) / 32.0
-            consec, curr_max = 1, 1
-            for j in range(len(prev_reds)-1):
-                if prev_reds[j+1] == prev_reds[j] + 1: consec += 1
-                else: curr_max, consec = max(curr_max, consec), 1
-            red_stats[i, 9] = max(curr_max, consec) / 6.0
-
-            for idx in range(10):
-                anchor = (idx * 3) + 1
-                red_affinity[i, idx] = sum([co_matrix[anchor, p] for p in prev_reds]) / 50.0
-
-        for num in range(1, 34):
-            if num in reds: current_red_gaps[num-1] = 0
-            else: current_red_gaps[num-1] += 1
-        for r1 in reds:
-            for r2 in reds:
-                if r1 != r2: co_matrix[r1, r2] += 1
-                
+    if num_samples > 1:
+        prev, prev_masks = reds[:-1], masks[:-1]
+        red_stats[1:, 0] = prev.sum(axis=1) / 200.0
+        red_stats[1:, 1] = (distinct_differences(prev_masks) - 5) / 10.0
+        red_stats[1:, 2] = popcount(prev_masks & ODD) / 6.0
+        red_stats[1:, 3] = popcount(prev_masks & HIGH) / 6.0
+        red_stats[1:, 4] = popcount(prev_masks & PRIMES) / 6.0
+        for z, zone in enumerate(ZONES):
+            red_stats[1:, 5 + z] = popcount(prev_masks & zone) / 6.0
+        red_stats[1:, 8] = (prev[:, -1] - prev[:, 0]) / 32.0
+        red_stats[1:, 9] = longest_run(prev_masks) / 6.0
+
+        # Co-occurrence counts through draw j of each anchor with every other number
+        pairs = membership[:, AFFINITY_ANCHORS, None] * membership[:, None, :]
+        pairs[:, np.arange(len(AFFINITY_ANCHORS)), AFFINITY_ANCHORS] = 0
+        co_through = np.cumsum(pairs, axis=0)
+        red_affinity[1:] = np.einsum('nap,np->na', co_through[:-1], membership[:-1]) / 50.0
+
     return np.clip(red_gaps / 50.0, 0, 1), red_freqs, momentum, red_stats, red_affinity
 
 def prepare_blue_features(df):
-    num_samples = len(df)
-    blue_gaps = np.zeros((num_samples, 16))
-    blue_freqs = np.zeros((num_samples, 16))
-    current_blue_gaps = np.zeros(16)
-    
-    for i in range(num_samples):
-        blue_gaps[i] = current_blue_gaps
-        row = df.iloc[i]
-        blue = int(row['blue'])
-        
-        if i > 0:
-            w30 = df.iloc[max(0, i-30):i]
-            for num in range(1, 17):
-                blue_freqs[i, num-1] = (w30['blue'] == num).sum() / 30.0
-        
-        for num in range(1, 17):
-            if num == blue: current_blue_gaps[num-1] = 0
-            else: current_blue_gaps[num-1] += 1
-            
+    blue = df['blue'].values.astype(np.int64)
+    membership = unpack(blue_masks(blue), BLUE_NUMBERS).astype(np.int64)
+    blue_gaps = _gaps_before(membership)
+    blue_freqs = _window_counts(membership, 30) / 30.0
     return np.clip(blue_gaps / 50.0, 0, 1), blue_freqs
 
+SEQ_LEN = 15
+RED_DIM = SEQ_LEN * 119   # per step: 33 gaps, 33 freqs, 33 momentum, 10 stats, 10 affinity
+BLUE_DIM = SEQ_LEN * 32   # per step: 16 gaps, 16 freqs
+RED_MASK_FILE = 'red_feature_mask.json'
+
+def build_red_dataset(df_red, seq_len=SEQ_LEN):
+    """Flattened red rows (one copy per drawn number) in the same step-major layout as the ONNX input"""
+    per_step = np.hstack(calculate_features(df_red))
+    reds = df_red[['red1','red2','red3','red4','red5','red6']].values.astype(int)
+    X_red, y_red = [], []
+    for i in range(seq_len, len(df_red)):
+        red_feat = per_step[i-seq_len:i].reshape(-1)
+        for val in reds[i]:
+            X_red.append(red_feat)
+            y_red.append(val - 1)
+    # Ensure all classes are present for small windows
+    for c in range(33):
+        if c not in y_red:
+            X_red.append(np.zeros(len(X_red[0])))
+            y_red.append(c)
+    return np.array(X_red), np.array(y_red)
+
+def build_blue_dataset(df_blue, seq_len=SEQ_LEN):
+    per_step = np.hstack(prepare_blue_features(df_blue))
+    blues = df_blue['blue'].values.astype(int)
+    X_blue, y_blue = [], []
+    for i in range(seq_len, len(df_blue)):
+        X_blue.append(per_step[i-seq_len:i].reshape(-1))
+        y_blue.append(blues[i] - 1)
+    for c in range(16):
+        if c not in y_blue:
+            X_blue.append(np.zeros(len(X_blue[0])))
+            y_blue.append(c)
+    return np.array(X_blue), np.array(y_blue)
+
+def build_red_windows(df, seq_len=SEQ_LEN, include_next=False):
+    """
+    One 1785-wide row per draw i >= seq_len (not expanded per drawn number).
+    With include_next, a final row for the draw after the last one in df is appended.
+    """
+    per_step = np.hstack(calculate_features(df))
+    end = len(df) + 1 if include_next else len(df)
+    return np.array([per_step[i-seq_len:i].reshape(-1) for i in range(seq_len, end)])
+
+def build_blue_windows(df, seq_len=SEQ_LEN, include_next=False):
+    per_step = np.hstack(prepare_blue_features(df))
+    end = len(df) + 1 if include_next else len(df)
+    return np.array([per_step[i-seq_len:i].reshape(-1) for i in range(seq_len, end)])
+
+def load_red_mask(base_path=None):
+    """Column indices kept by feature_selection.py, or None when the full 1785-wide input is used"""
+    path = os.path.join(base_path or os.path.dirname(os.path.abspath(__file__)), RED_MASK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return np.array(json.load(f)['columns'], dtype=np.int64)
+
+def red_columns_for(model, mask):
+    """
+    Which columns of a full 1785-wide red row the given model expects.
+    Guards against a mask file that does not match the trained artifact.
+    """
+    n_features = model.n_features_in_
+    if n_features == RED_DIM:
+        return None
+    if mask is not None and len(mask) == n_features:
+        return mask
+    raise ValueError(f"Red model expects {n_features} features but the mask has "
+                     f"{'no' if mask is None else len(mask)} columns; retrain or rerun feature_selection.py")
+
 def train():
     print("Loading data...")
-    df = pd.read_csv('ssq_data.csv').sort_values('issue').reset_index(drop=True)
+    df = load_frame()
     
     # Red Window: Use full history
     red_window_size = len(df) - 15  # Use all available data
     print(f"Applying red window-based training: using all {red_window_size} draws.")
     df_red = df.tail(red_window_size + 15).copy().reset_index(drop=True)
-    rg, rf, m, rs, ra = calculate_features(df_red)
     
     # Blue Window: 1000
     blue_window_size = 1000
     print(f"Applying blue window-based training: using last {blue_window_size} draws.")
     df_blue = df.tail(blue_window_size + 15).copy().reset_index(drop=True)
-    bg, bf = prepare_blue_features(df_blue)
     
-    seq_len = 15
-    X_red, y_red_expanded = [], []
-    X_blue, y_blue = [], []
+    X_red, y_red_expanded = build_red_dataset(df_red)
+    X_blue, y_blue = build_blue_dataset(df_blue)
     
-    # Process Red
-    for i in range(seq_len, len(df_red)):
-        red_feat = []
-        for step in range(i - seq_len, i):
-            red_feat.extend(rg[step])
-            red_feat.extend(rf[step])
-            red_feat.extend(m[step])
-            red_feat.extend(rs[step])
-            red_feat.extend(ra[step])
-        
-        for val in df_red[['red1','red2','red3','red4','red5','red6']].values[i]:
-            X_red.append(red_feat)
-            y_red_expanded.append(int(val) - 1)
-
-    # Process Blue
-    for i in range(seq_len, len(df_blue)):
-        blue_feat = []
-        for step in range(i - seq_len, i):
-            blue_feat.extend(bg[step])
-            blue_feat.extend(bf[step])
-        X_blue.append(blue_feat)
-        y_blue.append(int(df_blue.iloc[i]['blue']) - 1)
-        
-    # Ensure all classes are present for small windows
-    for c in range(33):
-        if c not in y_red_expanded:
-            X_red.append(np.zeros(len(X_red[0])))
-            y_red_expanded.append(c)
-    for c in range(16):
-        if c not in y_blue:
-            X_blue.append(np.zeros(len(X_blue[0])))
-            y_blue.append(c)
-
-    X_red, y_red_expanded = np.array(X_red), np.array(y_red_expanded)
-    X_blue, y_blue = np.array(X_blue), np.array(y_blue)
+    red_mask = load_red_mask()
+    if red_mask is not None:
+        print(f"Applying red feature mask: {len(red_mask)}/{RED_DIM} columns.")
+        X_red = X_red[:, red_mask]
     
     print(f"Red samples: {X_red.shape}, Blue samples: {X_blue.shape}")
     